@@ -0,0 +1,80 @@
+import os
+import sys
+import json
+import glob
+import time
+import cv2
+import ocr_processor as ocr
+from glyph_matcher import GlyphMatcher
+
+# --- Configuration ---
+REPEATS = 5
+MAX_SCREENSHOTS = 50
+
+
+def collect_cells(ocr_config, screenshot_paths):
+    """Crops every configured ratio and stock cell out of the given screenshots."""
+    cells = []
+    ratio_col = ocr_config['columns']['ratio']
+    stock_col = ocr_config['columns']['stock']
+    for path in screenshot_paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        for table_name, table_config in ocr_config.items():
+            if table_name in ["tesseract_options", "columns"]:
+                continue
+            for row_coords in table_config['rows']:
+                y1, y2 = row_coords['y_start'], row_coords['y_end']
+                cells.append(('ratio', image[y1:y2, ratio_col['x_start']:ratio_col['x_end']]))
+                cells.append(('stock', image[y1:y2, stock_col['x_start']:stock_col['x_end']]))
+    return cells
+
+
+def time_engine(recognize, cells, templates):
+    """Runs an engine over all cells REPEATS times; returns (seconds per cell, outputs)."""
+    outputs = [recognize(cell, templates[kind]) for kind, cell in cells]
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        for kind, cell in cells:
+            recognize(cell, templates[kind])
+    elapsed = time.perf_counter() - start
+    return elapsed / (REPEATS * len(cells)), outputs
+
+
+def main():
+    with open(ocr.OCR_CONFIG_FILE, 'r') as f:
+        ocr_config = json.load(f)
+    templates = ocr.load_templates(ocr.TEMPLATE_DIR)
+    if not templates['ratio'] or not templates['stock']:
+        print("[FATAL] No templates were loaded. Aborting.")
+        sys.exit(1)
+
+    screenshot_paths = sorted(
+        glob.glob(os.path.join(ocr.SCREENSHOTS_DIR, '*.png')) +
+        glob.glob(os.path.join(ocr.PROCESSED_DIR, '*.png'))
+    )[:MAX_SCREENSHOTS]
+    cells = collect_cells(ocr_config, screenshot_paths)
+    if not cells:
+        print(f"[FATAL] No screenshots found in '{ocr.SCREENSHOTS_DIR}' or '{ocr.PROCESSED_DIR}'. Aborting.")
+        sys.exit(1)
+    print(f"Benchmarking on {len(cells)} cells from {len(screenshot_paths)} screenshots ({REPEATS} repeats).")
+
+    matchers = {kind: GlyphMatcher(templates[kind], threshold=ocr.CONFIDENCE_THRESHOLD) for kind in templates}
+    batched = lambda cell, template_set: matchers['ratio' if template_set is templates['ratio'] else 'stock'].recognize(cell)
+
+    legacy_time, legacy_out = time_engine(ocr.recognize_text_from_templates, cells, templates)
+    batched_time, batched_out = time_engine(batched, cells, templates)
+
+    agree = sum(1 for a, b in zip(legacy_out, batched_out) if a == b)
+    print(f"  Per-template loop : {legacy_time * 1e6:9.1f} us/cell")
+    print(f"  Batched matcher   : {batched_time * 1e6:9.1f} us/cell")
+    print(f"  Speedup           : {legacy_time / batched_time:9.2f}x")
+    print(f"  Identical output  : {agree}/{len(cells)} cells")
+    for (kind, _), a, b in zip(cells, legacy_out, batched_out):
+        if a != b:
+            print(f"    [DIFF] {kind}: loop='{a}' batched='{b}'")
+
+
+if __name__ == "__main__":
+    main()
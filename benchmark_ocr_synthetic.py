@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import math
+import time
+import argparse
+from datetime import datetime, timezone
+import cv2
+import numpy as np
+import ocr_processor as ocr
+from glyph_matcher import GlyphMatcher
+
+# --- Configuration ---
+RESULTS_DIR = 'benchmark_results'
+DEFAULT_CELLS = 2000
+CELL_HEIGHT = 34
+# build_cases gives up after this many rejected texts in a row for one column.
+MAX_REJECTED_TEXTS = 1000
+
+
+def render_cell(text, template_set, width, rng, spacing=1, scale=1.0, noise=0.0):
+    """
+    Renders text into a BGR cell using the glyph templates themselves. The
+    background level is taken from the glyph borders so pasted glyphs blend in.
+    Returns None if the text does not fit.
+    """
+    glyphs = [template_set[c] for c in text]
+    if scale != 1.0:
+        glyphs = [cv2.resize(g, None, fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR) for g in glyphs]
+    borders = np.concatenate([np.concatenate([g[0], g[-1], g[:, 0], g[:, -1]]) for g in glyphs])
+    background = int(np.median(borders))
+
+    max_h = max(g.shape[0] for g in glyphs)
+    total_w = sum(g.shape[1] for g in glyphs) + spacing * (len(glyphs) - 1)
+    if max_h > CELL_HEIGHT or total_w + 2 > width:
+        return None
+
+    cell = np.full((CELL_HEIGHT, width), background, dtype=np.uint8)
+    x = int(rng.integers(1, width - total_w))
+    y = int(rng.integers(0, CELL_HEIGHT - max_h + 1))
+    for g in glyphs:
+        cell[y:y + g.shape[0], x:x + g.shape[1]] = g
+        x += g.shape[1] + spacing
+
+    if noise > 0:
+        cell = np.clip(cell.astype(np.float32) + rng.normal(0, noise, cell.shape), 0, 255).astype(np.uint8)
+    return cv2.cvtColor(cell, cv2.COLOR_GRAY2BGR)
+
+
+def with_thousands(value: int, use_comma: bool) -> str:
+    return f"{value:,}" if use_comma else str(value)
+
+
+def random_ratio_text(rng, template_set):
+    use_comma = ',' in template_set
+    left = with_thousands(int(rng.integers(1, 100)), use_comma)
+    right = with_thousands(int(10 ** rng.uniform(0, 4.5)), use_comma)
+    return f"{left}:{right}"
+
+
+def random_stock_text(rng, template_set):
+    return with_thousands(int(10 ** rng.uniform(0, 6)), ',' in template_set)
+
+
+def char_errors(truth: str, read: str) -> int:
+    """Levenshtein distance between the true and recognized strings."""
+    prev = list(range(len(read) + 1))
+    for i, a in enumerate(truth, 1):
+        cur = [i]
+        for j, b in enumerate(read, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (a != b)))
+        prev = cur
+    return prev[-1]
+
+
+def build_cases(templates, ocr_config, count, rng, spacing, scale, noise):
+    """
+    Returns a list of (column, truth_text, cell_image) with known ground truth.
+    Raises ValueError if a column keeps producing texts that cannot be
+    rendered, i.e. a glyph template is missing or --scale makes them too big.
+    """
+    widths = {col: ocr_config['columns'][col]['x_end'] - ocr_config['columns'][col]['x_start'] for col in ('ratio', 'stock')}
+    generators = {'ratio': random_ratio_text, 'stock': random_stock_text}
+    cases = []
+    rejected, missing = 0, set()
+    while len(cases) < count:
+        column = 'ratio' if len(cases) % 2 == 0 else 'stock'
+        if rejected >= MAX_REJECTED_TEXTS:
+            if missing:
+                raise ValueError(f"No '{column}' glyph template for {', '.join(repr(c) for c in sorted(missing))}.")
+            raise ValueError(f"'{column}' texts do not fit the {widths[column]}x{CELL_HEIGHT} px cell at --scale {scale}.")
+        text = generators[column](rng, templates[column])
+        cell = None
+        if any(c not in templates[column] for c in text):
+            missing.update(c for c in text if c not in templates[column])
+        else:
+            cell = render_cell(text, templates[column], widths[column], rng, spacing, scale, noise)
+        if cell is None:
+            rejected += 1
+            continue
+        cases.append((column, text, cell))
+        rejected, missing = 0, set()
+    return cases
+
+
+def run_engine(name, recognize, cases):
+    """Times an engine over all cases and scores it against the ground truth."""
+    start = time.perf_counter()
+    outputs = [recognize(cell, column) for column, _, cell in cases]
+    elapsed = time.perf_counter() - start
+
+    total_chars = sum(len(text) for _, text, _ in cases)
+    errors = sum(char_errors(text, out) for (_, text, _), out in zip(cases, outputs))
+    exact = sum(1 for (_, text, _), out in zip(cases, outputs) if text == out)
+
+    value_ok = 0
+    for (column, text, _), out in zip(cases, outputs):
+        parse = ocr.parse_ratio if column == 'ratio' else ocr.parse_stock
+        truth, read = parse(text), parse(out)
+        if truth is not None and read is not None and math.isclose(truth, read, rel_tol=1e-9):
+            value_ok += 1
+
+    return {
+        "engine": name,
+        "cells": len(cases),
+        "seconds": round(elapsed, 4),
+        "cells_per_sec": round(len(cases) / elapsed, 1) if elapsed else None,
+        "char_accuracy": round(1 - errors / total_chars, 5),
+        "string_accuracy": round(exact / len(cases), 5),
+        "value_accuracy": round(value_ok / len(cases), 5),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic OCR throughput and accuracy benchmark.")
+    parser.add_argument('--cells', type=int, default=DEFAULT_CELLS, help="Number of cells to render (half ratio, half stock).")
+    parser.add_argument('--noise', type=float, default=4.0, help="Gaussian noise sigma in grey levels.")
+    parser.add_argument('--spacing', type=int, default=1, help="Pixels between glyphs.")
+    parser.add_argument('--scale', type=float, default=1.0, help="Glyph scale factor relative to the templates.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--engines', default='loop,batched', help="Comma-separated: loop, batched.")
+    parser.add_argument('--label', default='', help="Free-form label stored with the results.")
+    args = parser.parse_args()
+
+    with open(ocr.OCR_CONFIG_FILE, 'r') as f:
+        ocr_config = json.load(f)
+    templates = ocr.load_templates(ocr.TEMPLATE_DIR)
+    if not templates['ratio'] or not templates['stock']:
+        print("[FATAL] No templates were loaded. Check the 'templates/numbers' directory. Aborting.")
+        sys.exit(1)
+
+    rng = np.random.default_rng(args.seed)
+    try:
+        cases = build_cases(templates, ocr_config, args.cells, rng, args.spacing, args.scale, args.noise)
+    except ValueError as e:
+        print(f"[FATAL] Could not render synthetic cells: {e} Aborting.")
+        sys.exit(1)
+    print(f"Rendered {len(cases)} synthetic cells (noise={args.noise}, spacing={args.spacing}, scale={args.scale}).")
+
+    matchers = {col: GlyphMatcher(templates[col], threshold=ocr.CONFIDENCE_THRESHOLD) for col in ('ratio', 'stock')}
+    engines = {
+        'loop': lambda cell, column: ocr.recognize_text_from_templates(cell, templates[column]),
+        'batched': lambda cell, column: matchers[column].recognize(cell),
+    }
+
+    results = []
+    for name in args.engines.split(','):
+        if name not in engines:
+            print(f"[WARN] Unknown engine '{name}', skipping.")
+            continue
+        result = run_engine(name, engines[name], cases)
+        results.append(result)
+        print(f"  {name:8s} {result['cells_per_sec']:>10} cells/s  char {result['char_accuracy']:.4f}"
+              f"  string {result['string_accuracy']:.4f}  value {result['value_accuracy']:.4f}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+    output_path = os.path.join(RESULTS_DIR, f"ocr_synthetic_{stamp}.json")
+    with open(output_path, 'w') as f:
+        json.dump({
+            "timestamp_utc": stamp,
+            "label": args.label,
+            "params": {k: getattr(args, k) for k in ('cells', 'noise', 'spacing', 'scale', 'seed')},
+            "results": results,
+        }, f, indent=2)
+    print(f"Results saved to '{output_path}'.")
+
+
+if __name__ == "__main__":
+    main()
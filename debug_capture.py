@@ -0,0 +1,88 @@
+import os
+import sys
+import glob
+import queue
+import threading
+from multiprocessing import util
+import cv2
+import numpy as np
+
+# --- Configuration ---
+DEFAULT_QUEUE_SIZE = 64
+
+
+class DebugCropWriter:
+    """
+    Writes debug crops on a background thread, one compressed .npz per lot
+    (keys like 'available_trades_row1_ratio'). The queue is bounded and never
+    blocks the OCR worker: when it is full the lot is dropped and counted.
+    """
+
+    def __init__(self, debug_dir: str, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.debug_dir = debug_dir
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.saved = 0
+        self.dropped = 0
+        os.makedirs(debug_dir, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, name="debug-crop-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, lot_id: str, crops: dict):
+        try:
+            self.queue.put_nowait((lot_id, crops))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Flushes every queued lot and stops the writer thread."""
+        self.queue.put((None, None))
+        self.thread.join()
+        if self.dropped:
+            print(f"[WARN] Debug writer dropped {self.dropped} lots because its queue was full.")
+
+    def _run(self):
+        while True:
+            lot_id, crops = self.queue.get()
+            if lot_id is None:
+                return
+            try:
+                np.savez_compressed(os.path.join(self.debug_dir, f"{lot_id}.npz"), **crops)
+                self.saved += 1
+            except Exception as e:
+                print(f"[WARN] Could not save debug crops for {lot_id}: {e}")
+
+
+_writers = {}
+
+def get_debug_writer(debug_dir: str, queue_size: int = DEFAULT_QUEUE_SIZE) -> DebugCropWriter:
+    """Returns this process's writer for debug_dir, starting it on first use."""
+    key = (os.getpid(), os.path.abspath(debug_dir))
+    writer = _writers.get(key)
+    if writer is None:
+        writer = DebugCropWriter(debug_dir, queue_size)
+        _writers[key] = writer
+        # Pool workers leave through multiprocessing's exit path, which skips atexit.
+        util.Finalize(writer, writer.close, exitpriority=10)
+    return writer
+
+
+def export_lot(npz_path: str, output_dir: str):
+    """Unpacks one lot archive into individual PNGs named like the old per-cell debug files."""
+    os.makedirs(output_dir, exist_ok=True)
+    lot_id = os.path.splitext(os.path.basename(npz_path))[0]
+    with np.load(npz_path) as archive:
+        for name in archive.files:
+            cv2.imwrite(os.path.join(output_dir, f"{lot_id}_{name}.png"), archive[name])
+    print(f"Exported '{npz_path}' to '{output_dir}'.")
+
+
+if __name__ == "__main__":
+    # Usage: python debug_capture.py <lot.npz or directory> [output_dir]
+    if len(sys.argv) < 2:
+        print("Usage: python debug_capture.py <lot.npz | directory> [output_dir]")
+        sys.exit(1)
+    source = sys.argv[1]
+    output = sys.argv[2] if len(sys.argv) > 2 else 'cropped_debug_png'
+    paths = glob.glob(os.path.join(source, '*.npz')) if os.path.isdir(source) else [source]
+    for path in paths:
+        export_lot(path, output)
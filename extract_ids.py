@@ -1,10 +1,11 @@
-import json
 import csv
+import item_catalog
 
 def create_target_item_csv(json_file_path, target_categories, priority_list, csv_output_path):
     """
-    Loads item data, filters for multiple categories, adds an 'is_target' column,
-    sorts by target status, and saves the result to a CSV file.
+    Streams item data, filters for multiple categories, adds an 'is_target' column,
+    sorts by target status, and saves the result to a CSV file. The item
+    catalog rebuilds from the new CSV the next time it is loaded.
 
     Args:
         json_file_path (str): Path to the JSON file with item data.
@@ -12,51 +13,48 @@ def create_target_item_csv(json_file_path, target_categories, priority_list, csv
         priority_list (list): A list of item names to mark as targets.
         csv_output_path (str): Path to save the output CSV file.
     """
+    filtered_items = []
+    category_set = set(target_categories)
+    priority_set = set(priority_list)
+
     try:
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            all_items = json.load(f)
+        for item in item_catalog.iter_json_array(json_file_path):
+            if item.get("categoryApiId") in category_set:
+                item_name = item.get("text") or item.get("name")
+                item_id = item.get("itemId")
+                api_id = item.get("apiId", "N/A")
+                category = item.get("categoryApiId")
+
+                if item_name and item_id is not None:
+                    # Determine if the item is in the priority list
+                    is_target_flag = 1 if item_name in priority_set else 0
+
+                    filtered_items.append({
+                        "is_target": is_target_flag,
+                        "name": item_name,
+                        "itemID": item_id,
+                        "apiID": api_id,
+                        "category": category
+                    })
     except FileNotFoundError:
         print(f"Error: The file '{json_file_path}' was not found.")
         return
-    except json.JSONDecodeError:
+    except ValueError:
         print(f"Error: The file '{json_file_path}' is not a valid JSON file.")
         return
 
-    filtered_items = []
-    category_set = set(target_categories)
-    priority_set = set(priority_list)
-
-    for item in all_items:
-        if item.get("categoryApiId") in category_set:
-            item_name = item.get("text") or item.get("name")
-            item_id = item.get("itemId")
-            api_id = item.get("apiId", "N/A")
-            category = item.get("categoryApiId")
-
-            if item_name and item_id is not None:
-                # Determine if the item is in the priority list
-                is_target_flag = 1 if item_name in priority_set else 0
-                
-                filtered_items.append({
-                    "is_target": is_target_flag,
-                    "Name": item_name,
-                    "ItemID": item_id,
-                    "ApiID": api_id,
-                    "Category": category
-                })
-
     if not filtered_items:
         print("No items were found matching the specified categories.")
         return
         
     # Sort the list: 'is_target' items (1) come first, then sort alphabetically by name.
-    filtered_items.sort(key=lambda x: (-x["is_target"], x["Name"]))
+    filtered_items.sort(key=lambda x: (-x["is_target"], x["name"]))
 
     # Write the sorted data to the CSV file
     try:
         with open(csv_output_path, 'w', newline='', encoding='utf-8') as output_file:
-            # Add 'is_target' as the first column header
-            headers = ["is_target", "Name", "ItemID", "ApiID", "Category"]
+            # Add 'is_target' as the first column header; the lower-case names are what the readers expect
+            headers = ["is_target", "name", "itemID", "apiID", "category"]
             writer = csv.DictWriter(output_file, fieldnames=headers)
             writer.writeheader()
             writer.writerows(filtered_items)
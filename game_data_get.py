@@ -1,31 +1,139 @@
 import sys
 import json
 import time
+import queue
 import game_gui_navigator as nav
-from game_helper_functions import ActionFailedException
-import pyautogui
+import scan_planner
+import item_catalog
+import step_trace
+from game_helper_functions import ActionFailedException, ConfigurationError
+from screen_backend import get_backend
 from game_gui_navigator import (human_like_delay)
 
 # --- Config and State Management ---
 STATE_FILE = 'run_state.json'
 CONFIG_FILE = 'trade_config.json'
+# Wait before retrying a failed pair; doubles after every failure, up to the maximum.
+PAIR_RETRY_DELAY_SECONDS = 1.0
+PAIR_RETRY_MAX_DELAY_SECONDS = 8.0
+# A scan with uncaptured pairs stays open and is resumed by the next cycle or
+# run, at most this many times; after that a new scan is started.
+SCAN_MAX_RESUMES = 3
 
-def load_or_initialize_scan_id():
-    """Reads the last scan_id from the state file, or creates it if it doesn't exist."""
+def load_state():
+    """Returns the whole state file as a dict (empty if it doesn't exist)."""
     try:
         with open(STATE_FILE, 'r') as f:
-            state_data = json.load(f)
-            return state_data.get('last_scan_id', -1)
+            return json.load(f)
     except FileNotFoundError:
-        print(f"[INFO] '{STATE_FILE}' not found. Initializing with scan_id -1.")
-        return -1
+        return {}
 
-def save_scan_id(new_id):
-    """Saves the new last_scan_id to the state file."""
-    state_data = {'last_scan_id': new_id}
+def update_state(**values):
+    """Writes the given keys to the state file, keeping every other key."""
+    state_data = load_state()
+    state_data.update(values)
     with open(STATE_FILE, 'w') as f:
         json.dump(state_data, f, indent=4)
 
+def begin_scan():
+    """
+    Resumes the unfinished scan recorded in the state file, or starts a new
+    one. Returns (scan_id, set of captured (want, have) pairs, next screenshot index).
+    """
+    state = load_state()
+    if not state:
+        print(f"[INFO] '{STATE_FILE}' not found. Initializing with scan_id -1.")
+    scan = state.get('current_scan')
+    if scan and not scan.get('complete') and scan.get('scan_id') == state.get('last_scan_id'):
+        resumes = scan.get('resumes', 0)
+        if resumes < SCAN_MAX_RESUMES:
+            update_state(current_scan={**scan, "resumes": resumes + 1})
+            return scan['scan_id'], {tuple(pair) for pair in scan.get('captured', [])}, scan.get('next_screenshot_index', 0)
+        print(f"[WARN] Scan {scan['scan_id']} still misses {len(scan.get('missing', []))} pair(s) after "
+              f"{resumes} resumes; starting a new scan.")
+
+    scan_id = state.get('last_scan_id', -1) + 1
+    save_scan_progress(scan_id, set(), 0, last_scan_id=scan_id)
+    return scan_id, set(), 0
+
+# (scan_id, want, have) of lots the OCR pipeline has committed, filled from its writer thread.
+committed_pairs = queue.SimpleQueue()
+
+def record_committed(lots):
+    """OcrPipeline on_committed callback."""
+    for metadata in lots:
+        committed_pairs.put((metadata['scan_id'], metadata['currency_want'], metadata['currency_have']))
+
+def drain_committed(scan_id, captured):
+    """Adds the pairs of scan_id whose lots have been committed since the last call to captured."""
+    while True:
+        try:
+            lot_scan_id, want, have = committed_pairs.get_nowait()
+        except queue.Empty:
+            return
+        if lot_scan_id == scan_id:
+            captured.add((want, have))
+
+def save_scan_progress(scan_id, captured, next_screenshot_index, complete=False, missing=(), **extra):
+    """
+    Checkpoints the current scan so a restart can pick up from the first
+    uncaptured pair. missing lists the planned pairs a finished cycle did not capture.
+    """
+    previous = load_state().get('current_scan') or {}
+    update_state(current_scan={
+        "scan_id": scan_id,
+        "captured": sorted(list(pair) for pair in captured),
+        "missing": sorted(list(pair) for pair in missing),
+        "next_screenshot_index": next_screenshot_index,
+        "complete": complete,
+        "resumes": previous.get('resumes', 0) if previous.get('scan_id') == scan_id else 0
+    }, **extra)
+
+
+def capture_pair(want_currency, have_currency, scan_id, screenshot_index, selected, window_banners,
+                 search_text, pipeline, deadline_seconds):
+    """
+    Selects whichever side of the pair is not already showing and captures
+    it, retrying the whole pair with growing waits until deadline_seconds
+    have passed; a configuration error (e.g. a missing template) is not
+    retried. selected ({'want': ..., 'have': ...}) is updated in place.
+    Returns True on success.
+    """
+    pair_deadline = time.monotonic() + deadline_seconds
+    retry_delay = PAIR_RETRY_DELAY_SECONDS
+    while True:
+        try:
+            for side, currency in (('have', have_currency), ('want', want_currency)):
+                if selected[side] == currency:
+                    continue
+                selected[side] = None
+                window_key = scan_planner.PANEL_KEYS[side]
+                nav.select_currency(currency, window_key, window_banners.get(window_key),
+                                    search_text=search_text.get(currency))
+                selected[side] = currency
+            nav.human_like_delay(0.35, 0.50)
+            nav.capture_market_data(
+                scan_id=scan_id,
+                screenshot_index=screenshot_index,
+                currency_want=want_currency,
+                currency_have=have_currency,
+                pipeline=pipeline
+            )
+            print(f"[SUCCESS] Successfully captured data for {want_currency}.")
+            return True
+        except ActionFailedException as e:
+            # Whatever was on screen is unknown now, so both sides get selected again.
+            selected['want'] = selected['have'] = None
+            remaining = pair_deadline - time.monotonic()
+            if isinstance(e, ConfigurationError) or remaining <= 0:
+                print(f"\n[ERROR] Failed to process '{want_currency}' vs. '{have_currency}'. Reason: {e}")
+                print("[ERROR] Skipping to the next pair.")
+                return False
+            print(f"\n[WARN] '{want_currency}' vs. '{have_currency}' failed: {e}. "
+                  f"Retrying in {min(retry_delay, remaining):.1f}s ({remaining:.0f}s left).")
+            time.sleep(min(retry_delay, remaining))
+            retry_delay = min(retry_delay * 2, PAIR_RETRY_MAX_DELAY_SECONDS)
+
 
 if __name__ == '__main__':
     # --- Load all configuration from the JSON file ---
@@ -35,6 +143,14 @@ if __name__ == '__main__':
         TRADE_SESSIONS = config['trade_sessions']
         CYCLE_WAIT_SECONDS = config['cycle_wait_seconds']
         NUMBER_OF_CYCLES = config['number_of_cycles']
+        PIPELINE_CONFIG = config.get('ocr_pipeline', {})
+        PERSIST_ANCHORS = config.get('persist_anchor_positions', False)
+        PLANNER_CONFIG = config.get('scan_planner', {})
+        SETUP_DEADLINE_SECONDS = config.get('retry_deadlines', {}).get('setup_seconds', 120)
+        PAIR_DEADLINE_SECONDS = config.get('retry_deadlines', {}).get('pair_seconds', 60)
+        RECAPTURE_MAX_ROUNDS = config.get('recapture', {}).get('max_rounds', 1)
+        RECAPTURE_WAIT_SECONDS = config.get('recapture', {}).get('wait_seconds', 20)
+        PIPELINE_FLUSH_SECONDS = PIPELINE_CONFIG.get('flush_seconds', 60)
     except FileNotFoundError:
         print(f"[FATAL] The configuration file '{CONFIG_FILE}' was not found. Aborting.")
         sys.exit(1)
@@ -42,71 +158,123 @@ if __name__ == '__main__':
         print(f"[FATAL] The configuration file is missing a required key: {e}. Aborting.")
         sys.exit(1)
 
-    pyautogui.hotkey('alt', 'tab')  # Alt-Tab to ensure game focus
+    # --- Optional in-process OCR: captures go straight to the worker pool ---
+    ocr_pipeline = None
+    if PIPELINE_CONFIG.get('enabled', False):
+        from ocr_pipeline import OcrPipeline
+        ocr_pipeline = OcrPipeline(
+            archive_every_n=PIPELINE_CONFIG.get('archive_every_n', 0),
+            archive_failures=PIPELINE_CONFIG.get('archive_failures', True),
+            on_committed=record_committed
+        )
+
+    # --- Order the pairs to minimise selections and typing ---
+    # Prefixes must be unique among every item the search can list, not just the templated ones.
+    KNOWN_NAMES = set(nav.config.get('currency_name_templates', {})) | set(item_catalog.get_catalog().names())
+    SCAN_PLAN = scan_planner.build_plan(TRADE_SESSIONS, KNOWN_NAMES, PLANNER_CONFIG)
+    scan_planner.print_plan(SCAN_PLAN)
+
+    # --- Start anchor searches where the UI was last seen ---
+    if PERSIST_ANCHORS:
+        nav.anchor_memory.load_state(load_state().get('anchor_positions'))
+
+    get_backend().hotkey('alt', 'tab')  # Alt-Tab to ensure game focus
     human_like_delay(0.15, 0.25)
     
     # --- Main Loop ---
     for cycle_num in range(NUMBER_OF_CYCLES):
-        last_id = load_or_initialize_scan_id()
-        current_scan_id = last_id + 1
+        current_scan_id, captured, screenshot_counter = begin_scan()
         print(f"\n{'='*60}\n--- STARTING CYCLE {cycle_num + 1}/{NUMBER_OF_CYCLES} | SCAN ID: {current_scan_id} ---\n{'='*60}")
-        save_scan_id(current_scan_id)
-        
-        # --- Initialize a counter for this scan cycle ---
-        screenshot_counter = 0
+        step_trace.start_cycle(current_scan_id)
 
-        # --- Phase 1: Open Trade Window (Once per cycle) ---
-        try:
-            print("\n[PHASE 1/2] Performing initial setup...")
-            nav.open_trade_window()
-            print("\n[SUCCESS] Trade window is open for this cycle.")
-        except ActionFailedException as e:
-            print(f"\n[FATAL] A critical error occurred during setup: {e}")
-            print(f"[FATAL] Aborting this cycle. Retrying in {CYCLE_WAIT_SECONDS} seconds.")
-            nav.close_trade_window()
+        # --- Phase 1: Open Trade Window (Once per cycle), retried until the setup deadline ---
+        print("\n[PHASE 1/3] Performing initial setup...")
+        setup_deadline = time.monotonic() + SETUP_DEADLINE_SECONDS
+        window_banners = None
+        while window_banners is None:
+            try:
+                nav.open_trade_window()
+                print("\n[SUCCESS] Trade window is open for this cycle.")
+                # Both selector banners are found in one frame and reused for the whole cycle.
+                window_banners = nav.locate_anchors(["currency_want_window", "currency_have_window"])
+            except ActionFailedException as e:
+                nav.close_trade_window()
+                if time.monotonic() >= setup_deadline:
+                    print(f"\n[FATAL] A critical error occurred during setup: {e}")
+                    break
+                print(f"\n[WARN] Setup failed: {e}. Retrying ({setup_deadline - time.monotonic():.0f}s left).")
+
+        if window_banners is None:
+            print(f"[FATAL] Aborting this cycle; scan {current_scan_id} will resume next time. "
+                  f"Retrying in {CYCLE_WAIT_SECONDS} seconds.")
+            step_trace.end_cycle()
             if cycle_num < NUMBER_OF_CYCLES - 1:
                 time.sleep(CYCLE_WAIT_SECONDS)
             continue
 
-        # --- Phase 2: Loop Through Trade Sessions ---
-        print("\n[PHASE 2/2] Starting data collection sessions...")
-        for session in TRADE_SESSIONS:
-            base_currency = session["base_currency"]
-            target_currencies = session["target_currencies"]
-
-            print(f"\n--- Starting Trade Session: Base Currency = {base_currency} ---")
+        # --- Phase 2: Capture every uncaptured pair in planned order ---
+        print("\n[PHASE 2/3] Starting data collection...")
+        pending_pairs = [pair for pair in SCAN_PLAN['pairs'] if pair not in captured]
+        if captured:
+            print(f"[INFO] Resuming scan {current_scan_id}: {len(captured)} pair(s) already captured, "
+                  f"{len(pending_pairs)} to go.")
+        # What each window currently shows; a failed selection leaves it unknown.
+        selected = {'want': None, 'have': None}
+        for want_currency, have_currency in pending_pairs:
+            print(f"\n--- Processing Pair: {want_currency} vs. {have_currency} ---")
+            step_trace.set_pair(want_currency, have_currency)
+            if capture_pair(want_currency, have_currency, current_scan_id, screenshot_counter, selected,
+                            window_banners, SCAN_PLAN['search_text'], ocr_pipeline, PAIR_DEADLINE_SECONDS):
+                screenshot_counter += 1
+                # With the OCR pipeline a pair only counts as captured once its lot is committed.
+                if ocr_pipeline is None:
+                    captured.add((want_currency, have_currency))
+                drain_committed(current_scan_id, captured)
+                save_scan_progress(current_scan_id, captured, screenshot_counter)
 
-            try:
-                # --- NEW LOGIC: Just select the base currency, don't re-open the window ---
-                nav.select_currency(base_currency, "currency_have_window")
-                print(f"[SUCCESS] Base currency '{base_currency}' selected.")
-            except ActionFailedException as e:
-                print(f"\n[ERROR] Failed to set base currency to '{base_currency}': {e}")
-                print("[ERROR] Aborting this session.")
-                continue # Skip to the next session
-
-            # --- Data Collection for the current session ---
-            for target_currency in target_currencies:
-                print(f"\n--- Processing Pair: {target_currency} vs. {base_currency} ---")
-                try:
-                    nav.select_currency(target_currency, "currency_want_window")
-                    nav.human_like_delay(0.35, 0.50)
-                    nav.capture_market_data(
-                        scan_id=current_scan_id,
-                        screenshot_index=screenshot_counter,
-                        currency_want=target_currency,
-                        currency_have=base_currency
-                    )
-                    screenshot_counter += 1
-                    print(f"[SUCCESS] Successfully captured data for {target_currency}.")
-                except ActionFailedException as e:
-                    print(f"\n[ERROR] Failed to process '{target_currency}'. Reason: {e}")
-                    print("[ERROR] Skipping to the next currency in this session.")
-                    continue
+        # --- Phase 3: Capture again any pair whose OCR failed validation ---
+        if ocr_pipeline is not None:
+            for recapture_round in range(RECAPTURE_MAX_ROUNDS):
+                if not ocr_pipeline.wait_for_results(RECAPTURE_WAIT_SECONDS):
+                    print("[WARN] OCR is still busy; re-capturing the failures known so far.")
+                failed_pairs = ocr_pipeline.take_failed_pairs(current_scan_id)
+                if not failed_pairs:
+                    break
+                print(f"\n[PHASE 3/3] Re-capturing {len(failed_pairs)} pair(s) that failed validation "
+                      f"(round {recapture_round + 1}/{RECAPTURE_MAX_ROUNDS})...")
+                for want_currency, have_currency in scan_planner.order_pairs(list(failed_pairs), (selected['want'], selected['have'])):
+                    print(f"\n--- Re-capturing Pair: {want_currency} vs. {have_currency} ---")
+                    step_trace.set_pair(want_currency, have_currency)
+                    if capture_pair(want_currency, have_currency, current_scan_id, screenshot_counter, selected,
+                                    window_banners, SCAN_PLAN['search_text'], ocr_pipeline, PAIR_DEADLINE_SECONDS):
+                        screenshot_counter += 1
+                        drain_committed(current_scan_id, captured)
+                        save_scan_progress(current_scan_id, captured, screenshot_counter)
 
         # --- Close the trade window at the very end of the cycle ---
-        print("\n--- All sessions for this cycle are complete. Closing trade window. ---")
+        print("\n--- Data collection for this cycle is done. Closing trade window. ---")
+        step_trace.set_pair(None, None)
         nav.close_trade_window()
+        step_trace.end_cycle()
+        scan_complete = True
+        if ocr_pipeline is not None:
+            scan_complete = ocr_pipeline.flush(PIPELINE_FLUSH_SECONDS)
+            drain_committed(current_scan_id, captured)
+            if not scan_complete:
+                print(f"[WARN] Not every lot of scan {current_scan_id} is committed yet; the scan stays open "
+                      f"and its uncommitted pairs are captured again on resume.")
+        # The scan is only complete once every planned pair is captured; pairs skipped after
+        # their deadline (e.g. during a disconnect) are captured when the scan is resumed.
+        missing_pairs = [pair for pair in SCAN_PLAN['pairs'] if pair not in captured]
+        if missing_pairs:
+            scan_complete = False
+            print(f"[WARN] Scan {current_scan_id} stays open; {len(missing_pairs)} pair(s) not captured: "
+                  + ", ".join(f"{want}/{have}" for want, have in missing_pairs))
+        save_scan_progress(current_scan_id, captured, screenshot_counter, complete=scan_complete,
+                           missing=missing_pairs)
+        nav.anchor_memory.report()
+        if PERSIST_ANCHORS:
+            update_state(anchor_positions=nav.anchor_memory.to_state())
 
         # --- Wait at the end of a full cycle ---
         if cycle_num < NUMBER_OF_CYCLES - 1:
@@ -114,4 +282,7 @@ if __name__ == '__main__':
             print(f"--- WAITING for {CYCLE_WAIT_SECONDS} seconds before next cycle ---")
             time.sleep(CYCLE_WAIT_SECONDS)
 
+    if ocr_pipeline is not None:
+        ocr_pipeline.close()
+
     print(f"\n{'='*60}\n--- ALL {NUMBER_OF_CYCLES} CYCLES COMPLETE. SCRIPT FINISHED. ---\n{'='*60}")
\ No newline at end of file
@@ -1,6 +1,6 @@
-import pyautogui
 import json
 import os
+import time
 import uuid
 from datetime import datetime, timezone
 from game_helper_functions import (
@@ -9,9 +9,35 @@ from game_helper_functions import (
     secs_between_keys,
     gaussian_random_point_in_rect,
     retry_action,
+    wait_until,
     ActionFailedException,
+    ConfigurationError,
     random_int
 )
+from template_registry import TemplateRegistry
+from screen_locator import Frame, AnchorMemory
+from screen_backend import get_backend
+import step_trace
+from step_trace import traced
+
+# --- Configuration ---
+# Pixels added on every side of an anchor's last known location before
+# falling back to a full-screen search.
+ANCHOR_ROI_PADDING = 120
+# After an action the next expected anchor is polled for instead of sleeping
+# for the slowest case. MIN_STEP_JITTER is always waited first.
+WAIT_TIMEOUT_SECONDS = 6.0
+WAIT_POLL_SECONDS = 0.1
+MIN_STEP_JITTER = (0.15, 0.35)
+# Currencies are first matched at this scale, then confirmed at full size.
+CURRENCY_COARSE_SCALE = 0.5
+# The search box filters the list, so the match normally sits in the top
+# slots; only this many pixels of the results region are searched first.
+CURRENCY_TOP_SLOTS_HEIGHT = 260
+# retry_action keeps retrying a step, with growing waits, for this long.
+ACTION_RETRY_DEADLINE_SECONDS = 8.0
+# How long ALT stays held after the market data has been captured.
+POST_CAPTURE_HOLD = (0.35, 0.8)
 
 # --- Config Loading ---
 try:
@@ -21,36 +47,59 @@ except FileNotFoundError:
     print("FATAL ERROR: game_config.json not found.")
     exit()
 
+# Every template is decoded once here; locate calls match against these
+# in-memory grayscale arrays instead of re-reading PNGs on every attempt.
+templates = TemplateRegistry(config, list(config.get('template_pyramid_scales', [1.0])) + [CURRENCY_COARSE_SCALE])
+
+# Last confirmed location of every anchor; searched first on the next locate.
+anchor_memory = AnchorMemory(padding=ANCHOR_ROI_PADDING, screen_size=get_backend().size())
+
 
 # --- PRIVATE HELPER FUNCTIONS (Internal Logic) ---
 
-def _find_and_click(config_key, action='click', search_region=None, confidence=0.8):
-    """Internal function to find a template and perform a mouse action."""
-    print(f"[INFO] Searching for template '{config_key}'...")
+def _locate_on_screen(template, region=None, confidence=0.8):
+    """Grabs the region (or whole screen) once and returns the template's location in it, or None."""
+    return Frame.grab(region).locate(template, confidence=confidence)
+
+def _find_and_click(config_key, action='click', search_region=None, confidence=0.8, location=None):
+    """
+    Internal function to find a template and perform a mouse action.
+    A location already found in a shared Frame can be passed to skip the search.
+    """
     item_config = config['navigation'].get(config_key)
     if not item_config:
-        raise ActionFailedException(f"Config key '{config_key}' not found in game_config.json")
+        raise ConfigurationError(f"Config key '{config_key}' not found in game_config.json")
 
-    template_path = item_config.get('template')
-    location = pyautogui.locateOnScreen(template_path, region=search_region, confidence=confidence)
+    if location is None:
+        print(f"[INFO] Searching for template '{config_key}'...")
+        template = templates.nav(config_key)
+        if template is None:
+            raise ConfigurationError(f"No template loaded for '{config_key}'.")
+        if search_region is not None:
+            location = _locate_on_screen(template, search_region, confidence)
+        else:
+            location = anchor_memory.locate(config_key, lambda region, conf: _locate_on_screen(template, region, conf), confidence)
 
-    if not location:
-        print(f"  [ERROR] Could not find template '{config_key}'.")
-        return None
+        if not location:
+            print(f"  [ERROR] Could not find template '{config_key}'.")
+            return None
 
-    print(f"  [SUCCESS] Found '{config_key}' at {location}.")
+        print(f"  [SUCCESS] Found '{config_key}' at {location}.")
+    else:
+        print(f"[INFO] Using known location for '{config_key}' at {location}.")
 
+    screen = get_backend()
     if action == 'click':
         click_zone = item_config.get('click_zone')
         if not isinstance(click_zone, list) or len(click_zone) != 4:
-            raise ActionFailedException(f"Invalid click_zone for '{config_key}'.")
+            raise ConfigurationError(f"Invalid click_zone for '{config_key}'.")
 
         zone_x, zone_y = location.left + click_zone[0], location.top + click_zone[1]
         zone_w, zone_h = click_zone[2], click_zone[3]
         target_x, target_y = gaussian_random_point_in_rect(zone_x, zone_y, zone_w, zone_h)
 
         print(f"  [ACTION] Clicking '{config_key}' at ({target_x}, {target_y})")
-        pyautogui.moveTo(target_x, target_y, duration=get_mouse_speed(), tween=pyautogui.easeOutQuad)
+        screen.move_to(target_x, target_y, duration=get_mouse_speed(), ease=True)
         human_like_delay(0.55, 0.70)
 
         # --- Preserving the special case for the NPC ---
@@ -59,14 +108,14 @@ def _find_and_click(config_key, action='click', search_region=None, confidence=0
             random_x_movement_return = random_x_movement - random_int(0,3)
             random_y_movement = random_int(-3,3)
             random_y_movement_return = random_y_movement - random_int(-1,1)
-            pyautogui.moveRel(random_x_movement, random_y_movement, duration=get_mouse_speed(), tween=pyautogui.easeOutQuad)
-            pyautogui.moveRel(-random_x_movement_return, -random_y_movement_return, duration=get_mouse_speed(), tween=pyautogui.easeOutQuad)
-            pyautogui.click()  # Second click for the actual interaction
+            screen.move_rel(random_x_movement, random_y_movement, duration=get_mouse_speed(), ease=True)
+            screen.move_rel(-random_x_movement_return, -random_y_movement_return, duration=get_mouse_speed(), ease=True)
+            screen.click()  # Second click for the actual interaction
             print("  [INFO] Performed special double-click for trader NPC.")
         else:
-            pyautogui.mouseDown()
+            screen.mouse_down()
             human_like_delay(0.027, 0.035)
-            pyautogui.mouseUp()
+            screen.mouse_up()
         # -----------------------------------------------------------------
 
     elif action == 'hover':
@@ -76,83 +125,169 @@ def _find_and_click(config_key, action='click', search_region=None, confidence=0
         target_x, target_y = gaussian_random_point_in_rect(zone_x, zone_y, zone_w, zone_h)
 
         print(f"  [ACTION] Hovering '{config_key}' in zone at ({target_x}, {target_y})")
-        pyautogui.moveTo(target_x, target_y, duration=get_mouse_speed())
+        screen.move_to(target_x, target_y, duration=get_mouse_speed())
 
     return location
 
-def _find_and_click_currency(currency_name):
-    """Internal function to find and click a specific currency template."""
-    print(f"[INFO] Searching for currency template '{currency_name}'...")
-    template_path = config['currency_name_templates'].get(currency_name)
-    if not template_path:
-        raise ActionFailedException(f"No template for currency '{currency_name}' in config.")
+def _wait_for_anchor(config_key, timeout=WAIT_TIMEOUT_SECONDS, min_delay=MIN_STEP_JITTER, confidence=0.8):
+    """
+    Waits for a navigation anchor to appear after a UI action and returns its
+    location. Only the anchor's remembered region is polled when there is one,
+    with a single full-screen search if it does not show up there in time.
+    """
+    with step_trace.span(f"wait:{config_key}"):
+        template = templates.nav(config_key)
+        if template is None:
+            raise ConfigurationError(f"No template loaded for '{config_key}'.")
+
+        region = anchor_memory.region_for(config_key)
+        start = time.monotonic()
+        location = wait_until(lambda: _locate_on_screen(template, region, confidence), timeout, WAIT_POLL_SECONDS, min_delay)
+        if region is not None:
+            anchor_memory.record(config_key, bool(location))
+            if not location:
+                location = _locate_on_screen(template, None, confidence)
+        if not location:
+            raise ActionFailedException(f"'{config_key}' did not appear within {timeout:.1f}s.")
+
+        anchor_memory.remember(config_key, location)
+        print(f"  [SUCCESS] '{config_key}' ready after {time.monotonic() - start:.2f}s at {location}.")
+        return location
+
+@traced("click_currency")
+def _click_currency(currency_name):
+    """Waits for a currency to appear in the search results and clicks it."""
+    print(f"[INFO] Waiting for currency template '{currency_name}'...")
+    template = templates.currency(currency_name)
+    if template is None:
+        raise ConfigurationError(f"No template for currency '{currency_name}' in config.")
+
+    coarse_template = templates.currency(currency_name, CURRENCY_COARSE_SCALE)
 
     search_region = config['navigation']['currency_search_results_region']
-    location = pyautogui.locateOnScreen(template_path, region=search_region, confidence=0.9)
+    top_slots = (search_region[0], search_region[1], search_region[2], min(search_region[3], CURRENCY_TOP_SLOTS_HEIGHT))
+    start = time.monotonic()
+    location = wait_until(
+        lambda: Frame.grab(top_slots).locate_coarse_to_fine(template, coarse_template, CURRENCY_COARSE_SCALE, confidence=0.9),
+        WAIT_TIMEOUT_SECONDS, WAIT_POLL_SECONDS, MIN_STEP_JITTER
+    )
+    if not location:
+        # Last resort: the whole results region at full resolution.
+        location = Frame.grab(search_region).locate(template, confidence=0.9)
+    if not location:
+        raise ActionFailedException(f"Could not find template for currency '{currency_name}'.")
 
-    if location:
-        center = pyautogui.center(location)
-        print(f"  [SUCCESS] Found currency '{currency_name}' at {location}.")
-        pyautogui.moveTo(center, duration=get_mouse_speed(), tween=pyautogui.easeOutQuad)
-        pyautogui.mouseDown()
-        human_like_delay(0.05, 0.12)
-        pyautogui.mouseUp()
-        human_like_delay(0.086, 0.122)
-        return True
+    print(f"  [SUCCESS] Found currency '{currency_name}' at {location} after {time.monotonic() - start:.2f}s.")
+    screen = get_backend()
+    screen.move_to(location.left + location.width // 2, location.top + location.height // 2, duration=get_mouse_speed(), ease=True)
+    screen.mouse_down()
+    human_like_delay(0.05, 0.12)
+    screen.mouse_up()
+    human_like_delay(0.086, 0.122)
 
-    print(f"  [ERROR] Could not find template for currency '{currency_name}'.")
-    return False
+def _locate_in_new_frame(config_key, confidence=0.8):
+    """
+    Grabs one frame and looks for an anchor in its remembered region (or the
+    whole frame if it has none); returns (frame, location) or None.
+    """
+    frame = Frame.grab()
+    location = frame.locate(templates.nav(config_key), anchor_memory.region_for(config_key), confidence)
+    if not location:
+        print(f"  [ERROR] Could not find template '{config_key}'.")
+        return None
+    return frame, location
 
 # --- PUBLIC API FUNCTIONS (Called from the main script) ---
 
+def locate_anchors(config_keys, confidence=0.8, frame=None):
+    """
+    Finds several navigation anchors in a single screen grab and returns
+    {config_key: location or None}. Pass a Frame to reuse an existing grab.
+    """
+    frame = frame or Frame.grab()
+    locations = {
+        key: anchor_memory.locate(key, lambda region, conf, t=templates.nav(key): frame.locate(t, region, conf), confidence)
+        for key in config_keys
+    }
+    found = ", ".join(f"{key}={'yes' if loc else 'no'}" for key, loc in locations.items())
+    print(f"[INFO] Located anchors in one frame: {found}")
+    return locations
+
+@traced("open_trade_window")
 def open_trade_window():
     """Finds the NPC, clicks, and navigates the dialogue to open the trade window."""
     print("\n--- Opening Trade Window ---")
-    retry_action(_find_and_click, config_key="trader_npc", action='click')
-    human_like_delay(1.75, 2.75)
-    retry_action(_find_and_click, config_key="dialogue_option", action='click')
-    human_like_delay(0.75, 1.75)
+    retry_action(_find_and_click, retries=None, deadline_s=ACTION_RETRY_DEADLINE_SECONDS,
+                 config_key="trader_npc", action='click')
+    dialogue = _wait_for_anchor("dialogue_option")
+    _find_and_click("dialogue_option", action='click', location=dialogue)
+    _wait_for_anchor("currency_have_window")
     print("[SUCCESS] Trade window is open.")
 
-def select_currency(currency_name, window_config_key):
-    """Selects a currency in either the 'want' or 'have' window."""
+@traced("select_currency")
+def select_currency(currency_name, window_config_key, window_location=None, search_text=None):
+    """
+    Selects a currency in either the 'want' or 'have' window. If the window's
+    banner was already located (see locate_anchors), it is clicked without a
+    new search; should the search box then not appear, the banner is searched
+    for again once. search_text (e.g. a short unambiguous prefix) is typed
+    instead of the full name when given.
+    """
     print(f"\n--- Selecting '{currency_name}' in '{window_config_key}' ---")
-    retry_action(_find_and_click, config_key=window_config_key, action='click')
-    human_like_delay(0.75, 1.75)
-    retry_action(_find_and_click, config_key="search_box", action='click')
+    search_box = None
+    if window_location is not None:
+        _find_and_click(window_config_key, action='click', location=window_location)
+        try:
+            search_box = _wait_for_anchor("search_box")
+        except ActionFailedException:
+            print(f"  [WARN] Known location for '{window_config_key}' looks stale; searching again.")
+    if search_box is None:
+        retry_action(_find_and_click, retries=None, deadline_s=ACTION_RETRY_DEADLINE_SECONDS,
+                     config_key=window_config_key, action='click')
+        search_box = _wait_for_anchor("search_box")
+    _find_and_click("search_box", action='click', location=search_box)
     human_like_delay(0.25, 0.55)
 
-    print(f"[ACTION] Typing: '{currency_name}'")
-    pyautogui.typewrite(currency_name, interval=secs_between_keys())
+    search_text = search_text or currency_name
+    print(f"[ACTION] Typing: '{search_text}'")
+    get_backend().type_text(search_text, interval=secs_between_keys())
 
-    retry_action(_find_and_click_currency, currency_name=currency_name)
-    human_like_delay(0.45, 0.75)
+    _click_currency(currency_name)
+    human_like_delay(*MIN_STEP_JITTER)
     print(f"[SUCCESS] Selected '{currency_name}'.")
 
-def capture_market_data(scan_id, screenshot_index, currency_want, currency_have):
-    """Hovers, presses ALT, finds the anchor, and takes a screenshot."""
+@traced("capture_market_data")
+def capture_market_data(scan_id, screenshot_index, currency_want, currency_have, pipeline=None):
+    """
+    Hovers, presses ALT, finds the anchor, and takes a screenshot.
+
+    With an ocr_pipeline.OcrPipeline the captured region is handed over in
+    memory instead of being written to screenshots/ as PNG + JSON.
+    """
     print("\n--- Capturing Market Data ---")
+    screen = get_backend()
     try:
-        retry_action(_find_and_click, config_key="pre_screenshot_hover_target", action='hover')
+        retry_action(_find_and_click, retries=None, deadline_s=ACTION_RETRY_DEADLINE_SECONDS,
+                     config_key="pre_screenshot_hover_target", action='hover')
         random_x_movement = random_int(1,10)
         random_x_movement_return = random_x_movement - random_int(0,3)
         random_y_movement = random_int(-3,3)
         random_y_movement_return = random_y_movement - random_int(-1,1)
-        pyautogui.moveRel(random_x_movement, random_y_movement, duration=get_mouse_speed(), tween=pyautogui.easeOutQuad)
-        pyautogui.moveRel(-random_x_movement_return, -random_y_movement_return, duration=get_mouse_speed(), tween=pyautogui.easeOutQuad)
+        screen.move_rel(random_x_movement, random_y_movement, duration=get_mouse_speed(), ease=True)
+        screen.move_rel(-random_x_movement_return, -random_y_movement_return, duration=get_mouse_speed(), ease=True)
         
-        pyautogui.keyDown('alt')
+        screen.key_down('alt')
         print("  [INFO] ALT key down.")
         human_like_delay(0.095, 0.13)
-        pyautogui.keyUp('alt')
-        pyautogui.keyDown('alt')
+        screen.key_up('alt')
+        screen.key_down('alt')
         human_like_delay(0.095, 0.13)
 
-        anchor_location = retry_action(
-            pyautogui.locateOnScreen,
-            image=config['navigation']['market_data_anchor']['template'],
-            confidence=0.8
-        )
+        # Wait until the ALT overlay shows the anchor, then find it again in the
+        # frame the market table is cropped from.
+        _wait_for_anchor('market_data_anchor', min_delay=(0.0, 0.0))
+        frame, anchor_location = retry_action(_locate_in_new_frame, retries=None, deadline_s=ACTION_RETRY_DEADLINE_SECONDS,
+                                                config_key='market_data_anchor', confidence=0.8)
         print(f"  [SUCCESS] Found anchor at {anchor_location}")
 
         ss_conf = config['navigation']['market_data_anchor']['full_screenshot_zone']
@@ -168,12 +303,17 @@ def capture_market_data(scan_id, screenshot_index, currency_want, currency_have)
         # --- Generate the sequential filename ---
         # The :03d formats the number with leading zeros (e.g., 1 -> 001, 10 -> 010)
         file_basename = f"scan_{scan_id:06d}_{screenshot_index:03d}"
-        
-        screenshot_path = os.path.join(screenshots_dir, f'{file_basename}.png')
-        pyautogui.screenshot(screenshot_path, region=capture_region)
-        print(f"  [SUCCESS] Screenshot saved to {screenshot_path}")
 
-        human_like_delay(1.75, 4)
+        screenshot = frame.crop(capture_region)
+        if pipeline is not None:
+            print(f"  [SUCCESS] Screenshot captured for Lot ID: {file_basename}")
+        else:
+            screenshot_path = os.path.join(screenshots_dir, f'{file_basename}.png')
+            with step_trace.span("save_screenshot"):
+                screenshot.save(screenshot_path)
+            print(f"  [SUCCESS] Screenshot saved to {screenshot_path}")
+
+        human_like_delay(*POST_CAPTURE_HOLD)
 
         metadata = {
             "scan_id": scan_id,
@@ -183,18 +323,33 @@ def capture_market_data(scan_id, screenshot_index, currency_want, currency_have)
             "currency_have": currency_have,
             "status": "unprocessed"
         }
+        if pipeline is not None:
+            pipeline.submit(screenshot, metadata)
+            print(f"  [SUCCESS] Queued Lot ID {file_basename} for OCR")
+            return
+
+        # The metadata file marks the capture as ready for ocr_processor's watch mode, so it
+        # is written under a temporary name and renamed once complete.
         metadata_path = os.path.join(screenshots_dir, f'{file_basename}.json')
-        with open(metadata_path, 'w') as f:
+        with open(metadata_path + '.tmp', 'w') as f:
             json.dump(metadata, f, indent=4)
+        os.replace(metadata_path + '.tmp', metadata_path)
         print(f"  [SUCCESS] Metadata saved for Lot ID: {file_basename}")
 
     finally:
-        pyautogui.keyUp('alt')
+        screen.key_up('alt')
         print("  [INFO] ALT key up.")
 
+@traced("close_trade_window")
 def close_trade_window():
     """Presses the Escape key to close the main trade window."""
     print("\n--- Closing Trade Window ---")
-    pyautogui.press('esc')
-    human_like_delay(1.0, 1.5) # Wait for the window to close
+    get_backend().press('esc')
+    # Wait for the window to close
+    template = templates.nav("currency_have_window")
+    region = anchor_memory.region_for("currency_have_window")
+    if template is None:
+        human_like_delay(1.0, 1.5)
+    elif not wait_until(lambda: not _locate_on_screen(template, region), WAIT_TIMEOUT_SECONDS, WAIT_POLL_SECONDS, MIN_STEP_JITTER):
+        print("  [WARN] Trade window still appears to be open.")
     print("[SUCCESS] Trade window closed. Returning to main game world.")
\ No newline at end of file
@@ -1,6 +1,7 @@
 import random
 import time
 import numpy as np
+import step_trace
 
 def random_float(start, end):
     """Generates a random float within a given range."""
@@ -12,7 +13,9 @@ def random_int(start, end):
 
 def human_like_delay(min_seconds=0.5, max_seconds=1.5):
     """Pauses execution for a random duration to mimic human behavior."""
-    time.sleep(random_float(min_seconds, max_seconds))
+    seconds = random_float(min_seconds, max_seconds)
+    time.sleep(seconds)
+    step_trace.add("sleep_s", seconds)
 
 def get_mouse_speed():
     """Returns a random duration for mouse movements."""
@@ -38,35 +41,80 @@ def secs_between_keys():
     """Generates a faster, more specific typing interval."""
     return random_float(0.0127, 0.0627)
 
+def wait_until(predicate, timeout=5.0, poll_interval=0.1, min_delay=(0.0, 0.0)):
+    """
+    Waits a human-like minimum (random within min_delay), then polls
+    predicate() until it returns a truthy value or timeout seconds pass.
+
+    Returns:
+        The predicate's result, or None on timeout.
+    """
+    human_like_delay(*min_delay)
+    deadline = time.monotonic() + timeout
+    while True:
+        result = predicate()
+        if result:
+            return result
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(poll_interval)
+
 class ActionFailedException(Exception):
     """Custom exception to signal a non-recoverable failure in a GUI action."""
     pass
 
-def retry_action(func, retries=3, delay=0.5, **kwargs):
+class ConfigurationError(ActionFailedException):
+    """A failure no retry can fix, such as a missing config key or template."""
+    pass
+
+def retry_action(func, retries=3, delay=0.5, deadline_s=None, backoff=2.0, max_delay=4.0, **kwargs):
     """
     Attempts to execute a function multiple times, raising an exception on failure.
+    The wait between attempts starts at delay and grows by backoff each time.
 
     Args:
         func (callable): The function to execute.
-        retries (int): The maximum number of attempts.
-        delay (float): The time in seconds to wait between retries.
+        retries (int): The maximum number of attempts (None for no limit other than deadline_s).
+        delay (float): The time in seconds to wait after the first failed attempt.
+        deadline_s (float): Stop retrying once this many seconds have passed (None for no deadline).
+        backoff (float): Factor the wait grows by after every failed attempt.
+        max_delay (float): Upper bound for the wait between attempts.
         **kwargs: Keyword arguments to pass to the function.
 
     Returns:
         The result of the successful function call.
 
     Raises:
-        ActionFailedException: If the function fails after all retries.
+        ConfigurationError: At once, as retrying cannot fix it.
+        ActionFailedException: If the function fails after all retries or past the deadline.
     """
-    for attempt in range(retries):
-        try:
-            result = func(**kwargs)
-            if result: # Assumes the function returns a non-False/non-None value on success
-                return result
-            print(f"  [WARN] Attempt {attempt + 1}/{retries} failed for '{func.__name__}'. Retrying...")
-        except Exception as e:
-            print(f"  [WARN] Attempt {attempt + 1}/{retries} for '{func.__name__}' raised an exception: {e}. Retrying...")
-
-        time.sleep(delay)
-
-    raise ActionFailedException(f"Action '{func.__name__}' failed after {retries} attempts.")
\ No newline at end of file
+    deadline = None if deadline_s is None else time.monotonic() + deadline_s
+    wait = delay
+    attempt = 0
+    with step_trace.span(f"retry:{func.__name__}", target=kwargs.get('config_key')) as record:
+        while True:
+            attempt += 1
+            record["attempts"] = attempt
+            try:
+                result = func(**kwargs)
+                if result: # Assumes the function returns a non-False/non-None value on success
+                    return result
+                print(f"  [WARN] Attempt {attempt} failed for '{func.__name__}'.")
+            except ConfigurationError:
+                raise
+            except Exception as e:
+                print(f"  [WARN] Attempt {attempt} for '{func.__name__}' raised an exception: {e}.")
+
+            if retries is not None and attempt >= retries:
+                break
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                wait = min(wait, remaining)
+            time.sleep(wait)
+            step_trace.add("sleep_s", wait)
+            wait = min(wait * backoff, max_delay)
+
+        # Raised inside the span so the trace records the step as failed.
+        raise ActionFailedException(f"Action '{func.__name__}' failed after {attempt} attempts.")
\ No newline at end of file
@@ -0,0 +1,123 @@
+import cv2
+import numpy as np
+
+# --- Configuration ---
+DEFAULT_CONFIDENCE_THRESHOLD = 0.70
+# Two hits are treated as the same character when they share more than this
+# fraction of the narrower glyph's width.
+DEFAULT_OVERLAP_THRESHOLD = 0.5
+
+
+class GlyphMatcher:
+    """
+    Scores every glyph of a template set against a cell in one pass and
+    resolves overlapping hits by score instead of by x-position.
+    """
+
+    def __init__(self, template_set, threshold=DEFAULT_CONFIDENCE_THRESHOLD, overlap=DEFAULT_OVERLAP_THRESHOLD):
+        self.threshold = threshold
+        self.overlap = overlap
+        self.chars = list(template_set.keys())
+        self.templates = [template_set[c] for c in self.chars]
+        self.widths = np.array([t.shape[1] for t in self.templates], dtype=np.int32)
+        self.heights = np.array([t.shape[0] for t in self.templates], dtype=np.int32)
+
+    def score_volume(self, cell_gray):
+        """
+        Returns a (glyphs, H, W) array of TM_CCOEFF_NORMED scores. Positions a
+        glyph cannot occupy (because it is larger than the remaining cell) are -1.
+        """
+        h, w = cell_gray.shape[:2]
+        out_h = h - int(self.heights.min()) + 1
+        out_w = w - int(self.widths.min()) + 1
+        volume = np.full((len(self.templates), max(out_h, 0), max(out_w, 0)), -1.0, dtype=np.float32)
+        for g, template_img in enumerate(self.templates):
+            th, tw = template_img.shape
+            if th > h or tw > w:
+                continue
+            res = cv2.matchTemplate(cell_gray, template_img, cv2.TM_CCOEFF_NORMED)
+            volume[g, :res.shape[0], :res.shape[1]] = res
+        return volume
+
+    def find_hits(self, cell_gray):
+        """Returns a list of (x, char, score) hits after score-aware non-max suppression."""
+        if not self.templates:
+            return []
+        volume = self.score_volume(cell_gray)
+        if volume.size == 0:
+            return []
+        # Collapse the vertical axis before resolving columns.
+        return self._hits_from_columns(volume.max(axis=1))
+
+    def find_hits_in_bands(self, strip_gray, bands):
+        """
+        Matches every glyph once over a whole column strip and returns one hit
+        list per (y_start, y_end) band, relative to the strip. A glyph only
+        counts for a band if it fits entirely inside it, so each band gives
+        exactly what find_hits would return for that band cropped out.
+        """
+        if not self.templates:
+            return [[] for _ in bands]
+        volume = self.score_volume(strip_gray)
+        results = []
+        for y1, y2 in bands:
+            column_scores = np.full((len(self.templates), volume.shape[2]), -1.0, dtype=np.float32)
+            for g, th in enumerate(self.heights):
+                last_y = min(y2 - th + 1, volume.shape[1])
+                if last_y > y1:
+                    column_scores[g] = volume[g, y1:last_y].max(axis=0)
+            results.append(self._hits_from_columns(column_scores))
+        return results
+
+    def _hits_from_columns(self, column_scores):
+        """Resolves a (glyphs, W) array of per-column scores into sorted hits."""
+        best_glyph = column_scores.argmax(axis=0)         # (W,)
+        best_score = column_scores[best_glyph, np.arange(column_scores.shape[1])]
+
+        candidate_x = np.flatnonzero(best_score >= self.threshold)
+        if candidate_x.size == 0:
+            return []
+
+        # Greedy NMS in descending score order; the candidate list is tiny by now.
+        order = candidate_x[np.argsort(-best_score[candidate_x], kind='stable')]
+        ends = order + self.widths[best_glyph[order]]
+        kept = []
+        for start, end in zip(order, ends):
+            g = best_glyph[start]
+            suppressed = False
+            for k_start, k_end, k_glyph in kept:
+                inter = min(end, k_end) - max(start, k_start)
+                narrow = min(self.widths[g], self.widths[k_glyph])
+                if inter > self.overlap * narrow:
+                    suppressed = True
+                    break
+            if not suppressed:
+                kept.append((start, end, g))
+
+        kept.sort(key=lambda item: item[0])
+        return [(int(start), self.chars[g], float(best_score[start])) for start, _, g in kept]
+
+    def recognize(self, cell_image_cv):
+        """Same contract as ocr_processor.recognize_text_from_templates: BGR cell in, string out."""
+        cell_gray = cv2.cvtColor(cell_image_cv, cv2.COLOR_BGR2GRAY) if cell_image_cv.ndim == 3 else cell_image_cv
+        return "".join(char for _, char, _ in self.find_hits(cell_gray))
+
+    def recognize_bands(self, strip_gray, bands):
+        """Grayscale column strip plus row bands in, one string per band out."""
+        return ["".join(char for _, char, _ in hits) for hits in self.find_hits_in_bands(strip_gray, bands)]
+
+
+_matcher_cache = {}
+MATCHER_CACHE_SIZE = 8
+
+def get_matcher(template_set, threshold=DEFAULT_CONFIDENCE_THRESHOLD):
+    """Returns a GlyphMatcher for a template set, building it once per process."""
+    key = (id(template_set), threshold)
+    entry = _matcher_cache.get(key)
+    # The template dict is kept alongside the matcher so its id cannot be reused.
+    if entry is None or entry[0] is not template_set:
+        if len(_matcher_cache) >= MATCHER_CACHE_SIZE:
+            _matcher_cache.clear()
+        entry = (template_set, GlyphMatcher(template_set, threshold=threshold))
+        _matcher_cache[key] = entry
+    return entry[1]
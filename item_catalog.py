@@ -0,0 +1,217 @@
+import os
+import re
+import csv
+import sys
+import json
+import time
+import pickle
+from collections import namedtuple
+
+# --- Configuration ---
+# The catalog is built from these sources and cached as a pickled index; the
+# cache is rebuilt whenever any source's size or mtime differs from the build.
+ITEM_DATA_FILE = 'item_data.json'      # full poe2scout item dump (optional)
+TARGET_CSV_FILE = 'target_item_ids.csv' # target flags, and the items if there is no dump
+GAME_CONFIG_FILE = 'game_config.json'   # currency_name_templates
+CACHE_FILE = 'item_catalog.cache'
+CACHE_VERSION = 1
+READ_CHUNK_CHARS = 1 << 16
+
+Item = namedtuple('Item', 'item_id name api_id category is_target template')
+
+_SKIP = re.compile(r'[\s,]*')
+
+
+def iter_json_array(path, chunk_chars=READ_CHUNK_CHARS):
+    """Yields the elements of a top-level JSON array one by one, reading the file in chunks."""
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = f.read(chunk_chars).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError(f"'{path}' is not a JSON array.")
+        pos = 1
+        while True:
+            pos = _SKIP.match(buffer, pos).end()
+            if buffer.startswith(']', pos):
+                return
+            try:
+                element, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Usually an element cut off at the end of the buffer.
+                more = f.read(chunk_chars)
+                if not more:
+                    raise
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            yield element
+
+
+class ItemCatalog:
+    """
+    Every known item with O(1) lookups by itemID, name (case-insensitive),
+    apiID and category, plus the target set used by the scout scripts.
+    Items are kept as plain tuples with index dicts of row numbers, which
+    unpickle far faster than objects; Item tuples are made on lookup.
+    """
+
+    def __init__(self, rows, sources=None):
+        self.rows = [tuple(row) for row in rows]
+        self.sources = sources or {}
+        self._by_id = {}
+        self._by_name = {}
+        self._by_api_id = {}
+        self._by_category = {}
+        for i, (item_id, name, api_id, category, _, _) in enumerate(self.rows):
+            self._by_id.setdefault(item_id, i)
+            self._by_name.setdefault(name.casefold(), i)
+            if api_id:
+                self._by_api_id.setdefault(api_id, i)
+            self._by_category.setdefault(category, []).append(i)
+        self._targets = [i for i, row in enumerate(self.rows) if row[4]]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _item(self, index):
+        return None if index is None else Item._make(self.rows[index])
+
+    def by_id(self, item_id):
+        return self._item(self._by_id.get(int(item_id)))
+
+    def by_name(self, name):
+        return self._item(self._by_name.get(name.casefold()))
+
+    def by_api_id(self, api_id):
+        return self._item(self._by_api_id.get(api_id))
+
+    def in_category(self, category):
+        return [self._item(i) for i in self._by_category.get(category, ())]
+
+    def categories(self):
+        return sorted(self._by_category)
+
+    def names(self):
+        return [row[1] for row in self.rows]
+
+    def targets(self, category=None):
+        """Target items in catalog order, optionally only those of one category."""
+        return [self._item(i) for i in self._targets if category is None or self.rows[i][3] == category]
+
+    def is_target(self, item_id_or_name):
+        item = self.by_name(item_id_or_name) if isinstance(item_id_or_name, str) else self.by_id(item_id_or_name)
+        return bool(item and item.is_target)
+
+    def id_to_name(self):
+        return {item_id: self.rows[i][1] for item_id, i in self._by_id.items()}
+
+    def template(self, name):
+        """Currency name template path from game_config.json, or None."""
+        item = self.by_name(name)
+        return item.template if item else None
+
+
+def _source_signature(paths):
+    signature = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature[path] = (stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            signature[path] = None
+    return signature
+
+
+def _read_targets(target_csv):
+    """Returns ({name: is_target}, [row dicts]) from the target CSV (empty if missing)."""
+    try:
+        with open(target_csv, 'r', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+    except FileNotFoundError:
+        return {}, []
+    return {row['name']: row.get('is_target') == '1' for row in rows}, rows
+
+
+def _read_templates(game_config_file):
+    try:
+        with open(game_config_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get('currency_name_templates', {})
+    except FileNotFoundError:
+        return {}
+
+
+def build_catalog(item_data_file=ITEM_DATA_FILE, target_csv=TARGET_CSV_FILE, game_config_file=GAME_CONFIG_FILE):
+    """
+    Builds the catalog from the sources. Items come from the item dump when
+    it exists (streamed, never loaded whole) and from the target CSV
+    otherwise; target flags always come from the CSV.
+    """
+    flags, rows = _read_targets(target_csv)
+    templates = _read_templates(game_config_file)
+
+    records = []
+    if os.path.exists(item_data_file):
+        for entry in iter_json_array(item_data_file):
+            name = entry.get("text") or entry.get("name")
+            item_id = entry.get("itemId")
+            if name and item_id is not None:
+                records.append((int(item_id), name, entry.get("apiId"), entry.get("categoryApiId")))
+    else:
+        for row in rows:
+            records.append((int(row['itemID']), row['name'], row.get('apiID'), row.get('category')))
+    if not records:
+        print(f"[ERROR] No items found in '{item_data_file}' or '{target_csv}'.")
+
+    # Items keep their target_item_ids.csv order (targets first, as that file is
+    # written and hand-edited); items only in the dump follow, targets first.
+    position = {row['name']: i for i, row in enumerate(rows)}
+    records.sort(key=lambda r: (r[1] not in position, position.get(r[1], 0), not flags.get(r[1], False), r[1]))
+    items = [(item_id, name, api_id, category, flags.get(name, False), templates.get(name))
+             for item_id, name, api_id, category in records]
+
+    known = {item[1] for item in items}
+    for name in templates:
+        if name not in known:
+            print(f"[WARN] Template '{name}' in '{game_config_file}' does not match any catalog item.")
+    return ItemCatalog(items, _source_signature((item_data_file, target_csv, game_config_file)))
+
+
+def load_catalog(cache_file=CACHE_FILE, item_data_file=ITEM_DATA_FILE, target_csv=TARGET_CSV_FILE,
+                 game_config_file=GAME_CONFIG_FILE, rebuild=False):
+    """Loads the cached catalog, rebuilding (and re-caching) it if any source changed."""
+    signature = _source_signature((item_data_file, target_csv, game_config_file))
+    if not rebuild:
+        try:
+            with open(cache_file, 'rb') as f:
+                version, catalog = pickle.load(f)
+            if version == CACHE_VERSION and catalog.sources == signature:
+                return catalog
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+            pass
+
+    catalog = build_catalog(item_data_file, target_csv, game_config_file)
+    tmp_path = cache_file + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump((CACHE_VERSION, catalog), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_file)
+    print(f"[INFO] Built item catalog: {len(catalog)} items, {len(catalog.targets())} targets.")
+    return catalog
+
+
+_catalog = None
+
+def get_catalog():
+    """The catalog for the working directory, loaded once per process."""
+    global _catalog
+    if _catalog is None:
+        _catalog = load_catalog()
+    return _catalog
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    catalog = load_catalog(rebuild='--rebuild' in sys.argv)
+    print(f"[INFO] {len(catalog)} items, {len(catalog.targets())} targets, "
+          f"{len(catalog.categories())} categories, loaded in {(time.perf_counter() - start) * 1000:.1f} ms")
+    for query in (a for a in sys.argv[1:] if a != '--rebuild'):
+        item = (catalog.by_id(query) if query.isdigit() else None) or catalog.by_name(query) or catalog.by_api_id(query)
+        print(f"  {query!r}: {item}" if item else f"  {query!r}: not found ({len(catalog.in_category(query))} items in that category)")
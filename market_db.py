@@ -0,0 +1,204 @@
+import sys
+import sqlite3
+import pandas as pd
+import market_store
+
+# --- Configuration ---
+MARKET_DB_FILE = 'market_data.sqlite'
+MIGRATE_CHUNK_ROWS = 5000
+
+# Strings that repeat on every CSV row (currency names, trade type, lot UUID)
+# are stored once in lookup tables and referenced by integer id. Lots are
+# indexed by pair then scan_id / timestamp, so a query for one pair only
+# touches that pair's slice of the table.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS currencies (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS trade_types (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS lots (
+    id INTEGER PRIMARY KEY,
+    lot_id TEXT NOT NULL UNIQUE,
+    scan_id INTEGER,
+    timestamp_utc TEXT,
+    want_id INTEGER NOT NULL REFERENCES currencies(id),
+    have_id INTEGER NOT NULL REFERENCES currencies(id)
+);
+CREATE INDEX IF NOT EXISTS idx_lots_pair_scan ON lots(want_id, have_id, scan_id);
+CREATE INDEX IF NOT EXISTS idx_lots_pair_time ON lots(want_id, have_id, timestamp_utc);
+CREATE INDEX IF NOT EXISTS idx_lots_scan ON lots(scan_id);
+CREATE TABLE IF NOT EXISTS quotes (
+    lot INTEGER NOT NULL REFERENCES lots(id),
+    trade_type INTEGER NOT NULL REFERENCES trade_types(id),
+    row_num INTEGER NOT NULL,
+    ratio REAL,
+    stock INTEGER,
+    PRIMARY KEY (lot, trade_type, row_num)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS superseded_lots (
+    lot_id TEXT PRIMARY KEY
+) WITHOUT ROWID;
+"""
+
+QUOTE_SELECT = """
+SELECT l.scan_id, l.lot_id, l.timestamp_utc, cw.name AS currency_want, ch.name AS currency_have,
+       t.name AS trade_type, q.row_num, q.ratio, q.stock
+FROM lots l
+JOIN quotes q ON q.lot = l.id
+JOIN trade_types t ON t.id = q.trade_type
+JOIN currencies cw ON cw.id = l.want_id
+JOIN currencies ch ON ch.id = l.have_id
+"""
+
+CATEGORICAL_COLUMNS = ['lot_id', 'currency_want', 'currency_have', 'trade_type']
+
+
+class MarketDB:
+    """
+    Indexed SQLite backend for market data with a small typed query API.
+    A pair is a (currency_want, currency_have) tuple, as in the CSV. Lots
+    listed in superseded_lots (see market_store.SUPERSEDED_FILE) are left
+    out of query results unless include_superseded is set.
+    """
+
+    def __init__(self, path: str = MARKET_DB_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._ids = {'currencies': {}, 'trade_types': {}}
+
+    def close(self):
+        self.conn.close()
+
+    def _lookup_id(self, table: str, name: str, create: bool = True):
+        """Returns the dictionary id for a string, inserting it if needed."""
+        cache = self._ids[table]
+        if name in cache:
+            return cache[name]
+        row = self.conn.execute(f"SELECT id FROM {table} WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            if not create:
+                return None
+            row = (self.conn.execute(f"INSERT INTO {table} (name) VALUES (?)", (name,)).lastrowid,)
+        cache[name] = row[0]
+        return row[0]
+
+    def insert_rows(self, rows):
+        """Inserts rows shaped like market_data.csv records; re-inserting a row replaces it."""
+        count = 0
+        with self.conn:
+            lot_ids = {}
+            for r in rows:
+                lot_key = r['lot_id']
+                lot = lot_ids.get(lot_key)
+                if lot is None:
+                    want_id = self._lookup_id('currencies', r['currency_want'])
+                    have_id = self._lookup_id('currencies', r['currency_have'])
+                    self.conn.execute(
+                        "INSERT OR IGNORE INTO lots (lot_id, scan_id, timestamp_utc, want_id, have_id) VALUES (?, ?, ?, ?, ?)",
+                        (lot_key, _as_int(r['scan_id']), r['timestamp_utc'], want_id, have_id)
+                    )
+                    lot = self.conn.execute("SELECT id FROM lots WHERE lot_id = ?", (lot_key,)).fetchone()[0]
+                    lot_ids[lot_key] = lot
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO quotes (lot, trade_type, row_num, ratio, stock) VALUES (?, ?, ?, ?, ?)",
+                    (lot, self._lookup_id('trade_types', r['trade_type']), _as_int(r['row_num']),
+                     _as_float(r['ratio']), _as_int(r['stock']))
+                )
+                count += 1
+        return count
+
+    def mark_superseded(self, lot_ids):
+        """Records lots as replaced by a later capture of the same pair and scan."""
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO superseded_lots (lot_id) VALUES (?)",
+                                  [(lot_id,) for lot_id in lot_ids])
+
+    def _pair_ids(self, pair):
+        want, have = pair
+        return self._lookup_id('currencies', want, create=False), self._lookup_id('currencies', have, create=False)
+
+    def _query(self, where: str, params: tuple, include_superseded: bool = False) -> pd.DataFrame:
+        if not include_superseded:
+            where += " AND l.lot_id NOT IN (SELECT lot_id FROM superseded_lots)"
+        sql = QUOTE_SELECT + where + " ORDER BY l.scan_id, l.timestamp_utc, t.name, q.row_num"
+        df = pd.read_sql_query(sql, self.conn, params=params)
+        df = df.astype({'scan_id': 'Int64', 'row_num': 'Int64', 'ratio': 'float64', 'stock': 'Int64'})
+        for column in CATEGORICAL_COLUMNS:
+            df[column] = df[column].astype('category')
+        return df
+
+    def get_book(self, pair, scan_id: int, include_superseded: bool = False) -> pd.DataFrame:
+        """Returns every row of one pair's order book captured in the given scan."""
+        want_id, have_id = self._pair_ids(pair)
+        return self._query("WHERE l.want_id = ? AND l.have_id = ? AND l.scan_id = ?", (want_id, have_id, scan_id),
+                           include_superseded)
+
+    def history(self, pair, start: str = None, end: str = None, include_superseded: bool = False) -> pd.DataFrame:
+        """
+        Returns one pair's rows with start <= timestamp_utc < end. Bounds are
+        '%Y-%m-%d %H:%M:%S' strings (or any prefix, e.g. '2025-10-08'); None is open.
+        """
+        want_id, have_id = self._pair_ids(pair)
+        where = "WHERE l.want_id = ? AND l.have_id = ?"
+        params = [want_id, have_id]
+        if start is not None:
+            where += " AND l.timestamp_utc >= ?"
+            params.append(start)
+        if end is not None:
+            where += " AND l.timestamp_utc < ?"
+            params.append(end)
+        return self._query(where, tuple(params), include_superseded)
+
+    def pairs(self):
+        """Returns every (currency_want, currency_have) pair with data."""
+        return self.conn.execute(
+            "SELECT DISTINCT cw.name, ch.name FROM lots l "
+            "JOIN currencies cw ON cw.id = l.want_id JOIN currencies ch ON ch.id = l.have_id "
+            "ORDER BY cw.name, ch.name"
+        ).fetchall()
+
+
+def _as_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+def _as_float(value):
+    try:
+        result = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if result != result else result
+
+
+def migrate_from_store(db_path: str = MARKET_DB_FILE):
+    """One-shot import of market_data.csv plus any pending segments into the SQLite backend."""
+    db = MarketDB(db_path)
+    total = 0
+    chunk = []
+    for row in market_store.iter_market_rows(include_superseded=True):
+        chunk.append(row)
+        if len(chunk) >= MIGRATE_CHUNK_ROWS:
+            total += db.insert_rows(chunk)
+            chunk = []
+    if chunk:
+        total += db.insert_rows(chunk)
+    db.mark_superseded(market_store.read_superseded())
+    print(f"Migrated {total} rows into '{db_path}' ({len(db.pairs())} pairs).")
+    db.close()
+
+
+if __name__ == "__main__":
+    # Usage: python market_db.py migrate
+    if len(sys.argv) > 1 and sys.argv[1] == 'migrate':
+        migrate_from_store()
+    else:
+        print("Usage: python market_db.py migrate")
+        sys.exit(1)
@@ -0,0 +1,166 @@
+import os
+import csv
+import sys
+import glob
+import time
+import heapq
+import pandas as pd
+
+# --- Configuration ---
+# market_data.csv stays the compacted, sorted base file. New batches land as
+# small sorted segment files next to it and are merged in lazily.
+BASE_CSV = 'market_data.csv'
+SEGMENTS_DIR = 'market_data_segments'
+COLUMNS = [
+    "scan_id", "lot_id", "timestamp_utc", "currency_want", "currency_have",
+    "trade_type", "row_num", "ratio", "stock"
+]
+SORT_ORDER = ['scan_id', 'timestamp_utc', 'trade_type', 'row_num']
+# Once more segments than this pile up they are merged into one segment.
+# Folding segments into the base file only happens on a full compaction.
+MAX_SEGMENTS = 32
+# lot_ids (one per line) replaced by another capture of the same pair in the
+# same scan. Their rows stay stored, but readers skip them by default.
+SUPERSEDED_FILE = 'market_data_superseded.txt'
+
+
+def _sort_key(row: dict):
+    """Sort key for a CSV row as read by csv.DictReader (all values are strings)."""
+    def as_int(value):
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return sys.maxsize
+    # Timestamps are written as '%Y-%m-%d %H:%M:%S', so string order is time order.
+    return (as_int(row['scan_id']), row['timestamp_utc'] or '\uffff', row['trade_type'], as_int(row['row_num']))
+
+
+def list_segments(segments_dir: str = SEGMENTS_DIR):
+    return sorted(glob.glob(os.path.join(segments_dir, 'segment_*.csv')))
+
+
+def _write_rows_atomic(path: str, rows):
+    """Writes rows to path via a temporary file so readers never see a partial file."""
+    tmp_path = path + '.tmp'
+    count = 0
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def append_batch(rows: list, segments_dir: str = SEGMENTS_DIR):
+    """
+    Stores a batch of extracted rows as one new sorted segment. The cost
+    depends only on the batch size, never on how much history exists.
+    Returns the segment path.
+    """
+    os.makedirs(segments_dir, exist_ok=True)
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    df = df.sort_values(by=SORT_ORDER, ascending=True, kind='mergesort')
+    segment_path = os.path.join(segments_dir, f"segment_{time.time_ns()}_{os.getpid()}.csv")
+    tmp_path = segment_path + '.tmp'
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, segment_path)
+
+    if len(list_segments(segments_dir)) > MAX_SEGMENTS:
+        compact(full=False, segments_dir=segments_dir)
+    return segment_path
+
+
+def mark_superseded(lot_ids, superseded_file: str = SUPERSEDED_FILE):
+    """Records lots as replaced by a later capture of the same pair and scan."""
+    lot_ids = list(lot_ids)
+    if not lot_ids:
+        return
+    with open(superseded_file, 'a', encoding='utf-8') as f:
+        f.writelines(f"{lot_id}\n" for lot_id in lot_ids)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_superseded(superseded_file: str = SUPERSEDED_FILE) -> set:
+    """Returns the set of superseded lot_ids (empty if none were recorded)."""
+    try:
+        with open(superseded_file, 'r', encoding='utf-8') as f:
+            return {line.strip() for line in f if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+def _iter_csv(path: str):
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
+
+
+def iter_market_rows(base_csv: str = BASE_CSV, segments_dir: str = SEGMENTS_DIR,
+                     include_superseded: bool = False, superseded_file: str = SUPERSEDED_FILE):
+    """
+    Yields every row (as a dict of strings) in SORT_ORDER by streaming a k-way
+    merge over the base file and all segments. Memory use is one row per file.
+    Rows of superseded lots are skipped unless include_superseded is set.
+    """
+    sources = [_iter_csv(p) for p in ([base_csv] if os.path.exists(base_csv) else []) + list_segments(segments_dir)]
+    rows = heapq.merge(*sources, key=_sort_key)
+    superseded = set() if include_superseded else read_superseded(superseded_file)
+    if superseded:
+        rows = (row for row in rows if row['lot_id'] not in superseded)
+    yield from rows
+
+
+def read_market_data(base_csv: str = BASE_CSV, segments_dir: str = SEGMENTS_DIR,
+                     include_superseded: bool = False, superseded_file: str = SUPERSEDED_FILE) -> pd.DataFrame:
+    """
+    Returns the whole market history, base file plus segments, as one
+    correctly ordered DataFrame, without superseded lots unless asked for.
+    """
+    paths = ([base_csv] if os.path.exists(base_csv) else []) + list_segments(segments_dir)
+    if not paths:
+        return pd.DataFrame(columns=COLUMNS)
+    df = pd.concat([pd.read_csv(p) for p in paths], ignore_index=True)
+    superseded = set() if include_superseded else read_superseded(superseded_file)
+    if superseded:
+        df = df[~df['lot_id'].isin(superseded)]
+    return df.sort_values(by=SORT_ORDER, ascending=True, kind='mergesort').reset_index(drop=True)
+
+
+def compact(full: bool = True, base_csv: str = BASE_CSV, segments_dir: str = SEGMENTS_DIR):
+    """
+    Merges segments with a streaming k-way merge. A partial compaction folds
+    all segments into a single segment; a full one folds them into the base file.
+    """
+    segments = list_segments(segments_dir)
+    if not segments or (not full and len(segments) < 2):
+        return 0
+
+    if full:
+        target = base_csv
+        sources = ([base_csv] if os.path.exists(base_csv) else []) + segments
+    else:
+        target = os.path.join(segments_dir, f"segment_{time.time_ns()}_{os.getpid()}.csv")
+        sources = segments
+
+    merged = heapq.merge(*[_iter_csv(p) for p in sources], key=_sort_key)
+    count = _write_rows_atomic(target, merged)
+    for path in segments:
+        os.remove(path)
+    print(f"[INFO] Compacted {len(segments)} segments into '{target}' ({count} rows).")
+    return len(segments)
+
+
+if __name__ == "__main__":
+    # Usage: python market_store.py [status|compact]
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    if command == 'compact':
+        compact(full=True)
+    elif command == 'status':
+        segments = list_segments()
+        print(f"Base file: '{BASE_CSV}' ({'present' if os.path.exists(BASE_CSV) else 'missing'})")
+        print(f"Pending segments in '{SEGMENTS_DIR}': {len(segments)}")
+    else:
+        print("Usage: python market_store.py [status|compact]")
+        sys.exit(1)
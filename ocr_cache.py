@@ -0,0 +1,160 @@
+import os
+import time
+import hashlib
+import sqlite3
+import numpy as np
+
+# --- Configuration ---
+DEFAULT_MAX_ENTRIES = 200_000
+SQLITE_TIMEOUT_SECONDS = 30
+
+
+def template_signature(templates: dict, *extra) -> str:
+    """
+    Hashes every template image plus any extra settings (threshold, engine) so
+    cached text is never reused after the glyphs or the matcher change.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for category in sorted(templates):
+        for char in sorted(templates[category]):
+            img = templates[category][char]
+            h.update(f"{category}:{char}:{img.shape}".encode())
+            h.update(img.tobytes())
+    for value in extra:
+        h.update(repr(value).encode())
+    return h.hexdigest()
+
+
+def cell_key(cell_image, column: str, signature: str) -> str:
+    """Content address of a cropped cell: pixels, shape, column and template signature."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{signature}:{column}:{cell_image.shape}".encode())
+    h.update(cell_image.tobytes())
+    return h.hexdigest()
+
+
+class CellTextCache:
+    """
+    Maps hashed cell pixels to recognized text. Backed by SQLite so worker
+    processes can share it and it survives between runs; each process opens
+    its own connection. It also keeps the grayscale cells of each pair's most
+    recent capture so unchanged rows can be recognized by a tolerant diff.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.counters = {}
+        self._touched = []
+        self.conn = sqlite3.connect(path, timeout=SQLITE_TIMEOUT_SECONDS)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cell_text ("
+            " key TEXT PRIMARY KEY, text TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_cell_text_last_used ON cell_text(last_used)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS previous_cells ("
+            " pair TEXT NOT NULL, cell TEXT NOT NULL, height INTEGER NOT NULL, width INTEGER NOT NULL,"
+            " pixels BLOB NOT NULL, text TEXT NOT NULL, PRIMARY KEY (pair, cell))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS stats ("
+            " name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+        self.conn.commit()
+
+    def get_many(self, keys):
+        """Returns {key: text} for every key already in the cache and records hits/misses."""
+        unique_keys = list(set(keys))
+        found = {}
+        # SQLite limits bound parameters per statement; lookups are per screenshot so this is small.
+        for start in range(0, len(unique_keys), 500):
+            chunk = unique_keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT key, text FROM cell_text WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            found.update(rows)
+        hits = sum(1 for k in keys if k in found)
+        self.count("hits", hits)
+        self.count("misses", len(keys) - hits)
+        self._touched.extend(found)
+        return found
+
+    def count(self, name: str, n: int = 1):
+        """Adds to a named counter; counters are flushed to the shared stats table by put_many."""
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def get_previous_cells(self, pair: str):
+        """Returns {cell: (gray_pixels, text)} from the last capture stored for pair."""
+        rows = self.conn.execute(
+            "SELECT cell, height, width, pixels, text FROM previous_cells WHERE pair = ?", (pair,)
+        ).fetchall()
+        return {
+            cell: (np.frombuffer(pixels, dtype=np.uint8).reshape(height, width), text)
+            for cell, height, width, pixels, text in rows
+        }
+
+    def put_previous_cells(self, pair: str, cells: dict):
+        """Replaces the stored capture for pair with {cell: (gray_pixels, text)}."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO previous_cells (pair, cell, height, width, pixels, text) VALUES (?, ?, ?, ?, ?, ?)",
+                [(pair, cell, img.shape[0], img.shape[1], np.ascontiguousarray(img).tobytes(), text)
+                 for cell, (img, text) in cells.items()]
+            )
+
+    def put_many(self, items: dict):
+        """Stores {key: text} and flushes last-used times and hit counters."""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO cell_text (key, text, last_used) VALUES (?, ?, ?)",
+                [(k, v, now) for k, v in items.items()]
+            )
+            if self._touched:
+                self.conn.executemany(
+                    "UPDATE cell_text SET last_used = ? WHERE key = ?",
+                    [(now, k) for k in self._touched]
+                )
+            self.conn.executemany(
+                "INSERT INTO stats (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                list(self.counters.items())
+            )
+        self._touched = []
+        self.counters = {}
+
+    def read_stats(self):
+        """Returns {counter: total} accumulated by every process since the last reset."""
+        return dict(self.conn.execute("SELECT name, value FROM stats").fetchall())
+
+    def reset_stats(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM stats")
+
+    def prune(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """Evicts the least recently used entries beyond max_entries. Returns the number removed."""
+        with self.conn:
+            cur = self.conn.execute(
+                "DELETE FROM cell_text WHERE key IN ("
+                " SELECT key FROM cell_text ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (max_entries,)
+            )
+        return cur.rowcount
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM cell_text").fetchone()[0]
+
+
+_open_caches = {}
+
+def get_cell_cache(path: str) -> CellTextCache:
+    """Returns this process's connection to the cache at path, opening it on first use."""
+    key = (os.getpid(), os.path.abspath(path))
+    cache = _open_caches.get(key)
+    if cache is None:
+        cache = CellTextCache(path)
+        _open_caches[key] = cache
+    return cache
@@ -0,0 +1,319 @@
+import os
+import json
+import time
+import queue
+import threading
+from concurrent.futures import BrokenExecutor
+import cv2
+import numpy as np
+import ocr_processor as ocr
+
+# --- Configuration ---
+MAX_QUEUED_LOTS = 16
+ARCHIVE_DIR = os.path.join(ocr.SCREENSHOTS_DIR, 'archive')
+# Archive every Nth lot as PNG + JSON (0 disables); lots that fail the
+# validation check below are archived regardless when ARCHIVE_FAILURES is set.
+ARCHIVE_EVERY_N = 0
+ARCHIVE_FAILURES = True
+COMMIT_BATCH_SIZE = 8
+COMMIT_MAX_DELAY_SECONDS = 5.0
+# Best available ratio of a pair times that of its inverse pair should be close to 1.
+INVERSE_PAIR_TOLERANCE = 2.0
+# Largest believable change of a pair's best available ratio between two scans.
+LAST_SCAN_TOLERANCE = 3.0
+
+_STOP = object()
+_FLUSH = object()
+
+
+def lot_failed_validation(rows: list) -> bool:
+    """A lot is suspect if nothing was read or any row is missing its ratio or stock."""
+    return not rows or any(r['ratio'] is None or r['stock'] is None for r in rows)
+
+
+def best_available_ratio(rows: list):
+    """Ratio of the first available_trades row, or None."""
+    for r in rows:
+        if r['trade_type'] == 'available_trades' and r['row_num'] == 1:
+            return r['ratio']
+    return None
+
+
+def lot_validation_issues(rows: list, best_ratios: dict) -> list:
+    """
+    Checks a lot's parsed book and returns a list of problems (empty if it
+    looks right). best_ratios maps (want, have) to (scan_id, best available
+    ratio) of lots that already passed, for the inverse-pair and last-scan checks.
+    """
+    if not rows:
+        return ["no rows read"]
+    issues = []
+    for r in rows:
+        if r['ratio'] is None or r['stock'] is None:
+            issues.append(f"{r['trade_type']} row {r['row_num']} is missing its ratio or stock")
+        elif r['ratio'] <= 0 or r['stock'] <= 0:
+            issues.append(f"{r['trade_type']} row {r['row_num']} has a non-positive value")
+
+    # Available trades are listed best-first with falling ratios, competing trades with rising ones.
+    for trade_type, sign in (('available_trades', -1), ('competing_trades', 1)):
+        ratios = [r['ratio'] for r in sorted(rows, key=lambda r: r['row_num'])
+                  if r['trade_type'] == trade_type and r['ratio'] is not None]
+        if any(sign * (b - a) < 0 for a, b in zip(ratios, ratios[1:])):
+            issues.append(f"{trade_type} ratios are out of order")
+
+    best = best_available_ratio(rows)
+    if best:
+        want, have, scan_id = rows[0]['currency_want'], rows[0]['currency_have'], rows[0]['scan_id']
+        inverse = best_ratios.get((have, want))
+        if inverse and inverse[0] == scan_id and inverse[1]:
+            product = best * inverse[1]
+            if not 1 / INVERSE_PAIR_TOLERANCE <= product <= INVERSE_PAIR_TOLERANCE:
+                issues.append(f"best ratio disagrees with {have}/{want} (product {product:.3g})")
+        previous = best_ratios.get((want, have))
+        if previous and previous[0] != scan_id and previous[1]:
+            change = best / previous[1]
+            if not 1 / LAST_SCAN_TOLERANCE <= change <= LAST_SCAN_TOLERANCE:
+                issues.append(f"best ratio moved x{change:.3g} since scan {previous[0]}")
+    return issues
+
+
+class OcrPipeline:
+    """
+    In-process handoff from capture to OCR. Captured regions go onto a
+    bounded queue as numpy buffers and are OCR'd by the warm worker pool;
+    results are committed to the market data store in small batches and PNG
+    archiving happens on a background thread, off the capture path. Every
+    lot is validated as it arrives; pairs that fail can be collected with
+    take_failed_pairs() and captured again while the trade window is open.
+    When a pair is captured more than once in a scan, only one lot is kept:
+    the others are marked superseded in the store (see _supersede).
+    on_committed, if given, is called from the writer thread with the
+    metadata of every lot once its rows are in the store.
+    """
+
+    def __init__(self, archive_every_n=ARCHIVE_EVERY_N, archive_failures=ARCHIVE_FAILURES, max_queued_lots=MAX_QUEUED_LOTS,
+                 on_committed=None):
+        self.archive_every_n = archive_every_n
+        self.archive_failures = archive_failures
+        self.on_committed = on_committed
+        self.ocr_config, _ = ocr.load_ocr_setup()
+        self.executor = ocr.create_worker_pool(self.ocr_config)
+        # Capture blocks on a full queue, so OCR falling behind slows capture instead of growing memory.
+        self.capture_queue = queue.Queue(maxsize=max_queued_lots)
+        self.in_flight = threading.BoundedSemaphore(max_queued_lots)
+        self.result_queue = queue.Queue()
+        self.lots_submitted = 0
+        self.lots_committed = 0
+        self.lots_archived = 0
+        self.lots_queued = 0
+        self.lots_validated = 0
+        # Lots that are committed, or had no rows to commit.
+        self.lots_settled = 0
+        self.validated = threading.Condition()
+        self.best_ratios = {}
+        self.failed_pairs = {}
+        # (want, have) -> (lot_id, passed validation) of the lot kept for that pair in
+        # scan kept_scan_id; writer thread only.
+        self.kept_scan_id = None
+        self.kept_lots = {}
+        self.dispatcher = threading.Thread(target=self._dispatch, name="ocr-dispatcher", daemon=True)
+        self.writer = threading.Thread(target=self._write, name="ocr-writer", daemon=True)
+        self.dispatcher.start()
+        self.writer.start()
+
+    def submit(self, screenshot, metadata: dict):
+        """Queues a PIL screenshot (as returned by pyautogui.screenshot) with its lot metadata."""
+        with self.validated:
+            self.lots_queued += 1
+        self.capture_queue.put((screenshot, metadata))
+
+    def wait_for_results(self, timeout: float) -> bool:
+        """Blocks until every submitted lot has been OCR'd and validated; False on timeout."""
+        with self.validated:
+            return self.validated.wait_for(lambda: self.lots_validated >= self.lots_queued, timeout)
+
+    def flush(self, timeout: float) -> bool:
+        """
+        Waits until every submitted lot has been OCR'd and committed (or had
+        nothing to commit). False on timeout, e.g. while commits keep failing.
+        """
+        deadline = time.monotonic() + timeout
+        if not self.wait_for_results(timeout):
+            return False
+        self.result_queue.put(_FLUSH)
+        with self.validated:
+            return self.validated.wait_for(lambda: self.lots_settled >= self.lots_queued,
+                                           max(0.0, deadline - time.monotonic()))
+
+    def take_failed_pairs(self, scan_id) -> dict:
+        """Returns and forgets {(want, have): [issues]} for lots of scan_id that failed validation."""
+        with self.validated:
+            failed = {key[1:]: issues for key, issues in self.failed_pairs.items() if key[0] == scan_id}
+            self.failed_pairs = {key: v for key, v in self.failed_pairs.items() if key[0] != scan_id}
+        return failed
+
+    def close(self):
+        """Drains every queued lot, commits the remaining rows and shuts the pool down."""
+        self.capture_queue.put(_STOP)
+        self.dispatcher.join()
+        self.executor.shutdown(wait=True)
+        self.result_queue.put(_STOP)
+        self.writer.join()
+        print(f"[INFO] OCR pipeline committed {self.lots_committed}/{self.lots_submitted} lots, archived {self.lots_archived}.")
+
+    def _dispatch(self):
+        while True:
+            item = self.capture_queue.get()
+            if item is _STOP:
+                return
+            screenshot, metadata = item
+            self.in_flight.acquire()
+            lot_index = self.lots_submitted
+            self.lots_submitted += 1
+            image = None
+            try:
+                image = cv2.cvtColor(np.asarray(screenshot), cv2.COLOR_RGB2BGR)
+                future = self._submit_to_pool(image, metadata)
+            except Exception as e:
+                # The lot still reaches the writer, as a failed one, so it is counted and captured again.
+                print(f"[ERROR] Could not queue lot {metadata.get('lot_id')} for OCR: {e}")
+                self.in_flight.release()
+                self.result_queue.put((None, image, metadata, lot_index))
+                continue
+            future.add_done_callback(lambda f, image=image, metadata=metadata, lot_index=lot_index: self._on_done(f, image, metadata, lot_index))
+
+    def _submit_to_pool(self, image, metadata):
+        """Submits one lot to the worker pool, replacing the pool once if a worker died and broke it."""
+        try:
+            return self.executor.submit(ocr.process_image_in_worker, image, metadata)
+        except BrokenExecutor as e:
+            print(f"[WARN] OCR worker pool is broken ({e}); starting a new one.")
+            self.executor.shutdown(wait=False)
+            self.executor = ocr.create_worker_pool(self.ocr_config)
+            return self.executor.submit(ocr.process_image_in_worker, image, metadata)
+
+    def _on_done(self, future, image, metadata, lot_index):
+        self.in_flight.release()
+        try:
+            rows = future.result()
+        except Exception as e:
+            print(f"[ERROR] OCR failed for lot {metadata.get('lot_id')}: {e}")
+            rows = None
+        self.result_queue.put((rows, image, metadata, lot_index))
+
+    def _write(self):
+        # (rows, metadata, superseded lot_ids) of lots not yet in the store; a failed commit keeps them here for the next try.
+        pending = []
+        pending_since = None
+        stopping = False
+        while not stopping:
+            flushing = False
+            try:
+                item = self.result_queue.get(timeout=COMMIT_MAX_DELAY_SECONDS)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                stopping = True
+            elif item is _FLUSH:
+                flushing = True
+            elif item is not None:
+                rows, image, metadata, lot_index = item
+                failed = rows is None or lot_failed_validation(rows)
+                issues = self._validate(rows or [], metadata)
+                archive = (self.archive_failures and failed) or (self.archive_every_n and lot_index % self.archive_every_n == 0)
+                if archive and image is not None:
+                    self._archive(image, metadata, failed)
+                if rows:
+                    pending.append((rows, metadata, self._supersede(metadata, not issues)))
+                    if pending_since is None:
+                        pending_since = time.monotonic()
+                else:
+                    self._settle(1)
+
+            if pending and (
+                stopping or flushing or len(pending) >= COMMIT_BATCH_SIZE
+                or time.monotonic() - pending_since >= COMMIT_MAX_DELAY_SECONDS
+            ):
+                if self._commit(pending):
+                    pending, pending_since = [], None
+                else:
+                    pending_since = time.monotonic()
+        if pending:
+            self._save_uncommitted(pending)
+
+    def _commit(self, pending) -> bool:
+        try:
+            ocr.commit_results([row for rows, _, _ in pending for row in rows], [],
+                               superseded_lots=[lot_id for _, _, superseded in pending for lot_id in superseded])
+        except Exception as e:
+            print(f"[ERROR] Could not commit {len(pending)} lots to the market data store: {e}. "
+                  f"Retrying in {COMMIT_MAX_DELAY_SECONDS:.0f}s.")
+            return False
+        self.lots_committed += len(pending)
+        if self.on_committed:
+            self.on_committed([metadata for _, metadata, _ in pending])
+        self._settle(len(pending))
+        return True
+
+    def _settle(self, lots):
+        with self.validated:
+            self.lots_settled += lots
+            self.validated.notify_all()
+
+    def _save_uncommitted(self, pending):
+        """Last resort on close: keeps rows that never made it into the store, as JSON, so they are not lost."""
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        path = os.path.join(ARCHIVE_DIR, f"uncommitted_{time.strftime('%Y%m%d_%H%M%S')}.json")
+        with open(path, 'w') as f:
+            json.dump([{"metadata": metadata, "rows": rows, "superseded_lots": superseded}
+                       for rows, metadata, superseded in pending], f, indent=4, default=str)
+        print(f"[ERROR] {len(pending)} lots could not be committed; their rows were saved to '{path}'.")
+
+    def _supersede(self, metadata, passed) -> list:
+        """
+        Picks which lot to keep when a pair was already captured in this scan
+        and returns the lot_ids that lose: a lot that passed validation beats
+        one that failed, otherwise the newer capture wins.
+        """
+        scan_id = metadata.get('scan_id')
+        if scan_id != self.kept_scan_id:
+            self.kept_scan_id, self.kept_lots = scan_id, {}
+        pair = (metadata.get('currency_want'), metadata.get('currency_have'))
+        lot_id = metadata.get('lot_id')
+        previous = self.kept_lots.get(pair)
+        if previous is not None and previous[1] and not passed:
+            print(f"[INFO] Lot {lot_id} failed validation; keeping the earlier lot {previous[0]} for this pair.")
+            return [lot_id]
+        self.kept_lots[pair] = (lot_id, passed)
+        if previous is None:
+            return []
+        print(f"[INFO] Lot {lot_id} replaces lot {previous[0]} for {pair[0]}/{pair[1]} in scan {scan_id}.")
+        return [previous[0]]
+
+    def _validate(self, rows, metadata):
+        pair = (metadata.get('currency_want'), metadata.get('currency_have'))
+        scan_id = metadata.get('scan_id')
+        issues = lot_validation_issues(rows, self.best_ratios)
+        with self.validated:
+            if issues:
+                print(f"[WARN] Lot {metadata.get('lot_id')} ({pair[0]}/{pair[1]}) failed validation: {'; '.join(issues)}")
+                self.failed_pairs[(scan_id, *pair)] = issues
+                # An inverse-pair mismatch can be either side's fault, so both are captured again.
+                if any(issue.startswith("best ratio disagrees") for issue in issues):
+                    self.failed_pairs.setdefault((scan_id, pair[1], pair[0]), ["inverse of a failed pair"])
+            else:
+                self.best_ratios[pair] = (scan_id, best_available_ratio(rows))
+            self.lots_validated += 1
+            self.validated.notify_all()
+        return issues
+
+    def _archive(self, image, metadata, failed):
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        base = os.path.join(ARCHIVE_DIR, metadata.get("lot_id", "unknown_lot"))
+        try:
+            cv2.imwrite(base + '.png', image)
+            with open(base + '.json', 'w') as f:
+                json.dump({**metadata, "status": "failed_validation" if failed else "archived"}, f, indent=4)
+            self.lots_archived += 1
+        except Exception as e:
+            print(f"[WARN] Could not archive lot {metadata.get('lot_id')}: {e}")
@@ -1,26 +1,76 @@
 import os
 import json
-import pandas as pd
 import shutil
 from concurrent.futures import ProcessPoolExecutor, as_completed
 import sys
 import multiprocessing
-from PIL import Image
+import random
 import cv2
 import numpy as np
 import glob
+import time
+import argparse
+import signal
+from glyph_matcher import get_matcher
+from ocr_cache import get_cell_cache, cell_key, template_signature
+from debug_capture import get_debug_writer
+import market_store
+from market_db import MarketDB
 
 # --- Configuration ---
 OCR_CONFIG_FILE = 'ocr_config.json'
 SCREENSHOTS_DIR = 'screenshots'
 PROCESSED_DIR = os.path.join(SCREENSHOTS_DIR, 'processed')
-OUTPUT_CSV = 'market_data.csv'
 TEMPLATE_DIR = 'templates/numbers'
 CONFIDENCE_THRESHOLD = 0.70
+# Use the batched GlyphMatcher engine; set to False for the original per-template loop.
+USE_BATCHED_MATCHER = True
+# Match each column once per table strip and bucket hits into rows.
+# Requires the batched matcher; falls back to per-row crops otherwise.
+USE_STRIP_MODE = True
+
+# --- Configuration for the recognized-text cache ---
+# Cells are keyed on a hash of their pixels; the SQLite file is shared by all
+# worker processes and kept between runs.
+USE_CELL_CACHE = True
+CELL_CACHE_FILE = 'ocr_cell_cache.sqlite'
+CELL_CACHE_MAX_ENTRIES = 200_000
+
+# --- Configuration for early exits before glyph matching ---
+# A cell is blank when fewer than BLANK_MIN_INK_PIXELS pixels differ from the
+# cell's median by more than BLANK_INK_DELTA grey levels.
+SKIP_BLANK_CELLS = True
+BLANK_INK_DELTA = 40
+BLANK_MIN_INK_PIXELS = 12
+# Reuse the previous capture's text for cells of the same currency pair where
+# no pixel moved by more than UNCHANGED_PIXEL_DELTA grey levels (rendering
+# noise is tolerated, a changed glyph is not). The previous captures live in
+# the CELL_CACHE_FILE database.
+REUSE_UNCHANGED_CELLS = True
+UNCHANGED_PIXEL_DELTA = 24
+
+# --- Configuration for the optional indexed SQLite backend (market_db.py) ---
+# When on, committed rows are also written to it; run
+# 'python market_db.py migrate' once to import the existing history.
+USE_MARKET_DB = False
+
+# --- Configuration for watch (daemon) mode ---
+WATCH_POLL_SECONDS = 1.0
+# A batch is committed once it holds this many lots or its oldest lot has
+# waited this long, whichever comes first.
+WATCH_BATCH_SIZE = 8
+WATCH_MAX_BATCH_DELAY_SECONDS = 5.0
 
 # --- Configuration for saving cropped debug images ---
+# Crops are bundled into one .npz per lot and written on a background thread.
+# A lot is saved in full with probability DEBUG_SAMPLE_RATE; otherwise only the
+# cells that failed to parse or matched below DEBUG_LOW_CONFIDENCE are kept.
 DEBUG_SAVE_CROPPED_IMAGES = True
 DEBUG_DIR = 'cropped_debug'
+DEBUG_SAMPLE_RATE = 0.02
+DEBUG_SAVE_SUSPECT_CELLS = True
+DEBUG_LOW_CONFIDENCE = 0.80
+DEBUG_QUEUE_SIZE = 64
 
 # --- HELPER FUNCTIONS ---
 
@@ -106,80 +156,233 @@ def recognize_text_from_templates(cell_image_cv, template_set):
 
     return deduped_string
 
+def recognize_cell_with_score(cell_image_cv, template_set):
+    """
+    Recognizes a cell with whichever glyph engine is configured and returns
+    (text, weakest glyph score). The score is None for the per-template loop
+    or an empty cell.
+    """
+    if not USE_BATCHED_MATCHER:
+        return recognize_text_from_templates(cell_image_cv, template_set), None
+    cell_gray = cv2.cvtColor(cell_image_cv, cv2.COLOR_BGR2GRAY)
+    hits = get_matcher(template_set, CONFIDENCE_THRESHOLD).find_hits(cell_gray)
+    return "".join(char for _, char, _ in hits), min((score for _, _, score in hits), default=None)
 
 
+
+def iter_table_rows(ocr_config: dict):
+    """Yields (table_name, row_index, y_start, y_end) for every configured row."""
+    for table_name, table_config in ocr_config.items():
+        if table_name in ["tesseract_options", "columns"]:
+            continue
+        for i, row_coords in enumerate(table_config['rows']):
+            yield table_name, i, row_coords['y_start'], row_coords['y_end']
+
+def group_row_strips(ocr_config: dict):
+    """
+    Groups configured rows into vertical strips of touching or overlapping
+    bands, so the gap between tables is never matched. Returns a list of
+    (strip_top, strip_bottom, rows) with rows as (table_name, row_index, y_start, y_end).
+    """
+    strips = []
+    for row in sorted(iter_table_rows(ocr_config), key=lambda r: r[2]):
+        _, _, y1, y2 = row
+        if strips and y1 <= strips[-1][1]:
+            strips[-1][1] = max(strips[-1][1], y2)
+            strips[-1][2].append(row)
+        else:
+            strips.append([y1, y2, [row]])
+    return [tuple(strip) for strip in strips]
+
+def recognize_column_strips(image_gray, ocr_config: dict, templates: dict, needed=None):
+    """
+    Runs the glyph matcher once per column and row strip instead of once per
+    cell and returns {(table_name, row_index, column): (text, weakest glyph score)}.
+    If needed is given, strip/column pairs containing none of those keys are skipped.
+    """
+    results = {}
+    for strip_top, strip_bottom, rows in group_row_strips(ocr_config):
+        bands = [(y1 - strip_top, y2 - strip_top) for _, _, y1, y2 in rows]
+        for column in ('ratio', 'stock'):
+            if needed is not None and not any((t, i, column) in needed for t, i, _, _ in rows):
+                continue
+            col = ocr_config['columns'][column]
+            strip = image_gray[strip_top:strip_bottom, col['x_start']:col['x_end']]
+            matcher = get_matcher(templates[column], CONFIDENCE_THRESHOLD)
+            for (table_name, i, _, _), hits in zip(rows, matcher.find_hits_in_bands(strip, bands)):
+                text = "".join(char for _, char, _ in hits)
+                results[(table_name, i, column)] = (text, min((score for _, _, score in hits), default=None))
+    return results
+
+def is_blank_cell(cell_gray) -> bool:
+    """Cheap ink-pixel count; avoids glyph matching on empty rows of a thin book."""
+    if cell_gray.size == 0:
+        return True
+    median = int(np.median(cell_gray))
+    ink = np.count_nonzero(np.abs(cell_gray.astype(np.int16) - median) > BLANK_INK_DELTA)
+    return ink < BLANK_MIN_INK_PIXELS
+
+def is_unchanged_cell(cell_gray, previous_gray) -> bool:
+    if cell_gray.shape != previous_gray.shape:
+        return False
+    return not np.any(cv2.absdiff(cell_gray, previous_gray) > UNCHANGED_PIXEL_DELTA)
+
 # --- CORE WORKER FUNCTION ---
 
+def extract_rows_from_image(image, metadata: dict, ocr_config: dict, templates: dict):
+    """Runs OCR over a decoded BGR screenshot and returns the parsed table rows."""
+    extracted_rows = []
+    ratio_col = ocr_config['columns']['ratio']
+    stock_col = ocr_config['columns']['stock']
+
+    image_gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    crops = {}
+    gray_crops = {}
+    for table_name, i, y1, y2 in iter_table_rows(ocr_config):
+        for column, col in (('ratio', ratio_col), ('stock', stock_col)):
+            cell = (table_name, i, column)
+            crops[cell] = image[y1:y2, col['x_start']:col['x_end']]
+            gray_crops[cell] = image_gray[y1:y2, col['x_start']:col['x_end']]
+
+    texts = {}
+    # Weakest glyph score per freshly recognized cell; reused cells have none.
+    scores = {}
+    cache = None
+    if USE_CELL_CACHE or REUSE_UNCHANGED_CELLS:
+        cache = get_cell_cache(CELL_CACHE_FILE)
+        signature = template_signature(templates, CONFIDENCE_THRESHOLD, USE_BATCHED_MATCHER)
+
+    # --- Early exits: blank cells, then cells unchanged since this pair's last capture ---
+    if SKIP_BLANK_CELLS:
+        for cell, cell_gray in gray_crops.items():
+            if is_blank_cell(cell_gray):
+                texts[cell] = ""
+        if cache is not None:
+            cache.count("blank", len(texts))
+
+    pair_key = None
+    if REUSE_UNCHANGED_CELLS and metadata.get("currency_want") and metadata.get("currency_have"):
+        pair_key = f"{metadata['currency_want']}|{metadata['currency_have']}|{signature}"
+        previous = cache.get_previous_cells(pair_key)
+        unchanged = 0
+        for cell, cell_gray in gray_crops.items():
+            prev = previous.get("/".join(map(str, cell)))
+            if cell not in texts and prev is not None and is_unchanged_cell(cell_gray, prev[0]):
+                texts[cell] = prev[1]
+                unchanged += 1
+        cache.count("unchanged", unchanged)
+
+    # --- Serve repeated cells from the cache, recognize only the rest ---
+    if USE_CELL_CACHE:
+        keys = {cell: cell_key(crop, cell[2], signature) for cell, crop in crops.items() if cell not in texts}
+        cached = cache.get_many(list(keys.values()))
+        texts.update({cell: cached[key] for cell, key in keys.items() if key in cached})
+    missing = [cell for cell in crops if cell not in texts]
+
+    if missing:
+        if USE_STRIP_MODE and USE_BATCHED_MATCHER:
+            strip_texts = recognize_column_strips(image_gray, ocr_config, templates, needed=set(missing))
+            for cell in missing:
+                texts[cell], scores[cell] = strip_texts[cell]
+        else:
+            for cell in missing:
+                texts[cell], scores[cell] = recognize_cell_with_score(crops[cell], templates[cell[2]])
+    if cache is not None:
+        if pair_key is not None:
+            cache.put_previous_cells(pair_key, {"/".join(map(str, cell)): (gray_crops[cell], texts[cell]) for cell in crops})
+        cache.put_many({keys[cell]: texts[cell] for cell in missing} if USE_CELL_CACHE else {})
+
+    debug_sample_lot = DEBUG_SAVE_CROPPED_IMAGES and random.random() < DEBUG_SAMPLE_RATE
+    debug_crops = {}
+
+    for table_name, i, _, _ in iter_table_rows(ocr_config):
+        ratio = parse_ratio(texts[(table_name, i, 'ratio')])
+        stock = parse_stock(texts[(table_name, i, 'stock')])
+
+        # --- Pick cropped images to save if debug mode is on ---
+        if DEBUG_SAVE_CROPPED_IMAGES:
+            for column, value in (('ratio', ratio), ('stock', stock)):
+                cell = (table_name, i, column)
+                score = scores.get(cell)
+                suspect = (texts[cell] and value is None) or (score is not None and score < DEBUG_LOW_CONFIDENCE)
+                if debug_sample_lot or (DEBUG_SAVE_SUSPECT_CELLS and suspect):
+                    debug_crops[f"{table_name}_row{i+1}_{column}"] = crops[cell]
+        # ---------------------------------------------------------
+
+        if ratio is not None or stock is not None:
+            extracted_rows.append({
+                "scan_id": metadata.get("scan_id"), "lot_id": metadata.get("lot_id"),
+                "timestamp_utc": metadata.get("timestamp_utc"), "currency_want": metadata.get("currency_want"),
+                "currency_have": metadata.get("currency_have"), "trade_type": table_name,
+                "row_num": i + 1, "ratio": ratio, "stock": stock
+            })
+
+    if debug_crops:
+        writer = get_debug_writer(DEBUG_DIR, DEBUG_QUEUE_SIZE)
+        writer.submit(metadata.get("lot_id", "unknown_lot"), debug_crops)
+
+    return extracted_rows
+
 def process_single_screenshot(screenshot_path: str, ocr_config: dict, templates: dict):
+    """Returns (rows, screenshot path, metadata path); both paths are None if the metadata cannot be read yet."""
     metadata_path = os.path.splitext(screenshot_path)[0] + '.json'
     try:
         with open(metadata_path, 'r') as f:
             metadata = json.load(f)
-    except FileNotFoundError:
+    except (FileNotFoundError, json.JSONDecodeError):
         return [], None, None
 
     print(f"  [INFO] Processing: {os.path.basename(screenshot_path)}")
     image = cv2.imread(screenshot_path)
 
-    extracted_rows = []
-
-    for table_name, table_config in ocr_config.items():
-        if table_name in ["tesseract_options", "columns"]:
-            continue
-
-        for i, row_coords in enumerate(table_config['rows']):
-            y1, y2 = row_coords['y_start'], row_coords['y_end']
-
-            # --- Ratio Processing ---
-            ratio_col = ocr_config['columns']['ratio']
-            rx1, rx2 = ratio_col['x_start'], ratio_col['x_end']
-            ratio_crop_cv = image[y1:y2, rx1:rx2]
-
-            # --- Stock Processing ---
-            stock_col = ocr_config['columns']['stock']
-            sx1, sx2 = stock_col['x_start'], stock_col['x_end']
-            stock_crop_cv = image[y1:y2, sx1:sx2]
-            
-            # --- Save cropped images if debug mode is on ---
-            if DEBUG_SAVE_CROPPED_IMAGES:
-                # Convert from OpenCV format back to Pillow for saving
-                ratio_img_pil = Image.fromarray(cv2.cvtColor(ratio_crop_cv, cv2.COLOR_BGR2RGB))
-                stock_img_pil = Image.fromarray(cv2.cvtColor(stock_crop_cv, cv2.COLOR_BGR2RGB))
-                
-                lot_id = metadata.get("lot_id", "unknown_lot")
-                ratio_filename = f"{lot_id}_{table_name}_row{i+1}_ratio.png"
-                stock_filename = f"{lot_id}_{table_name}_row{i+1}_stock.png"
-                ratio_img_pil.save(os.path.join(DEBUG_DIR, ratio_filename))
-                stock_img_pil.save(os.path.join(DEBUG_DIR, stock_filename))
-            # ---------------------------------------------------------
-            
-            ratio_text = recognize_text_from_templates(ratio_crop_cv, templates['ratio'])
-            stock_text = recognize_text_from_templates(stock_crop_cv, templates['stock'])
-
-            ratio = parse_ratio(ratio_text)
-            stock = parse_stock(stock_text)
-
-            if ratio is not None or stock is not None:
-                extracted_rows.append({
-                    "scan_id": metadata.get("scan_id"), "lot_id": metadata.get("lot_id"),
-                    "timestamp_utc": metadata.get("timestamp_utc"), "currency_want": metadata.get("currency_want"),
-                    "currency_have": metadata.get("currency_have"), "trade_type": table_name,
-                    "row_num": i + 1, "ratio": ratio, "stock": stock
-                })
-
+    extracted_rows = extract_rows_from_image(image, metadata, ocr_config, templates)
     return extracted_rows, screenshot_path, metadata_path
 
-# --- MAIN ORCHESTRATOR ---
+# --- WARM WORKER POOL ---
+# Each worker loads the OCR config and templates once in the pool initializer,
+# so tasks only carry a file path instead of the pickled template dict.
+_worker_ocr_config = None
+_worker_templates = None
+
+def init_worker(ocr_config: dict, template_dir: str):
+    global _worker_ocr_config, _worker_templates
+    # Ctrl+C is handled by the parent, which drains in-flight lots before exiting.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Parallelism comes from the process pool; OpenCV's own threads only add overhead on tiny images.
+    cv2.setNumThreads(1)
+    _worker_ocr_config = ocr_config
+    _worker_templates = load_templates(template_dir)
+
+def process_screenshot_in_worker(screenshot_path: str):
+    return process_single_screenshot(screenshot_path, _worker_ocr_config, _worker_templates)
+
+def process_image_in_worker(image, metadata: dict):
+    """OCRs an in-memory BGR capture; used by ocr_pipeline to skip the PNG round trip."""
+    return extract_rows_from_image(image, metadata, _worker_ocr_config, _worker_templates)
+
+def create_worker_pool(ocr_config: dict):
+    num_cores = multiprocessing.cpu_count()
+    num_workers = max(1, num_cores - 2)
+    print(f"Using {num_workers} worker processes (out of {num_cores} available cores).")
+    return ProcessPoolExecutor(max_workers=num_workers, initializer=init_worker, initargs=(ocr_config, TEMPLATE_DIR))
 
-def main():
-    print("--- Starting Template Matching Processing ---")
-    os.makedirs(PROCESSED_DIR, exist_ok=True)
-    
-    # --- Create debug directory if needed ---
-    if DEBUG_SAVE_CROPPED_IMAGES:
-        os.makedirs(DEBUG_DIR, exist_ok=True)
-        print(f"DEBUG mode is ON. Cropped images will be saved to '{DEBUG_DIR}'")
+# --- MAIN ORCHESTRATOR ---
 
+def report_cell_cache(cell_cache):
+    """Prints the cache hit rate for this run and evicts entries beyond the size bound."""
+    stats = cell_cache.read_stats()
+    hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+    lookups = hits + misses
+    if stats.get("blank") or stats.get("unchanged"):
+        print(f"Early exits: {stats.get('blank', 0)} blank cells skipped, {stats.get('unchanged', 0)} unchanged cells reused.")
+    if lookups:
+        print(f"Cell text cache: {hits}/{lookups} cells served from cache ({hits / lookups:.1%} hit rate).")
+    evicted = cell_cache.prune(CELL_CACHE_MAX_ENTRIES)
+    if evicted:
+        print(f"Cell text cache: evicted {evicted} least recently used entries.")
+
+def load_ocr_setup():
+    """Loads the OCR config and checks the templates, exiting on failure."""
     try:
         with open(OCR_CONFIG_FILE, 'r') as f:
             ocr_config = json.load(f)
@@ -192,6 +395,49 @@ def main():
         print("[FATAL] No templates were loaded. Check the 'templates/numbers' directory. Aborting.")
         sys.exit(1)
 
+    return ocr_config, templates
+
+def commit_results(processed_data: list, files_to_move: list, superseded_lots=()):
+    """
+    Stores extracted rows as a new sorted market data segment and moves the
+    source files to PROCESSED_DIR. superseded_lots are marked only after the
+    rows that replace them are stored.
+    """
+    segment_path = market_store.append_batch(processed_data)
+    print(f"Stored {len(processed_data)} new rows in segment '{segment_path}'")
+    market_store.mark_superseded(superseded_lots)
+
+    if USE_MARKET_DB:
+        db = MarketDB()
+        try:
+            db.insert_rows(processed_data)
+            db.mark_superseded(superseded_lots)
+        finally:
+            db.close()
+
+    for path in files_to_move:
+        try:
+            shutil.move(path, os.path.join(PROCESSED_DIR, os.path.basename(path)))
+        except (FileNotFoundError, Exception) as e:
+            print(f"[WARN] Could not move file {os.path.basename(path)}: {e}")
+
+def main():
+    print("--- Starting Template Matching Processing ---")
+    os.makedirs(PROCESSED_DIR, exist_ok=True)
+    
+    # --- Create debug directory if needed ---
+    if DEBUG_SAVE_CROPPED_IMAGES:
+        os.makedirs(DEBUG_DIR, exist_ok=True)
+        print(f"DEBUG mode is ON. Sampled and suspect crops will be saved to '{DEBUG_DIR}' as one .npz per lot.")
+
+    ocr_config, _ = load_ocr_setup()
+
+    cell_cache = None
+    if USE_CELL_CACHE or REUSE_UNCHANGED_CELLS:
+        cell_cache = get_cell_cache(CELL_CACHE_FILE)
+        cell_cache.reset_stats()
+        print(f"Cell text cache '{CELL_CACHE_FILE}' holds {len(cell_cache)} entries.")
+
     unprocessed_screenshots = [os.path.join(SCREENSHOTS_DIR, f) for f in os.listdir(SCREENSHOTS_DIR) if f.endswith('.png')]
 
     if not unprocessed_screenshots:
@@ -203,12 +449,8 @@ def main():
     all_processed_data = []
     files_to_move = []
 
-    num_cores = multiprocessing.cpu_count()
-    num_workers = max(1, num_cores - 2)
-    print(f"Using {num_workers} worker processes (out of {num_cores} available cores).")
-
-    with ProcessPoolExecutor(max_workers=num_workers) as executor:
-        futures = {executor.submit(process_single_screenshot, path, ocr_config, templates): path for path in unprocessed_screenshots}
+    with create_worker_pool(ocr_config) as executor:
+        futures = {executor.submit(process_screenshot_in_worker, path): path for path in unprocessed_screenshots}
 
         for future in as_completed(futures):
             try:
@@ -220,41 +462,123 @@ def main():
             except Exception as e:
                 print(f"[ERROR] An unexpected error occurred while processing {futures[future]}: {e}")
 
+    if cell_cache is not None:
+        report_cell_cache(cell_cache)
+
     if not all_processed_data:
         print("Processing complete, but no data was successfully extracted.")
         return
 
-    df = pd.DataFrame(all_processed_data)
-
-    if os.path.exists(OUTPUT_CSV):
-        df.to_csv(OUTPUT_CSV, mode='a', header=False, index=False)
-        print(f"Appended {len(df)} new rows to '{OUTPUT_CSV}'")
-    else:
-        df.to_csv(OUTPUT_CSV, index=False)
-        print(f"Created '{OUTPUT_CSV}' with {len(df)} rows.")
-
-    try:
-        print("\n--- Sorting master CSV file ---")
-        master_df = pd.read_csv(OUTPUT_CSV)
-        master_df['timestamp_utc'] = pd.to_datetime(master_df['timestamp_utc'], errors='coerce')
-        sort_order = ['scan_id', 'timestamp_utc', 'trade_type', 'row_num']
-        master_df = master_df.sort_values(by=sort_order, ascending=True)
-        master_df['timestamp_utc'] = master_df['timestamp_utc'].dt.strftime('%Y-%m-%d %H:%M:%S')
-        master_df.to_csv(OUTPUT_CSV, index=False)
-        print(f"Successfully sorted '{OUTPUT_CSV}'.")
-    except Exception as e:
-        print(f"[ERROR] Could not sort the master CSV file. Reason: {e}")
-
-    for path in files_to_move:
-        try:
-            shutil.move(path, os.path.join(PROCESSED_DIR, os.path.basename(path)))
-        except (FileNotFoundError, Exception) as e:
-            print(f"[WARN] Could not move file {os.path.basename(path)}: {e}")
+    commit_results(all_processed_data, files_to_move)
 
     print(f"Successfully processed and moved {len(files_to_move) // 2} pairs of files.")
     print("\n--- OCR Processing Finished ---")
 
+def find_ready_screenshots():
+    """Returns scan_*.png files whose metadata JSON exists, i.e. captures that are fully written."""
+    ready = []
+    for f in sorted(os.listdir(SCREENSHOTS_DIR)):
+        if f.startswith('scan_') and f.endswith('.png'):
+            path = os.path.join(SCREENSHOTS_DIR, f)
+            if os.path.exists(os.path.splitext(path)[0] + '.json'):
+                ready.append(path)
+    return ready
+
+def watch():
+    """
+    Keeps a warm worker pool running and OCRs new captures as game_data_get.py
+    writes them, committing results in small batches. Stop with Ctrl+C.
+    """
+    print("--- Starting Template Matching Watcher ---")
+    os.makedirs(SCREENSHOTS_DIR, exist_ok=True)
+    os.makedirs(PROCESSED_DIR, exist_ok=True)
+    if DEBUG_SAVE_CROPPED_IMAGES:
+        os.makedirs(DEBUG_DIR, exist_ok=True)
+        print(f"DEBUG mode is ON. Sampled and suspect crops will be saved to '{DEBUG_DIR}' as one .npz per lot.")
+
+    ocr_config, _ = load_ocr_setup()
+    cell_cache = None
+    if USE_CELL_CACHE or REUSE_UNCHANGED_CELLS:
+        cell_cache = get_cell_cache(CELL_CACHE_FILE)
+        cell_cache.reset_stats()
+
+    in_flight = {}
+    # Every lot is submitted once per session: committed lots are moved away, and
+    # lots that produced no rows are left in place, as in batch mode. A lot whose
+    # metadata could not be read (e.g. still being written) is tried again.
+    seen = set()
+    pending_rows, pending_files = [], []
+    pending_since = None
+    committed_lots = 0
+
+    def flush():
+        nonlocal pending_rows, pending_files, pending_since, committed_lots
+        if pending_rows:
+            commit_results(pending_rows, pending_files)
+            committed_lots += len(pending_files) // 2
+        pending_rows, pending_files = [], []
+        pending_since = None
+
+    print(f"Watching '{SCREENSHOTS_DIR}' every {WATCH_POLL_SECONDS}s. Press Ctrl+C to stop.")
+    with create_worker_pool(ocr_config) as executor:
+        try:
+            while True:
+                for path in find_ready_screenshots():
+                    if path not in seen:
+                        seen.add(path)
+                        in_flight[path] = executor.submit(process_screenshot_in_worker, path)
+
+                for path, future in list(in_flight.items()):
+                    if not future.done():
+                        continue
+                    del in_flight[path]
+                    try:
+                        extracted_rows, screenshot_path, metadata_path = future.result()
+                    except Exception as e:
+                        print(f"[ERROR] An unexpected error occurred while processing {path}: {e}")
+                        continue
+                    if metadata_path is None:
+                        seen.discard(path)
+                        continue
+                    if not extracted_rows:
+                        print(f"[WARN] No data extracted from {os.path.basename(path)}; leaving it in place.")
+                        continue
+                    pending_rows.extend(extracted_rows)
+                    pending_files.extend([screenshot_path, metadata_path])
+                    if pending_since is None:
+                        pending_since = time.monotonic()
+
+                if pending_files and (
+                    len(pending_files) // 2 >= WATCH_BATCH_SIZE
+                    or time.monotonic() - pending_since >= WATCH_MAX_BATCH_DELAY_SECONDS
+                ):
+                    flush()
+
+                time.sleep(WATCH_POLL_SECONDS)
+        except KeyboardInterrupt:
+            print("\n[INFO] Stopping watcher; finishing in-flight lots...")
+            for path, future in in_flight.items():
+                try:
+                    extracted_rows, screenshot_path, metadata_path = future.result()
+                    if extracted_rows:
+                        pending_rows.extend(extracted_rows)
+                        pending_files.extend([screenshot_path, metadata_path])
+                except Exception as e:
+                    print(f"[ERROR] An unexpected error occurred while processing {path}: {e}")
+            flush()
+
+    if cell_cache is not None:
+        report_cell_cache(cell_cache)
+    print(f"Watcher committed {committed_lots} lots.")
+    print("\n--- OCR Watcher Finished ---")
+
 if __name__ == "__main__":
     from multiprocessing import freeze_support
     freeze_support()
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="OCR market screenshots into market_data.csv.")
+    parser.add_argument('--watch', action='store_true', help="Keep running and process new captures as they arrive.")
+    args = parser.parse_args()
+    if args.watch:
+        watch()
+    else:
+        main()
@@ -0,0 +1,159 @@
+import json
+import item_catalog
+
+# --- Configuration ---
+# Rough per-step costs, taken from timed runs against sim_backend; only used
+# for the estimate printed before a cycle.
+SELECT_OVERHEAD_SECONDS = 3.6   # banner click, search box, result click and their waits
+SECONDS_PER_KEY = 0.038         # mean of secs_between_keys()
+CAPTURE_SECONDS = 2.3
+CLICKS_PER_SELECTION = 3        # banner, search box, currency result
+ACTIONS_PER_CAPTURE = 5         # hover, ALT down/up/down, ALT up
+DEFAULT_MIN_PREFIX_LENGTH = 4
+
+PANEL_KEYS = {'want': 'currency_want_window', 'have': 'currency_have_window'}
+
+
+def pairs_from_sessions(trade_sessions):
+    """Flattens trade_sessions into unique (want, have) pairs, in config order."""
+    pairs = []
+    seen = set()
+    for session in trade_sessions:
+        have = session['base_currency']
+        for want in session['target_currencies']:
+            if want != have and (want, have) not in seen:
+                seen.add((want, have))
+                pairs.append((want, have))
+    return pairs
+
+
+def _greedy_order(pairs, first):
+    remaining = list(pairs)
+    remaining.remove(first)
+    ordered = [first]
+    want, have = first
+    while remaining:
+        wants, haves = {}, {}
+        for w, h in remaining:
+            wants[w] = wants.get(w, 0) + 1
+            haves[h] = haves.get(h, 0) + 1
+        best = min(
+            remaining,
+            key=lambda p: ((p[0] != want) + (p[1] != have), -(wants[p[0]] + haves[p[1]]))
+        )
+        remaining.remove(best)
+        ordered.append(best)
+        want, have = best
+    return ordered
+
+
+def order_pairs(pairs, start=(None, None)):
+    """
+    Orders pairs so consecutive captures change as few selections as possible.
+    Greedy: always take a pair reachable with the fewest selections, breaking
+    ties toward currencies that still have many pairs left, so a selected
+    currency is reused for as long as it is useful. Every pair is tried as the
+    first one and the cheapest order wins.
+    """
+    best = list(pairs)
+    best_cost = _selection_count(best, start)
+    for first in pairs:
+        candidate = _greedy_order(pairs, first)
+        cost = _selection_count(candidate, start)
+        if cost < best_cost:
+            best, best_cost = candidate, cost
+    return best
+
+
+def search_prefixes(names, min_length=DEFAULT_MIN_PREFIX_LENGTH):
+    """
+    Returns {name: shortest prefix} where the prefix (case-insensitive) is not
+    contained in any other known name, so the search list still narrows to
+    that one currency. Names with no such prefix keep their full text.
+    """
+    lowered = {name: name.lower() for name in names}
+    prefixes = {}
+    for name, low in lowered.items():
+        prefixes[name] = name
+        for length in range(min(min_length, len(name)), len(name) + 1):
+            prefix = low[:length]
+            if prefix[-1].isspace():
+                continue
+            if not any(prefix in other for other_name, other in lowered.items() if other_name != name):
+                prefixes[name] = name[:length]
+                break
+    return prefixes
+
+
+def selection_steps(ordered_pairs, start=(None, None)):
+    """Yields (want, have, [(side, currency), ...]) with the selections each pair needs."""
+    current = {'want': start[0], 'have': start[1]}
+    for want, have in ordered_pairs:
+        needed = [(side, cur) for side, cur in (('have', have), ('want', want)) if current[side] != cur]
+        for side, cur in needed:
+            current[side] = cur
+        yield want, have, needed
+
+
+def _selection_count(ordered_pairs, start):
+    return sum(len(needed) for _, _, needed in selection_steps(ordered_pairs, start))
+
+
+def estimate(ordered_pairs, search_text=None):
+    """Estimated selections, keystrokes, input actions and seconds for capturing pairs in this order."""
+    search_text = search_text or {}
+    selections = keystrokes = 0
+    for _, _, needed in selection_steps(ordered_pairs):
+        selections += len(needed)
+        keystrokes += sum(len(search_text.get(cur, cur)) for _, cur in needed)
+    actions = selections * CLICKS_PER_SELECTION + keystrokes + len(ordered_pairs) * ACTIONS_PER_CAPTURE
+    seconds = (selections * SELECT_OVERHEAD_SECONDS + keystrokes * SECONDS_PER_KEY
+               + len(ordered_pairs) * CAPTURE_SECONDS)
+    return {"pairs": len(ordered_pairs), "selections": selections, "keystrokes": keystrokes,
+            "actions": actions, "seconds": round(seconds, 1)}
+
+
+def build_plan(trade_sessions, known_names=(), planner_config=None):
+    """
+    Builds the capture order for one cycle. planner_config is the
+    'scan_planner' block of trade_config.json:
+        enabled            reorder pairs (otherwise config order is kept)
+        search_prefixes    type the shortest unambiguous prefix instead of full names
+        min_prefix_length  shortest prefix ever typed
+    """
+    planner_config = planner_config or {}
+    pairs = pairs_from_sessions(trade_sessions)
+    ordered = order_pairs(pairs) if planner_config.get('enabled', True) else pairs
+
+    search_text = {}
+    if planner_config.get('search_prefixes', False):
+        names = set(known_names) | {c for pair in pairs for c in pair}
+        search_text = search_prefixes(names, planner_config.get('min_prefix_length', DEFAULT_MIN_PREFIX_LENGTH))
+
+    return {
+        "pairs": ordered,
+        "search_text": search_text,
+        "estimate": estimate(ordered, search_text),
+        "baseline": estimate(pairs),
+    }
+
+
+def print_plan(plan):
+    est, base = plan['estimate'], plan['baseline']
+    print(f"[INFO] Scan plan: {est['pairs']} pairs, {est['selections']} selections, {est['keystrokes']} keystrokes, "
+          f"~{est['actions']} input actions, ~{est['seconds'] / 60:.1f} min")
+    print(f"[INFO] Config order would need {base['selections']} selections, {base['keystrokes']} keystrokes, "
+          f"~{base['actions']} input actions, ~{base['seconds'] / 60:.1f} min")
+
+
+if __name__ == "__main__":
+    with open('trade_config.json', 'r') as f:
+        trade_config = json.load(f)
+    with open('game_config.json', 'r') as f:
+        names = set(json.load(f).get('currency_name_templates', {}))
+    names |= set(item_catalog.get_catalog().names())
+    plan = build_plan(trade_config['trade_sessions'], names, trade_config.get('scan_planner'))
+    for want, have, needed in selection_steps(plan['pairs']):
+        typed = ", ".join(f"{side}='{plan['search_text'].get(cur, cur)}'" for side, cur in needed) or "-"
+        print(f"  {want:30s} <- {have:20s} select: {typed}")
+    print_plan(plan)
@@ -1,28 +1,55 @@
 import os
-import csv
 import time
 import json
+import random
+import argparse
+import threading
+import email.utils
 import requests
-from datetime import datetime
+import scout_store
+import item_catalog
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from datetime import datetime, timezone
 
-def get_target_items(id_lookup_file):
-    """Reads the CSV file to get the list of target items."""
-    target_items = []
-    try:
-        with open(id_lookup_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row.get('is_target') == '1':
-                    target_items.append({
-                        "name": row['name'],
-                        "id": int(row['itemID'])
-                    })
-        return target_items
-    except FileNotFoundError:
+# --- Configuration ---
+BASE_URL = "https://poe2scout.com/api/currencyExchange/PairHistory"
+LEAGUE_NAME = "Rise of the Abyssal"
+HEADERS = {
+    'accept': 'application/json',
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+MAX_WORKERS = 4
+# Requests per second: the limiter starts at INITIAL_RATE, halves on every
+# 429 and creeps back up by RATE_INCREASE per successful request, but only
+# while rate-limit headers (if the API sends them) show more than
+# RAMP_MIN_REMAINING of the window's requests left.
+INITIAL_RATE = 2.0
+MIN_RATE = 0.2
+MAX_RATE = 4.0
+RATE_INCREASE = 0.25
+RAMP_MIN_REMAINING = 0.25
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_CAP_SECONDS = 60.0
+REQUEST_TIMEOUT_SECONDS = 30
+# Incremental sync: the newest SYNC_PAGE_SIZE records are requested first and
+# older pages (growing by SYNC_PAGE_GROWTH) only while they are all newer than
+# the pair's high-water mark. Pairs without a mark get the full history.
+FULL_HISTORY_LIMIT = 10000
+SYNC_PAGE_SIZE = 24
+SYNC_PAGE_GROWTH = 4
+SYNC_STATE_FILE = "sync_state.json"
+
+def get_target_items(id_lookup_file=item_catalog.TARGET_CSV_FILE):
+    """Returns the target items of the item catalog (flags from id_lookup_file)."""
+    if not os.path.exists(id_lookup_file):
         print(f"Error: The ID lookup file '{id_lookup_file}' was not found.")
         return []
+    catalog = item_catalog.load_catalog(target_csv=id_lookup_file)
+    return [{"name": item.name, "id": item.item_id} for item in catalog.targets()]
 
-def fetch_all_pair_histories(target_items, base_currencies, output_dir):
+def fetch_all_pair_histories(target_items, base_currencies, output_dir, base_url=BASE_URL):
     """
     Loops through all currency pairs, intelligently queries the API,
     handles rate limits, and saves the JSON responses.
@@ -31,13 +58,8 @@ def fetch_all_pair_histories(target_items, base_currencies, output_dir):
         print(f"Creating directory: '{output_dir}'")
         os.makedirs(output_dir)
 
-    base_url = "https://poe2scout.com/api/currencyExchange/PairHistory"
-    league_name = "Rise of the Abyssal"
-    
-    headers = {
-        'accept': 'application/json',
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
+    league_name = LEAGUE_NAME
+    headers = HEADERS
 
     for base_currency in base_currencies:
         base_name = base_currency["name"]
@@ -74,13 +96,8 @@ def fetch_all_pair_histories(target_items, base_currencies, output_dir):
                 response.raise_for_status()
                 
                 # --- Save the JSON Response ---
-                safe_target_name = target_name.replace(" ", "_").replace("'", "")
-                safe_base_name = base_name.replace(" ", "_").replace("'", "")
-                file_name = f"{safe_target_name}_vs_{safe_base_name}.json"
-                file_path = os.path.join(output_dir, file_name)
-
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(response.json(), f, indent=2)
+                file_path = scout_store.pair_path(output_dir, target_name, base_name)
+                scout_store.write_records(file_path, response.json().get("History", []))
                 
                 print(f"  > Success! Saved to {file_path}")
 
@@ -90,17 +107,339 @@ def fetch_all_pair_histories(target_items, base_currencies, output_dir):
             # --- Standard polite delay ---
             time.sleep(1)
 
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by all fetch workers. The rate adapts:
+    halved on a 429, paused for retry-after or until a rate-limit window
+    resets, and raised a little after every success.
+    """
+
+    def __init__(self, rate=INITIAL_RATE, min_rate=MIN_RATE, max_rate=MAX_RATE):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.capacity = max(1.0, rate)
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Blocks until a request may be sent."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                else:
+                    wait = (1.0 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stops every worker for the given number of seconds."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+    def slow_down(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.capacity = max(1.0, self.rate)
+
+    def speed_up(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + RATE_INCREASE)
+            self.capacity = max(1.0, self.rate)
+
+    def observe_headers(self, headers):
+        """
+        Pauses until the window resets when a rate-limit header says nothing
+        is left. Returns False if the headers show too little room left to
+        speed up (True without such headers).
+        """
+        remaining = headers.get('x-ratelimit-remaining')
+        reset = headers.get('x-ratelimit-reset')
+        if remaining is None or reset is None:
+            return True
+        try:
+            remaining, reset = int(float(remaining)), float(reset)
+            limit = int(float(headers.get('x-ratelimit-limit', 0)))
+        except ValueError:
+            return True
+        # Some APIs send seconds until reset, others an epoch timestamp.
+        wait = reset - time.time() if reset > 1e9 else reset
+        if remaining <= 0 and wait > 0:
+            self.pause(wait)
+        return remaining > (RAMP_MIN_REMAINING * limit if limit > 0 else 1)
+
+
+def _retry_after_seconds(value):
+    """Seconds to wait from a Retry-After value (delta-seconds or an HTTP-date), or None if unreadable."""
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+def _backoff_seconds(attempt):
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+def make_session(max_workers=MAX_WORKERS):
+    """A requests session whose connection pool fits every worker, so connections are reused."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(HEADERS)
+    return session
+
+def fetch_pair(session, limiter, base_url, params):
+    """
+    Fetches one pair history with the shared limiter, retrying 429s, server
+    errors and connection problems with backoff. Returns the decoded JSON.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        limiter.acquire()
+        try:
+            response = session.get(base_url, params=params, timeout=REQUEST_TIMEOUT_SECONDS)
+        except requests.exceptions.RequestException as e:
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            wait = _backoff_seconds(attempt)
+            print(f"  > Connection problem ({e}); retrying in {wait:.1f}s...")
+            time.sleep(wait)
+            continue
+
+        room_left = limiter.observe_headers(response.headers)
+        if response.status_code == 429:
+            retry_after = response.headers.get('retry-after')
+            wait = _retry_after_seconds(retry_after) if retry_after else None
+            if wait is None:
+                wait = _backoff_seconds(attempt)
+            print(f"  > Rate limited! Pausing all requests for {wait:.1f} seconds...")
+            limiter.slow_down()
+            limiter.pause(wait)
+            continue
+        if response.status_code >= 500 and attempt < MAX_ATTEMPTS - 1:
+            wait = _backoff_seconds(attempt)
+            print(f"  > Server error {response.status_code}; retrying in {wait:.1f}s...")
+            time.sleep(wait)
+            continue
+
+        response.raise_for_status()
+        if room_left:
+            limiter.speed_up()
+        return response.json()
+    raise requests.exceptions.RetryError(f"Gave up after {MAX_ATTEMPTS} attempts.")
+
+def fetch_all_pair_histories_concurrent(target_items, base_currencies, output_dir,
+                                        max_workers=MAX_WORKERS, base_url=BASE_URL, rate=INITIAL_RATE):
+    """
+    Same output as fetch_all_pair_histories, but requests run on a bounded
+    thread pool over one pooled session, paced by a shared token bucket
+    instead of a fixed sleep. Returns the number of pairs saved.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    session = make_session(max_workers)
+    limiter = TokenBucket(rate=rate)
+
+    jobs = []
+    for base_currency in base_currencies:
+        for target_item in target_items:
+            if target_item["id"] != base_currency["id"]:
+                jobs.append((target_item, base_currency))
+
+    def run(target_item, base_currency):
+        params = {
+            'league': LEAGUE_NAME,
+            'currencyOneItemId': target_item["id"],
+            'currencyTwoItemId': base_currency["id"],
+            'limit': FULL_HISTORY_LIMIT
+        }
+        data = fetch_pair(session, limiter, base_url, params)
+        file_path = scout_store.pair_path(output_dir, target_item["name"], base_currency["name"])
+        scout_store.write_records(file_path, data.get("History", []))
+        return file_path
+
+    start = time.monotonic()
+    saved = 0
+    print(f"Fetching {len(jobs)} pairs with {max_workers} workers...")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run, t, b): (t["name"], b["name"]) for t, b in jobs}
+        for future in as_completed(futures):
+            target_name, base_name = futures[future]
+            try:
+                print(f"  > Saved {target_name} vs. {base_name} to {future.result()}")
+                saved += 1
+            except Exception as e:
+                print(f"  > FAILED to get data for {target_name} vs. {base_name}. Error: {e}")
+    session.close()
+    elapsed = time.monotonic() - start
+    print(f"\nFetched {saved}/{len(jobs)} pairs in {elapsed:.1f}s (final rate {limiter.rate:.2f} req/s).")
+    return saved
+
+def load_sync_state(output_dir):
+    """Returns {pair file name: latest Epoch stored} from the output directory."""
+    try:
+        with open(os.path.join(output_dir, SYNC_STATE_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_sync_state(output_dir, state):
+    path = os.path.join(output_dir, SYNC_STATE_FILE)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def fetch_new_records(session, limiter, base_url, params, since_epoch, page_size=SYNC_PAGE_SIZE):
+    """
+    Returns (records from since_epoch on sorted by Epoch, requests made).
+    The record at since_epoch itself is fetched again, as its bucket may have
+    still been filling when it was stored. Pages back from the newest record
+    with endEpoch until a page reaches since_epoch, so an unchanged pair
+    costs one small request.
+    """
+    records = {}
+    end_epoch = None
+    requests_made = 0
+    while True:
+        page_params = dict(params, limit=page_size)
+        if end_epoch is not None:
+            page_params['endEpoch'] = end_epoch
+        history = fetch_pair(session, limiter, base_url, page_params).get("History", [])
+        requests_made += 1
+
+        epochs = [r["Epoch"] for r in history if r.get("Epoch") is not None]
+        for record in history:
+            if record.get("Epoch") is not None and record["Epoch"] >= since_epoch:
+                records[record["Epoch"]] = record
+        if len(history) < page_size or not epochs or min(epochs) <= since_epoch:
+            break
+        if end_epoch is not None and min(epochs) >= end_epoch:
+            break  # endEpoch made no progress; don't loop on the same page
+        end_epoch = min(epochs)
+        page_size = min(page_size * SYNC_PAGE_GROWTH, FULL_HISTORY_LIMIT)
+    return [records[e] for e in sorted(records)], requests_made
+
+def sync_all_pair_histories(target_items, base_currencies, output_dir, max_workers=MAX_WORKERS,
+                            base_url=BASE_URL, rate=INITIAL_RATE, page_size=SYNC_PAGE_SIZE):
+    """
+    Incremental form of fetch_all_pair_histories_concurrent: only records
+    from each pair's high-water mark (its newest readable record) on are fetched
+    and appended to the pair file, the one at the mark replacing the stored
+    copy. Legacy <pair>.json files are converted on first sync. Returns the
+    number of new records.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    session = make_session(max_workers)
+    limiter = TokenBucket(rate=rate)
+    state = load_sync_state(output_dir)
+    state_lock = threading.Lock()
+
+    jobs = []
+    for base_currency in base_currencies:
+        for target_item in target_items:
+            if target_item["id"] != base_currency["id"]:
+                jobs.append((target_item, base_currency))
+
+    def run(target_item, base_currency):
+        params = {
+            'league': LEAGUE_NAME,
+            'currencyOneItemId': target_item["id"],
+            'currencyTwoItemId': base_currency["id"]
+        }
+        stem = scout_store.pair_stem(target_item["name"], base_currency["name"])
+        file_path = os.path.join(output_dir, stem + scout_store.STORE_EXT)
+        legacy_path = os.path.join(output_dir, stem + scout_store.LEGACY_EXT)
+        if not os.path.exists(file_path) and os.path.exists(legacy_path):
+            scout_store.write_records(file_path, scout_store.iter_records(legacy_path))
+        # The mark comes from what the file really holds: sync_state.json can be
+        # ahead of it after an interrupted append, and full fetches set no mark.
+        since = scout_store.tail_epoch(file_path) if os.path.exists(file_path) else None
+        if state.get(stem) is not None and state.get(stem) != since:
+            print(f"  [WARN] '{stem}' holds records up to {since}, not {state[stem]} as recorded; syncing from there.")
+
+        if since is None:
+            data = fetch_pair(session, limiter, base_url, dict(params, limit=FULL_HISTORY_LIMIT))
+            new_records, requests_made = data.get("History", []), 1
+            scout_store.write_records(file_path, new_records)
+        else:
+            fetched, requests_made = fetch_new_records(session, limiter, base_url, params, since, page_size)
+            scout_store.append_records(file_path, fetched, replace_from=since)
+            new_records = [r for r in fetched if r["Epoch"] > since]
+            # Each sync leaves a small member behind; merges them once enough pile up.
+            scout_store.compact(file_path)
+
+        mark = max((r["Epoch"] for r in new_records if r.get("Epoch") is not None), default=since)
+        if mark is not None:
+            with state_lock:
+                state[stem] = mark
+                save_sync_state(output_dir, state)
+        return len(new_records), requests_made
+
+    start = time.monotonic()
+    synced = new_total = requests_total = 0
+    print(f"Syncing {len(jobs)} pairs with {max_workers} workers...")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run, t, b): (t["name"], b["name"]) for t, b in jobs}
+        for future in as_completed(futures):
+            target_name, base_name = futures[future]
+            try:
+                new_records, requests_made = future.result()
+                synced += 1
+                new_total += new_records
+                requests_total += requests_made
+                if new_records:
+                    print(f"  > {target_name} vs. {base_name}: {new_records} new records ({requests_made} requests)")
+            except Exception as e:
+                print(f"  > FAILED to sync {target_name} vs. {base_name}. Error: {e}")
+    session.close()
+    elapsed = time.monotonic() - start
+    print(f"\nSynced {synced}/{len(jobs)} pairs in {elapsed:.1f}s: {new_total} new records, {requests_total} requests.")
+    return new_total
+
 if __name__ == "__main__":
     ID_LOOKUP_FILE = "target_item_ids.csv"
     OUTPUT_DIRECTORY = "currencyPairHistory"
     
-    BASE_CURRENCIES = [
-        {"name": "Exalted Orb", "id": 290},
-        {"name": "Chaos Orb", "id": 287},
-        {"name": "Divine Orb", "id": 291}
-    ]
+    BASE_CURRENCY_NAMES = ["Exalted Orb", "Chaos Orb", "Divine Orb"]
+
+    parser = argparse.ArgumentParser(description="Download pair histories from poe2scout.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--sequential', action='store_true', help="Fetch one pair at a time with a fixed delay.")
+    mode.add_argument('--sync', action='store_true', help="Only fetch records newer than those already stored.")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    parser.add_argument('--rate', type=float, default=INITIAL_RATE, help="Initial requests per second.")
+    parser.add_argument('--base-url', default=BASE_URL, help="Override the API endpoint (e.g. scout_stub_server).")
+    parser.add_argument('--output-dir', default=OUTPUT_DIRECTORY)
+    args = parser.parse_args()
 
     target_items_list = get_target_items(ID_LOOKUP_FILE)
+    catalog = item_catalog.get_catalog()
+    BASE_CURRENCIES = [{"name": name, "id": catalog.by_name(name).item_id} for name in BASE_CURRENCY_NAMES]
 
     if target_items_list:
-        fetch_all_pair_histories(target_items_list, BASE_CURRENCIES, OUTPUT_DIRECTORY)
\ No newline at end of file
+        if args.sequential:
+            fetch_all_pair_histories(target_items_list, BASE_CURRENCIES, args.output_dir, args.base_url)
+        elif args.sync:
+            sync_all_pair_histories(target_items_list, BASE_CURRENCIES, args.output_dir,
+                                    max_workers=args.workers, base_url=args.base_url, rate=args.rate)
+        else:
+            fetch_all_pair_histories_concurrent(target_items_list, BASE_CURRENCIES, args.output_dir,
+                                                max_workers=args.workers, base_url=args.base_url, rate=args.rate)
\ No newline at end of file
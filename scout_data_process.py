@@ -1,100 +1,202 @@
 import os
-import json
 import csv
-from datetime import datetime
-
-def create_item_id_to_name_map(csv_path):
-    """Reads the target_item_ids.csv file and creates a mapping from ItemID to Name."""
-    id_to_name_map = {}
+import json
+import hashlib
+import argparse
+import numpy as np
+import scout_store
+import item_catalog
+from concurrent.futures import ProcessPoolExecutor
+
+# --- Configuration ---
+# Each pair file is converted to its own headerless CSV part in PROCESSED_DIR;
+# the manifest remembers which input (mtime, size, content hash) a part was
+# built from, so later runs only reconvert pair files that changed.
+PROCESSED_DIR = "scout_processed"
+MANIFEST_FILE = "manifest.json"
+# Records converted at a time inside a worker; bounds memory per pair file.
+ROWS_PER_BLOCK = 50000
+HASH_CHUNK_BYTES = 1 << 20
+
+# Flattened PairHistory fields read from each pair file, in this order.
+HISTORY_FIELDS = (
+    "Epoch",
+    "Data.CurrencyOneData.CurrencyItemId", "Data.CurrencyOneData.RelativePrice", "Data.CurrencyOneData.VolumeTraded",
+    "Data.CurrencyTwoData.CurrencyItemId", "Data.CurrencyTwoData.RelativePrice", "Data.CurrencyTwoData.VolumeTraded",
+)
+CSV_HEADERS = [
+    "timestamp_utc", "c1_item_id", "c1_name", "c1_relative_price", "c1_volume_traded",
+    "c2_item_id", "c2_name", "c2_relative_price", "c2_volume_traded"
+]
+
+def create_item_id_to_name_map(csv_path=item_catalog.TARGET_CSV_FILE):
+    """Returns the ItemID to Name mapping of the item catalog (None if it is empty)."""
     try:
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                item_id = int(row['itemID'])
-                item_name = row['name']
-                id_to_name_map[item_id] = item_name
-        return id_to_name_map
-    except FileNotFoundError:
-        print(f"Error: The ID lookup file '{csv_path}' was not found.")
-        return None
+        id_to_name_map = item_catalog.load_catalog(target_csv=csv_path).id_to_name()
     except Exception as e:
-        print(f"An error occurred reading '{csv_path}': {e}")
+        print(f"An error occurred loading the item catalog: {e}")
         return None
+    return id_to_name_map or None
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _id_map_hash(id_map):
+    return hashlib.sha1(json.dumps(sorted(id_map.items())).encode()).hexdigest()
+
+def _blocks(file_path, size=ROWS_PER_BLOCK):
+    """Yields lists of at most `size` HISTORY_FIELDS tuples from a pair file."""
+    block = []
+    for row in scout_store.iter_rows(file_path, HISTORY_FIELDS):
+        block.append(row)
+        if len(block) >= size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+def _convert_block(block, id_map):
+    """Turns one block of field tuples into CSV rows, converting columns at once."""
+    block = [row for row in block if row[0] is not None]
+    if not block:
+        return []
+    epoch, c1_id, c1_price, c1_volume, c2_id, c2_price, c2_volume = zip(*block)
+    # datetime64[s] prints as 'YYYY-MM-DDTHH:MM:SS', the same as utcfromtimestamp().isoformat().
+    timestamps = np.array(epoch, dtype='int64').astype('datetime64[s]').astype(str)
+    names = {item_id: id_map.get(item_id, "Unknown") for item_id in set(c1_id) | set(c2_id)}
+    return zip(timestamps.tolist(), c1_id, [names[i] for i in c1_id], c1_price, c1_volume,
+               c2_id, [names[i] for i in c2_id], c2_price, c2_volume)
+
+_worker_id_map = None
+
+def _init_worker(id_map):
+    global _worker_id_map
+    _worker_id_map = id_map
+
+def _process_pair_file(file_path, part_path):
+    """
+    Worker: converts one pair file into a headerless CSV part. Returns
+    (manifest entry, error). The fingerprint is taken before converting, so a
+    file rewritten meanwhile is picked up again on the next run.
+    """
+    rows = 0
+    tmp_path = part_path + '.tmp'
+    try:
+        stat = os.stat(file_path)
+        entry = {"mtime": stat.st_mtime, "size": stat.st_size, "sha1": _file_hash(file_path)}
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            for block in _blocks(file_path):
+                converted = list(_convert_block(block, _worker_id_map))
+                writer.writerows(converted)
+                rows += len(converted)
+        os.replace(tmp_path, part_path)
+        entry["rows"] = rows
+        return entry, None
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None, str(e)
 
-def process_pair_history_files(input_dir, output_csv, id_map):
+def _load_manifest(processed_dir):
+    try:
+        with open(os.path.join(processed_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _save_manifest(processed_dir, manifest):
+    path = os.path.join(processed_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def _is_current(entry, file_path, part_path):
     """
-    Processes all JSON files in a directory and compiles them into a single CSV,
-    including the names of the items.
+    True if the part was built from this exact input. A changed mtime or size
+    alone is not enough to reconvert: the content hash decides, and the entry
+    is updated so the next run can trust the new mtime.
+    """
+    if not entry or not os.path.exists(part_path):
+        return False
+    stat = os.stat(file_path)
+    if entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+        return True
+    if entry["sha1"] == _file_hash(file_path):
+        entry["mtime"], entry["size"] = stat.st_mtime, stat.st_size
+        return True
+    return False
+
+def process_pair_history_files(input_dir, output_csv, id_map, processed_dir=PROCESSED_DIR,
+                               max_workers=None, force=False):
+    """
+    Compiles all pair files in a directory (compact store or legacy JSON)
+    into a single CSV, including the names of the items. Changed pair files
+    are converted in parallel worker processes; the output is streamed
+    together from the per-pair parts in pair order, so memory does not grow
+    with the number of pairs or the length of their history.
     """
     if not os.path.isdir(input_dir):
         print(f"Error: Directory '{input_dir}' not found.")
         return
 
-    all_history_rows = []
-    json_files = [f for f in os.listdir(input_dir) if f.endswith('.json')]
+    pair_files = scout_store.list_pair_files(input_dir)
 
-    if not json_files:
-        print(f"No .json files found in '{input_dir}'.")
+    if not pair_files:
+        print(f"No pair history files found in '{input_dir}'.")
         return
 
-    print(f"Found {len(json_files)} JSON files to process...")
-
-    for filename in json_files:
-        file_path = os.path.join(input_dir, filename)
-        print(f"Processing '{filename}'...")
-
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            history = data.get("History", [])
-            for record in history:
-                epoch_time = record.get("Epoch")
-                if epoch_time is None:
-                    continue
-
-                timestamp_utc = datetime.utcfromtimestamp(epoch_time).isoformat()
-                c1_data = record.get("Data", {}).get("CurrencyOneData", {})
-                c2_data = record.get("Data", {}).get("CurrencyTwoData", {})
-                c1_item_id = c1_data.get("CurrencyItemId")
-                c2_item_id = c2_data.get("CurrencyItemId")
-                c1_name = id_map.get(c1_item_id, "Unknown")
-                c2_name = id_map.get(c2_item_id, "Unknown")
-
-                row = {
-                    "timestamp_utc": timestamp_utc,
-                    "c1_item_id": c1_item_id,
-                    "c1_name": c1_name,
-                    "c1_relative_price": c1_data.get("RelativePrice"),
-                    "c1_volume_traded": c1_data.get("VolumeTraded"),
-                    "c2_item_id": c2_item_id,
-                    "c2_name": c2_name,
-                    "c2_relative_price": c2_data.get("RelativePrice"),
-                    "c2_volume_traded": c2_data.get("VolumeTraded"),
-                }
-                all_history_rows.append(row)
-
-        except Exception as e:
-            print(f"  An error occurred with '{filename}': {e}")
-
-    if not all_history_rows:
+    os.makedirs(processed_dir, exist_ok=True)
+    manifest = _load_manifest(processed_dir)
+    id_map_hash = _id_map_hash(id_map)
+    if force or manifest.get("id_map") != id_map_hash:
+        manifest = {"id_map": id_map_hash, "pairs": {}}
+    entries = manifest["pairs"]
+
+    parts = {stem: os.path.join(processed_dir, stem + ".csv") for stem in pair_files}
+    changed = [stem for stem in pair_files if not _is_current(entries.get(stem), pair_files[stem], parts[stem])]
+    print(f"Found {len(pair_files)} pair files, {len(changed)} new or changed to process...")
+
+    for stale in set(entries) - set(pair_files):
+        del entries[stale]
+        if os.path.exists(os.path.join(processed_dir, stale + ".csv")):
+            os.remove(os.path.join(processed_dir, stale + ".csv"))
+
+    changed_set = set(changed)
+    total_rows = 0
+    tmp_output = output_csv + '.tmp'
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(id_map,)) as executor:
+        results = executor.map(_process_pair_file, [pair_files[s] for s in changed], [parts[s] for s in changed])
+        with open(tmp_output, 'w', newline='', encoding='utf-8') as out:
+            csv.writer(out).writerow(CSV_HEADERS)
+            for stem in pair_files:
+                if stem in changed_set:
+                    entry, error = next(results)
+                    if error:
+                        print(f"  An error occurred with '{os.path.basename(pair_files[stem])}': {error}")
+                        entries.pop(stem, None)
+                        continue
+                    entries[stem] = entry
+                    print(f"Processed '{os.path.basename(pair_files[stem])}' ({entry['rows']} rows).")
+                with open(parts[stem], 'r', newline='', encoding='utf-8') as part:
+                    for chunk in iter(lambda: part.read(HASH_CHUNK_BYTES), ''):
+                        out.write(chunk)
+                total_rows += entries[stem]["rows"]
+    _save_manifest(processed_dir, manifest)
+
+    if not total_rows:
+        os.remove(tmp_output)
         print("No valid history data was processed.")
         return
 
     try:
-        with open(output_csv, 'w', newline='', encoding='utf-8') as f:
-            headers = [
-                "timestamp_utc", "c1_item_id", "c1_name", "c1_relative_price", "c1_volume_traded",
-                "c2_item_id", "c2_name", "c2_relative_price", "c2_volume_traded"
-            ]
-            # Corrected from DictReader to DictWriter
-            writer = csv.DictWriter(f, fieldnames=headers)
-            writer.writeheader()
-            writer.writerows(all_history_rows)
-        
-        print(f"\nSuccess! All data has been processed into '{output_csv}'")
-
-    except IOError:
+        os.replace(tmp_output, output_csv)
+        print(f"\nSuccess! {total_rows} rows from {len(pair_files)} pairs processed into '{output_csv}'")
+    except OSError:
         print(f"Error: Could not write to the file '{output_csv}'.")
 
 
@@ -104,7 +206,13 @@ if __name__ == "__main__":
     OUTPUT_CSV_FILE = "scout_macro_data.csv"
     ITEM_ID_LOOKUP_FILE = "target_item_ids.csv"
 
+    parser = argparse.ArgumentParser(description="Compile pair histories into one CSV.")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument('--full', action='store_true', help="Reprocess every pair file, ignoring the manifest.")
+    args = parser.parse_args()
+
     item_id_map = create_item_id_to_name_map(ITEM_ID_LOOKUP_FILE)
 
     if item_id_map:
-        process_pair_history_files(INPUT_DIRECTORY, OUTPUT_CSV_FILE, item_id_map)
\ No newline at end of file
+        process_pair_history_files(INPUT_DIRECTORY, OUTPUT_CSV_FILE, item_id_map,
+                                   max_workers=args.workers, force=args.full)
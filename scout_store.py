@@ -0,0 +1,441 @@
+import os
+import sys
+import gzip
+import json
+import zlib
+from operator import itemgetter
+
+# --- Configuration ---
+# One gzip-compressed NDJSON file per pair. Each append is a new gzip member:
+# a header line {"fields": [...]} naming the flattened record paths
+# ("Data.CurrencyOneData.RelativePrice"), then one JSON array of values per
+# record. The newest record sits in a member of its own, which is the only
+# part ever rewritten (to replace it, see append_records); compact() merges
+# the small members that syncs leave behind. Readers parse short flat arrays
+# instead of the nested, repeatedly keyed objects of the API.
+# The old pretty-printed <pair>.json files stay readable.
+STORE_DIR = 'currencyPairHistory'
+STORE_EXT = '.ndjson.gz'
+LEGACY_EXT = '.json'
+COMPRESS_LEVEL = 6
+# Lines are decoded in batches of about this many bytes: one json.loads per
+# batch is much faster than one per line and memory stays bounded.
+READ_BATCH_BYTES = 1 << 20
+# Compressed bytes fed to zlib at a time when splitting a file into members.
+MEMBER_SCAN_BYTES = 1 << 16
+# Each pair file has a small JSON sidecar (<pair>.ndjson.gz.idx) with the
+# byte offset of every member, the file size and mtime it describes and the
+# newest Epoch, so appends and the sync high-water mark never inflate the
+# stored history. A missing or stale index is rebuilt by scanning the file.
+INDEX_EXT = '.idx'
+# compact() merges trailing members smaller than COMPACT_MEMBER_BYTES once
+# at least COMPACT_MIN_MEMBERS of them have piled up.
+COMPACT_MEMBER_BYTES = 1 << 16
+COMPACT_MIN_MEMBERS = 16
+
+
+def pair_stem(target_name: str, base_name: str) -> str:
+    safe_target_name = target_name.replace(" ", "_").replace("'", "")
+    safe_base_name = base_name.replace(" ", "_").replace("'", "")
+    return f"{safe_target_name}_vs_{safe_base_name}"
+
+
+def pair_path(store_dir: str, target_name: str, base_name: str) -> str:
+    return os.path.join(store_dir, pair_stem(target_name, base_name) + STORE_EXT)
+
+
+def _flatten(record: dict, prefix: str = ''):
+    for key, value in record.items():
+        if isinstance(value, dict) and value:
+            yield from _flatten(value, f"{prefix}{key}.")
+        else:
+            yield prefix + key, value
+
+
+def _unflatten(fields, values) -> dict:
+    record = {}
+    for path, value in zip(fields, values):
+        node = record
+        *parents, leaf = path.split('.')
+        for key in parents:
+            node = node.setdefault(key, {})
+        node[leaf] = value
+    return record
+
+
+def _encode(records):
+    flat = [dict(_flatten(record)) for record in records]
+    if not flat:
+        return []
+    fields = list(dict.fromkeys(path for record in flat for path in record))
+    lines = [json.dumps({"fields": fields}, separators=(',', ':')) + "\n"]
+    lines.extend(json.dumps([record.get(path) for path in fields], separators=(',', ':')) + "\n" for record in flat)
+    return lines
+
+
+def _compress(lines) -> bytes:
+    return gzip.compress("".join(lines).encode('utf-8'), compresslevel=COMPRESS_LEVEL)
+
+
+def _write_synced(f, *parts):
+    for part in parts:
+        f.write(part)
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _replace_file(path: str, *parts):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        _write_synced(f, *parts)
+    os.replace(tmp_path, path)
+
+
+def _read_members(path: str):
+    """
+    Splits a pair file into its gzip members. Returns (file bytes, [(start,
+    end), ...] of the complete members, decoded text of the last one).
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    spans, text, pos = [], "", 0
+    while pos < len(data):
+        member, parts, offset = zlib.decompressobj(wbits=31), [], pos
+        try:
+            while not member.eof and offset < len(data):
+                chunk = data[offset:offset + MEMBER_SCAN_BYTES]
+                parts.append(member.decompress(chunk))
+                offset += len(chunk)
+        except zlib.error:
+            break
+        if not member.eof:
+            break
+        end = offset - len(member.unused_data)
+        spans.append((pos, end))
+        text, pos = b"".join(parts).decode('utf-8'), end
+    return data, spans, text
+
+
+def _decode_member(text: str):
+    """Records of one member's text, as the API returned them."""
+    fields = []
+    for line in text.splitlines():
+        item = json.loads(line)
+        if isinstance(item, dict):
+            fields = item["fields"]
+        else:
+            yield _unflatten(fields, item)
+
+
+def _encode_members(records) -> list:
+    """
+    Compressed members for records in Epoch order. The newest record gets a
+    member of its own, so replacing it later only cuts off that small member.
+    """
+    if not records:
+        return []
+    members = [_compress(_encode(records[:-1]))] if len(records) > 1 else []
+    return members + [_compress(_encode(records[-1:]))]
+
+
+def _newest_epoch(records):
+    return max((r["Epoch"] for r in records if r.get("Epoch") is not None), default=None)
+
+
+def _save_index(path: str, members: list, epoch):
+    """Writes the sidecar index of a pair file that was just written."""
+    stat = os.stat(path)
+    index = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "members": members, "epoch": epoch}
+    with open(path + INDEX_EXT + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(path + INDEX_EXT + '.tmp', path + INDEX_EXT)
+    return index
+
+
+def _index(path: str) -> dict:
+    """
+    The pair file's sidecar index, rebuilt by scanning the whole file if it
+    is missing or does not match the file (e.g. after an interrupted append).
+    A rebuild cuts off a damaged last member, since nothing appended after
+    it could be read.
+    """
+    try:
+        with open(path + INDEX_EXT, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        stat = os.stat(path)
+        if index["size"] == stat.st_size and index["mtime_ns"] == stat.st_mtime_ns:
+            return index
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+        pass
+    data, spans, text = _read_members(path)
+    intact = spans[-1][1] if spans else 0
+    if intact < len(data):
+        print(f"[WARN] '{path}' ends in {len(data) - intact} bytes of a damaged record batch; removing them.")
+        with open(path, 'r+b') as f:
+            f.truncate(intact)
+            _write_synced(f)
+    return _save_index(path, [start for start, _ in spans], _newest_epoch(list(_decode_member(text))))
+
+
+def _read_from(path: str, offset: int) -> list:
+    """Records of every member from a byte offset to the end of the file."""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return list(_decode_member(gzip.decompress(f.read()).decode('utf-8')))
+
+
+def write_records(path: str, records) -> int:
+    """Replaces a pair file with records, via a temporary file. Returns the count written."""
+    records = list(records)
+    members = _encode_members(records)
+    _replace_file(path, *members)
+    offsets = [sum(len(m) for m in members[:i]) for i in range(len(members))]
+    _save_index(path, offsets, _newest_epoch(records[-1:]))
+    return len(records)
+
+
+def append_records(path: str, records, replace_from=None) -> int:
+    """
+    Appends records to a pair file as new gzip members, compressed in memory
+    and written and fsynced at once; the sidecar index lets this seek to the
+    end without reading what is stored. Returns the count written. With
+    replace_from (an Epoch), stored records at or after it are replaced by
+    the given ones: being the newest, they are in the last member, which is
+    cut off and written again without them.
+    """
+    records = list(records)
+    if not os.path.exists(path):
+        return write_records(path, records) if records else 0
+    index = _index(path)
+    members, write_at = list(index["members"]), index["size"]
+    count = len(records)
+
+    if replace_from is not None and members:
+        stored = _read_from(path, members[-1])
+        kept = [r for r in stored if r.get("Epoch") is None or r["Epoch"] < replace_from]
+        replaced = stored[len(kept):] if stored[:len(kept)] == kept else None
+        if replaced is not None and records[:len(replaced)] == replaced:
+            # What is stored is still current; only the newer records are written.
+            records = records[len(replaced):]
+            count = len(records)
+        else:
+            write_at = members.pop()
+            records = kept + records
+
+    if write_at == index["size"] and not records:
+        return 0
+    with open(path, 'r+b') as f:
+        f.truncate(write_at)
+        f.seek(write_at)
+        for member in _encode_members(records):
+            members.append(f.tell())
+            f.write(member)
+        _write_synced(f)
+    if records:
+        _save_index(path, members, _newest_epoch(records[-1:]))
+    else:
+        # Only the replaced record was cut off; the next read rebuilds the index.
+        os.remove(path + INDEX_EXT)
+    return count
+
+
+def compact(path: str, member_bytes: int = COMPACT_MEMBER_BYTES, min_members: int = COMPACT_MIN_MEMBERS) -> int:
+    """
+    Merges the run of small members (under member_bytes each) before the
+    last one into a single member, once there are at least min_members of
+    them. Members before the run are copied as they are, so the cost depends
+    on the recent appends, not on the whole history. Returns the number of
+    members merged.
+    """
+    if not path.endswith(STORE_EXT) or not os.path.exists(path):
+        return 0
+    index = _index(path)
+    members = index["members"]
+    ends = members[1:] + [index["size"]]
+    first = len(members) - 1
+    while first > 0 and ends[first - 1] - members[first - 1] < member_bytes:
+        first -= 1
+    merged = len(members) - 1 - first
+    if merged < max(min_members, 2):
+        return 0
+
+    records = _read_from(path, members[first])
+    tail = _encode_members(records)
+    tmp_path = path + '.tmp'
+    with open(path, 'rb') as src, open(tmp_path, 'wb') as f:
+        remaining = members[first]
+        while remaining:
+            chunk = src.read(min(remaining, READ_BATCH_BYTES))
+            f.write(chunk)
+            remaining -= len(chunk)
+        offsets = members[:first]
+        for member in tail:
+            offsets.append(f.tell())
+            f.write(member)
+        _write_synced(f)
+    os.replace(tmp_path, path)
+    _save_index(path, offsets, _newest_epoch(records[-1:]))
+    return merged
+
+
+def tail_epoch(path: str):
+    """
+    Newest Epoch in the readable part of a pair file, or None if it has
+    none. Read from the sidecar index; a damaged tail does not count.
+    """
+    if not path.endswith(STORE_EXT):
+        return latest_epoch(path)
+    index = _index(path)
+    if index["epoch"] is None and index["members"]:
+        return latest_epoch(path)
+    return index["epoch"]
+
+
+def _parsed_batches(path: str, batched: bool):
+    """Yields (fields, [values, ...]) runs of records as they are decoded."""
+    fields = []
+    rest = ""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        while True:
+            if batched:
+                data = f.read(READ_BATCH_BYTES)
+                chunk, rest = rest + data, ""
+                if data:
+                    # Decode whole lines only; the tail waits for the next read.
+                    cut = chunk.rfind("\n") + 1
+                    chunk, rest = chunk[:cut], chunk[cut:]
+                    if not chunk:
+                        continue
+            else:
+                chunk = f.readline()
+            if not chunk:
+                return
+            rows = []
+            for item in json.loads("[" + chunk.strip().replace("\n", ",") + "]"):
+                if isinstance(item, dict):
+                    if rows:
+                        yield fields, rows
+                        rows = []
+                    fields = item["fields"]
+                else:
+                    rows.append(item)
+            if rows:
+                yield fields, rows
+
+
+def _iter_batches(path: str):
+    """
+    Yields (fields, [values, ...]) for every stored record. If the file is
+    damaged (an interrupted append), it is re-read line by line up to the
+    damage so no intact record is lost, and a warning is printed.
+    """
+    done = 0
+    for batched in (True, False):
+        seen = 0
+        try:
+            for fields, rows in _parsed_batches(path, batched):
+                fresh = rows[max(0, done - seen):]
+                seen += len(rows)
+                if fresh:
+                    done += len(fresh)
+                    yield fields, fresh
+            return
+        except (EOFError, zlib.error, gzip.BadGzipFile, json.JSONDecodeError) as e:
+            error = e
+    print(f"[WARN] '{path}' ends in a damaged record ({error}); reading stopped there.")
+
+
+def iter_rows(path: str, fields):
+    """
+    Streams tuples of the requested flattened fields (None where a record
+    lacks one) from a pair file, either format. Cheaper than iter_records
+    because no record dicts are rebuilt.
+    """
+    if not path.endswith(STORE_EXT):
+        for record in iter_records(path):
+            flat = dict(_flatten(record))
+            yield tuple(flat.get(field) for field in fields)
+        return
+    stored, getter = None, None
+    for stored_fields, rows in _iter_batches(path):
+        if stored_fields is not stored:
+            stored = stored_fields
+            positions = {name: i for i, name in enumerate(stored)}
+            index = [positions.get(field) for field in fields]
+            if None not in index and len(index) > 1:
+                getter = itemgetter(*index)
+            else:
+                getter = lambda values, index=index: tuple(values[i] if i is not None else None for i in index)
+        yield from map(getter, rows)
+
+
+def iter_records(path: str):
+    """
+    Streams the records of a pair file, either format, as the API returned
+    them.
+    """
+    if not path.endswith(STORE_EXT):
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from json.load(f).get("History", [])
+        return
+    for fields, rows in _iter_batches(path):
+        for values in rows:
+            yield _unflatten(fields, values)
+
+
+def latest_epoch(path: str):
+    """Newest Epoch stored in a pair file, or None if it has no records (or does not exist)."""
+    if not os.path.exists(path):
+        return None
+    return max((epoch for epoch, in iter_rows(path, ("Epoch",)) if epoch is not None), default=None)
+
+
+def list_pair_files(store_dir: str = STORE_DIR):
+    """
+    Returns {pair stem: path} for every pair in the directory. A pair that has
+    both formats is read from the compact file.
+    """
+    files = {}
+    if not os.path.isdir(store_dir):
+        return files
+    for name in sorted(os.listdir(store_dir)):
+        for ext in (LEGACY_EXT, STORE_EXT):
+            if name.endswith(ext) and '_vs_' in name:
+                stem = name[:-len(ext)]
+                if ext == STORE_EXT or stem not in files:
+                    files[stem] = os.path.join(store_dir, name)
+    return files
+
+
+def migrate_legacy(store_dir: str = STORE_DIR, remove: bool = False) -> int:
+    """Converts every legacy <pair>.json without a compact file into the compact format."""
+    migrated = 0
+    for stem, path in list_pair_files(store_dir).items():
+        if path.endswith(STORE_EXT):
+            continue
+        count = write_records(os.path.join(store_dir, stem + STORE_EXT), iter_records(path))
+        if remove:
+            os.remove(path)
+        print(f"[INFO] Migrated '{path}' ({count} records).")
+        migrated += 1
+    return migrated
+
+
+def compact_all(store_dir: str = STORE_DIR, min_members: int = COMPACT_MIN_MEMBERS) -> int:
+    """Runs compact() on every compact pair file. Returns the number of files compacted."""
+    compacted = 0
+    for path in list_pair_files(store_dir).values():
+        merged = compact(path, min_members=min_members)
+        if merged:
+            print(f"[INFO] Merged {merged} small record batches in '{path}'.")
+            compacted += 1
+    return compacted
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != '--remove-legacy']
+    store_dir = args[0] if args else STORE_DIR
+    remove = '--remove-legacy' in sys.argv
+    print(f"[SUCCESS] Migrated {migrate_legacy(store_dir, remove)} pair files in '{store_dir}'.")
+    # Offline, every trailing run of two or more small members is merged.
+    print(f"[SUCCESS] Compacted {compact_all(store_dir, min_members=2)} pair files in '{store_dir}'.")
@@ -0,0 +1,150 @@
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# --- Configuration ---
+DEFAULT_PORT = 8765
+# Requests allowed per window before the stub answers 429 with retry-after.
+DEFAULT_LIMIT = 20
+DEFAULT_WINDOW_SECONDS = 5.0
+HISTORY_POINTS = 200
+HOUR_SECONDS = 3600
+
+
+def fake_history(one_id: int, two_id: int, points: int = HISTORY_POINTS, end_epoch: int = None,
+                 point_seconds: int = HOUR_SECONDS) -> dict:
+    """
+    Deterministic PairHistory-shaped payload for a pair: `points` records,
+    point_seconds apart, ending at end_epoch. A record's values depend only
+    on the pair and its Epoch, so overlapping requests agree.
+    """
+    end_epoch = end_epoch or int(time.time()) // point_seconds * point_seconds
+    base = random.Random(one_id * 100003 + two_id).uniform(0.01, 500)
+    history = []
+    for i in range(points):
+        epoch = end_epoch - (points - 1 - i) * point_seconds
+        rng = random.Random((one_id * 100003 + two_id) * 1000003 + epoch)
+        price = base * rng.uniform(0.9, 1.1)
+        history.append({
+            "Epoch": epoch,
+            "Data": {
+                "CurrencyOneData": {"CurrencyItemId": one_id, "RelativePrice": round(price, 6), "VolumeTraded": rng.randint(1, 5000)},
+                "CurrencyTwoData": {"CurrencyItemId": two_id, "RelativePrice": round(1 / price, 6), "VolumeTraded": rng.randint(1, 5000)},
+            }
+        })
+    return {"History": history}
+
+
+class StubState:
+    """Fixed-window rate limiter plus counters, shared by all handler threads."""
+
+    def __init__(self, limit, window, latency, error_rate, point_seconds=HOUR_SECONDS):
+        self.limit = limit
+        self.point_seconds = point_seconds
+        self.window = window
+        self.latency = latency
+        self.error_rate = error_rate
+        self.window_start = time.monotonic()
+        self.used = 0
+        self.served = 0
+        self.rejected = 0
+        self.records_sent = 0
+        self.lock = threading.Lock()
+
+    def admit(self):
+        """Returns (allowed, remaining, seconds until the window resets)."""
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= self.window:
+                self.window_start, self.used = now, 0
+            reset = self.window - (now - self.window_start)
+            if self.used >= self.limit:
+                self.rejected += 1
+                return False, 0, reset
+            self.used += 1
+            self.served += 1
+            return True, self.limit - self.used, reset
+
+
+def make_handler(state: StubState):
+    class PairHistoryHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body: dict, headers=None):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if not url.path.endswith("/PairHistory"):
+                self._send(404, {"error": "not found"})
+                return
+            allowed, remaining, reset = state.admit()
+            limit_headers = {
+                "X-RateLimit-Limit": str(state.limit),
+                "X-RateLimit-Remaining": str(remaining),
+                "X-RateLimit-Reset": f"{reset:.2f}",
+            }
+            if not allowed:
+                self._send(429, {"error": "rate limited"}, {**limit_headers, "Retry-After": f"{reset:.2f}"})
+                return
+            time.sleep(state.latency)
+            if random.random() < state.error_rate:
+                self._send(503, {"error": "try again"}, limit_headers)
+                return
+            query = parse_qs(url.query)
+            one_id = int(query.get("currencyOneItemId", ["0"])[0])
+            two_id = int(query.get("currencyTwoItemId", ["0"])[0])
+            limit = int(query.get("limit", [str(HISTORY_POINTS)])[0])
+            history = fake_history(one_id, two_id, point_seconds=state.point_seconds)["History"]
+            if "endEpoch" in query:
+                history = [r for r in history if r["Epoch"] < int(query["endEpoch"][0])]
+            history = history[-limit:] if limit > 0 else []
+            with state.lock:
+                state.records_sent += len(history)
+            self._send(200, {"History": history}, limit_headers)
+
+    return PairHistoryHandler
+
+
+def start_server(port=DEFAULT_PORT, limit=DEFAULT_LIMIT, window=DEFAULT_WINDOW_SECONDS, latency=0.05, error_rate=0.0,
+                 point_seconds=HOUR_SECONDS):
+    """Starts the stub on a background thread; returns (server, state). Stop with server.shutdown()."""
+    state = StubState(limit, window, latency, error_rate, point_seconds)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, name="scout-stub", daemon=True).start()
+    return server, state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the poe2scout PairHistory API.")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT, help="Requests per window.")
+    parser.add_argument('--window', type=float, default=DEFAULT_WINDOW_SECONDS, help="Rate-limit window in seconds.")
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds added to every successful response.")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 503.")
+    parser.add_argument('--point-seconds', type=int, default=HOUR_SECONDS,
+                        help="Seconds between history points; lower it to watch new records arrive while syncing.")
+    args = parser.parse_args()
+
+    server, state = start_server(args.port, args.limit, args.window, args.latency, args.error_rate, args.point_seconds)
+    print(f"Stub PairHistory API on http://127.0.0.1:{args.port}/api/currencyExchange/PairHistory (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"Served {state.served} requests ({state.records_sent} records), rejected {state.rejected}.")
@@ -0,0 +1,130 @@
+import os
+import abc
+
+# --- Configuration ---
+# Unset or "pyautogui" drives the real desktop; a path to a simulator
+# scenario JSON (see sim_backend.py) replays that scenario instead.
+BACKEND_ENV_VAR = 'SCREEN_BACKEND'
+
+
+class ScreenBackend(abc.ABC):
+    """
+    The screen and input operations the navigator needs. Coordinates are
+    screen pixels; screenshots are PIL RGB images.
+    """
+
+    @abc.abstractmethod
+    def size(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def screenshot(self, region=None):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def move_to(self, x, y, duration=0.0, ease=False):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def move_rel(self, dx, dy, duration=0.0, ease=False):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def mouse_down(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def mouse_up(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def click(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def key_down(self, key):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def key_up(self, key):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def press(self, key):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def hotkey(self, *keys):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def type_text(self, text, interval=0.0):
+        raise NotImplementedError
+
+
+class PyAutoGuiBackend(ScreenBackend):
+    """The live desktop, through pyautogui."""
+
+    def __init__(self):
+        import pyautogui
+        self.gui = pyautogui
+
+    def _tween(self, ease):
+        return self.gui.easeOutQuad if ease else self.gui.linear
+
+    def size(self):
+        return tuple(self.gui.size())
+
+    def screenshot(self, region=None):
+        return self.gui.screenshot(region=tuple(region) if region else None)
+
+    def move_to(self, x, y, duration=0.0, ease=False):
+        self.gui.moveTo(x, y, duration=duration, tween=self._tween(ease))
+
+    def move_rel(self, dx, dy, duration=0.0, ease=False):
+        self.gui.moveRel(dx, dy, duration=duration, tween=self._tween(ease))
+
+    def mouse_down(self):
+        self.gui.mouseDown()
+
+    def mouse_up(self):
+        self.gui.mouseUp()
+
+    def click(self):
+        self.gui.click()
+
+    def key_down(self, key):
+        self.gui.keyDown(key)
+
+    def key_up(self, key):
+        self.gui.keyUp(key)
+
+    def press(self, key):
+        self.gui.press(key)
+
+    def hotkey(self, *keys):
+        self.gui.hotkey(*keys)
+
+    def type_text(self, text, interval=0.0):
+        self.gui.typewrite(text, interval=interval)
+
+
+_backend = None
+
+def set_backend(backend: ScreenBackend):
+    """Replaces the backend every later screen or input call goes through."""
+    global _backend
+    _backend = backend
+
+def get_backend() -> ScreenBackend:
+    """Returns the active backend, creating it from SCREEN_BACKEND on first use."""
+    global _backend
+    if _backend is None:
+        choice = os.environ.get(BACKEND_ENV_VAR, 'pyautogui')
+        if choice == 'pyautogui':
+            _backend = PyAutoGuiBackend()
+        else:
+            from sim_backend import SimulatorBackend
+            print(f"[INFO] Using simulator backend with scenario '{choice}'.")
+            _backend = SimulatorBackend(choice)
+    return _backend
@@ -0,0 +1,193 @@
+import time
+from collections import namedtuple
+import cv2
+import numpy as np
+from PIL import Image
+from screen_backend import get_backend
+import step_trace
+
+# --- Configuration ---
+# A coarse match only has to clear (confidence - COARSE_MARGIN) to be checked at full resolution.
+COARSE_MARGIN = 0.15
+COARSE_CANDIDATES = 3
+
+# Same shape as pyscreeze's Box, so code written against pyautogui's results keeps working.
+Box = namedtuple('Box', 'left top width height')
+
+
+class Frame:
+    """
+    One screen grab that can be searched for any number of templates. Grab a
+    new frame only when the UI is expected to have changed.
+    """
+
+    def __init__(self, image_rgb, left=0, top=0):
+        self.rgb = image_rgb
+        self.gray = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2GRAY)
+        self.left = left
+        self.top = top
+
+    @classmethod
+    def grab(cls, region=None):
+        """Captures the screen (or a region of it) once through the active backend."""
+        start = time.perf_counter()
+        shot = get_backend().screenshot(region)
+        left, top = (region[0], region[1]) if region else (0, 0)
+        frame = cls(np.asarray(shot.convert('RGB')), left, top)
+        step_trace.add("grab_s", time.perf_counter() - start)
+        step_trace.add("grabs", 1)
+        return frame
+
+    def _window(self, region):
+        """Clips a screen-coordinate region to this frame; returns (x0, y0, x1, y1) in frame coordinates."""
+        height, width = self.gray.shape
+        if region is None:
+            return 0, 0, width, height
+        x0 = max(0, int(region[0]) - self.left)
+        y0 = max(0, int(region[1]) - self.top)
+        x1 = min(width, int(region[0] + region[2]) - self.left)
+        y1 = min(height, int(region[1] + region[3]) - self.top)
+        return x0, y0, x1, y1
+
+    def locate(self, template, region=None, confidence=0.8):
+        """Returns the best match of a grayscale template as a Box in screen coordinates, or None."""
+        if template is None:
+            return None
+        x0, y0, x1, y1 = self._window(region)
+        th, tw = template.shape[:2]
+        if x1 - x0 < tw or y1 - y0 < th:
+            return None
+        start = time.perf_counter()
+        res = cv2.matchTemplate(self.gray[y0:y1, x0:x1], template, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+        step_trace.add("locate_s", time.perf_counter() - start)
+        step_trace.add("locates", 1)
+        if max_val < confidence:
+            return None
+        return Box(self.left + x0 + max_loc[0], self.top + y0 + max_loc[1], tw, th)
+
+    def locate_coarse_to_fine(self, template, coarse_template, scale, region=None, confidence=0.8,
+                              candidates=COARSE_CANDIDATES):
+        """
+        Like locate, but matches a downscaled copy of the region first
+        (coarse_template is the template resized by scale) and verifies only
+        the best few candidates at full resolution against confidence.
+        """
+        if template is None or coarse_template is None:
+            return self.locate(template, region, confidence)
+        x0, y0, x1, y1 = self._window(region)
+        th, tw = template.shape[:2]
+        ch, cw = coarse_template.shape[:2]
+        small = cv2.resize(self.gray[y0:y1, x0:x1], None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        if small.shape[0] < ch or small.shape[1] < cw:
+            return self.locate(template, region, confidence)
+
+        start = time.perf_counter()
+        res = cv2.matchTemplate(small, coarse_template, cv2.TM_CCOEFF_NORMED)
+        pad = int(np.ceil(1 / scale)) + 1
+        best = None
+        for _ in range(candidates):
+            _, coarse_val, _, (cx, cy) = cv2.minMaxLoc(res)
+            if coarse_val < confidence - COARSE_MARGIN:
+                break
+            res[max(0, cy - ch // 2):cy + ch // 2 + 1, max(0, cx - cw // 2):cx + cw // 2 + 1] = -1.0
+
+            fx0 = max(x0, x0 + int(cx / scale) - pad)
+            fy0 = max(y0, y0 + int(cy / scale) - pad)
+            fx1 = min(x1, x0 + int(cx / scale) + tw + pad)
+            fy1 = min(y1, y0 + int(cy / scale) + th + pad)
+            if fx1 - fx0 < tw or fy1 - fy0 < th:
+                continue
+            fine = cv2.matchTemplate(self.gray[fy0:fy1, fx0:fx1], template, cv2.TM_CCOEFF_NORMED)
+            _, val, _, loc = cv2.minMaxLoc(fine)
+            if val >= confidence and (best is None or val > best[0]):
+                best = (val, Box(self.left + fx0 + loc[0], self.top + fy0 + loc[1], tw, th))
+        step_trace.add("locate_s", time.perf_counter() - start)
+        step_trace.add("locates", 1)
+        return best[1] if best else None
+
+    def locate_many(self, requests: dict):
+        """
+        Searches this frame for several anchors at once.
+        requests maps a name to (template, region, confidence); returns {name: Box or None}.
+        """
+        return {name: self.locate(template, region, confidence) for name, (template, region, confidence) in requests.items()}
+
+    def crop(self, region):
+        """Returns a screen-coordinate region of this frame as a PIL image, like a region screenshot."""
+        x0, y0, x1, y1 = self._window(region)
+        return Image.fromarray(self.rgb[y0:y1, x0:x1])
+
+
+class AnchorMemory:
+    """
+    Remembers where each anchor was last confirmed so the next search can
+    start in a small padded region around it. Counts hits (found in the
+    region) and misses (needed the full-screen fallback) per anchor.
+    """
+
+    def __init__(self, padding=120, screen_size=None):
+        self.padding = padding
+        self.screen_size = screen_size
+        self.positions = {}
+        self.hits = {}
+        self.misses = {}
+
+    def region_for(self, key):
+        """Padded search region (left, top, width, height) around the last known location, or None."""
+        box = self.positions.get(key)
+        if box is None:
+            return None
+        left = max(0, box.left - self.padding)
+        top = max(0, box.top - self.padding)
+        right = box.left + box.width + self.padding
+        bottom = box.top + box.height + self.padding
+        if self.screen_size:
+            right = min(right, self.screen_size[0])
+            bottom = min(bottom, self.screen_size[1])
+        return left, top, right - left, bottom - top
+
+    def remember(self, key, box):
+        self.positions[key] = Box(*(int(v) for v in box))
+
+    def forget(self, key):
+        self.positions.pop(key, None)
+
+    def record(self, key, hit):
+        counter = self.hits if hit else self.misses
+        counter[key] = counter.get(key, 0) + 1
+
+    def locate(self, key, find, confidence=0.8):
+        """
+        Runs find(region, confidence) in the remembered region first and on the
+        full screen (region=None) on a miss. Returns the location or None.
+        """
+        region = self.region_for(key)
+        if region is not None:
+            location = find(region, confidence)
+            if location:
+                self.record(key, True)
+                self.remember(key, location)
+                return location
+            self.record(key, False)
+        location = find(None, confidence)
+        if location:
+            self.remember(key, location)
+        return location
+
+    def to_state(self):
+        """Positions as plain lists, for run_state.json."""
+        return {key: list(box) for key, box in self.positions.items()}
+
+    def load_state(self, positions):
+        for key, box in (positions or {}).items():
+            if isinstance(box, list) and len(box) == 4:
+                self.remember(key, box)
+
+    def report(self):
+        keys = sorted(set(self.hits) | set(self.misses))
+        if not keys:
+            return
+        print("[INFO] Anchor region hits/misses:")
+        for key in keys:
+            print(f"  {key}: {self.hits.get(key, 0)} hit(s), {self.misses.get(key, 0)} miss(es)")
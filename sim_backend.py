@@ -0,0 +1,320 @@
+import os
+import sys
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+from PIL import Image
+from screen_backend import ScreenBackend, set_backend
+
+# --- Configuration ---
+DEFAULT_SCENARIO_DIR = 'sim_scenario'
+SCENARIO_FILE = 'scenario.json'
+SYNTHETIC_SCREEN_SIZE = (2560, 1440)
+# Extra pixels around a synthetic click zone that still count as a hit, so
+# the NPC's small hover wiggle before its click stays inside.
+CLICK_ZONE_SLACK = 12
+
+
+class SimulatorBackend(ScreenBackend):
+    """
+    Replays a scenario instead of the live game. A scenario is a JSON state
+    machine: every state names a frame (a recorded screenshot and/or images
+    pasted onto a background) and the input events that move it to another
+    state after an optional rendering delay. Every input received is logged.
+
+    Scenario layout:
+        {"screen_size": [w, h], "initial": "world",
+         "currency_templates": {"Divine Orb": "templates/...png"},
+         "states": {"world": {"frame": "world.png",
+                              "overlays": [{"image": "...png", "at": [x, y]},
+                                           {"typed_currency": true, "at": [x, y]},
+                                           {"other_currency": 0, "at": [x, y]}],
+                              "on": [{"event": "click", "rect": [x, y, w, h], "to": "dialogue", "delay": 0.6},
+                                     {"event": "key_down", "key": "alt", "to": "..."},
+                                     {"event": "type", "to": "..."}]}}}
+    Paths are relative to the scenario file; "typed_currency" shows the
+    template of whatever was typed last and "other_currency" the n-th
+    template that is not it.
+    """
+
+    def __init__(self, scenario_path, log_path=None):
+        with open(scenario_path, 'r') as f:
+            self.scenario = json.load(f)
+        self.base_dir = os.path.dirname(os.path.abspath(scenario_path))
+        self.screen = tuple(self.scenario.get('screen_size', SYNTHETIC_SCREEN_SIZE))
+        self.state = self.scenario['initial']
+        self.pending = None
+        self.typed = ''
+        self.mouse = (self.screen[0] // 2, self.screen[1] // 2)
+        self.keys_down = set()
+        self.actions = []
+        self.start = time.monotonic()
+        self._images = {}
+        self._frames = {}
+        self._log = open(log_path, 'a') if log_path else None
+
+    # --- State machine ---
+
+    def _current(self):
+        """Applies a pending transition once its delay has passed and returns the state name."""
+        if self.pending and time.monotonic() >= self.pending[0]:
+            self.state = self.pending[1]
+            self.pending = None
+        return self.state
+
+    def _fire(self, event, **details):
+        """Logs an input event and starts the first matching transition of the current state."""
+        state = self._current()
+        self.actions.append({"t": round(time.monotonic() - self.start, 4), "event": event, "state": state, **details})
+        if self._log:
+            self._log.write(json.dumps(self.actions[-1]) + "\n")
+            self._log.flush()
+        for transition in self.scenario['states'][state].get('on', []):
+            if transition['event'] != event:
+                continue
+            if 'key' in transition and transition['key'] != details.get('key'):
+                continue
+            if 'text' in transition and transition['text'] != details.get('text'):
+                continue
+            if 'rect' in transition:
+                x, y, w, h = transition['rect']
+                mx, my = self.mouse
+                if not (x <= mx < x + w and y <= my < y + h):
+                    continue
+            self.pending = (time.monotonic() + transition.get('delay', 0.0), transition['to'])
+            return
+
+    # --- Rendering ---
+
+    def _image(self, path):
+        if path not in self._images:
+            image = cv2.imread(os.path.join(self.base_dir, path), cv2.IMREAD_COLOR)
+            if image is None:
+                raise FileNotFoundError(f"Simulator image not found: {path}")
+            self._images[path] = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        return self._images[path]
+
+    def _render(self, state):
+        spec = self.scenario['states'][state]
+        currencies = self.scenario.get('currency_templates', {})
+        typed_path = None
+        if self.typed:
+            # The game's search narrows as you type, so a prefix shows the first currency it matches.
+            for name, path in currencies.items():
+                if name.lower().startswith(self.typed.lower()):
+                    typed_path = path
+                    break
+        others = [path for path in currencies.values() if path != typed_path]
+        key = (state, typed_path)
+        if key in self._frames:
+            return self._frames[key]
+
+        if spec.get('frame'):
+            frame = self._image(spec['frame']).copy()
+        else:
+            frame = np.zeros((self.screen[1], self.screen[0], 3), dtype=np.uint8)
+        for overlay in spec.get('overlays', []):
+            if overlay.get('typed_currency'):
+                path = typed_path
+            elif 'other_currency' in overlay:
+                index = overlay['other_currency']
+                path = others[index] if index < len(others) else None
+            else:
+                path = overlay['image']
+            if path is None:
+                continue
+            image = self._image(path)
+            x, y = overlay['at']
+            h = min(image.shape[0], frame.shape[0] - y)
+            w = min(image.shape[1], frame.shape[1] - x)
+            frame[y:y + h, x:x + w] = image[:h, :w]
+        self._frames[key] = frame
+        return frame
+
+    # --- ScreenBackend ---
+
+    def size(self):
+        return self.screen
+
+    def screenshot(self, region=None):
+        frame = self._render(self._current())
+        if region:
+            x, y, w, h = (int(v) for v in region)
+            frame = frame[max(0, y):y + h, max(0, x):x + w]
+        return Image.fromarray(frame)
+
+    def move_to(self, x, y, duration=0.0, ease=False):
+        self.mouse = (int(x), int(y))
+        self._fire('move', x=int(x), y=int(y))
+        time.sleep(duration)
+
+    def move_rel(self, dx, dy, duration=0.0, ease=False):
+        self.move_to(self.mouse[0] + dx, self.mouse[1] + dy, duration, ease)
+
+    def mouse_down(self):
+        self._fire('mouse_down', x=self.mouse[0], y=self.mouse[1])
+
+    def mouse_up(self):
+        self._fire('click', x=self.mouse[0], y=self.mouse[1])
+
+    def click(self):
+        self._fire('click', x=self.mouse[0], y=self.mouse[1])
+
+    def key_down(self, key):
+        self.keys_down.add(key)
+        self._fire('key_down', key=key)
+
+    def key_up(self, key):
+        self.keys_down.discard(key)
+        self._fire('key_up', key=key)
+
+    def press(self, key):
+        self._fire('press', key=key)
+
+    def hotkey(self, *keys):
+        self._fire('hotkey', keys=list(keys))
+
+    def type_text(self, text, interval=0.0):
+        time.sleep(interval * len(text))
+        self.typed = text
+        self._fire('type', text=text)
+
+
+def _click_rect(location, zone):
+    """The screen rect a click on a template placed at location with click_zone can land in."""
+    x, y, w, h = location[0] + zone[0], location[1] + zone[1], zone[2], zone[3]
+    return [x - CLICK_ZONE_SLACK, y - CLICK_ZONE_SLACK, w + 2 * CLICK_ZONE_SLACK, h + 2 * CLICK_ZONE_SLACK]
+
+
+def build_synthetic_scenario(game_config: dict, out_dir: str = DEFAULT_SCENARIO_DIR, seed: int = 0):
+    """
+    Builds a scenario from the navigation and currency templates alone: a
+    noisy background with each template pasted where the trade UI would show
+    it, wired up the way game_gui_navigator walks through the UI.
+    Returns the path of the scenario file.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    nav = game_config['navigation']
+    width, height = SYNTHETIC_SCREEN_SIZE
+    rng = np.random.default_rng(seed)
+    background = rng.normal(45, 12, (height, width, 3)).clip(0, 255).astype(np.uint8)
+    cv2.imwrite(os.path.join(out_dir, 'background.png'), background)
+
+    def template(key):
+        return os.path.relpath(nav[key]['template'], out_dir)
+
+    places = {
+        'trader_npc': (1180, 620),
+        'dialogue_option': (1120, 380),
+        'currency_want_window': (420, 140),
+        'currency_have_window': (1500, 140),
+        'search_box': (1000, 150),
+        'pre_screenshot_hover_target': (1800, 1200),
+        'market_data_anchor': (380, 260),
+    }
+    results_x, results_y = nav['currency_search_results_region'][:2]
+    currencies = {name: os.path.relpath(path, out_dir) for name, path in game_config['currency_name_templates'].items()}
+
+    def overlays(*keys):
+        return [{"image": template(k), "at": list(places[k])} for k in keys]
+
+    def click(key, to, delay):
+        return {"event": "click", "rect": _click_rect(places[key], nav[key]['click_zone']), "to": to, "delay": delay}
+
+    trade_ui = ('currency_want_window', 'currency_have_window', 'pre_screenshot_hover_target')
+    banner_clicks = [click('currency_want_window', 'picker', 0.3), click('currency_have_window', 'picker', 0.3)]
+    states = {
+        "world": {"frame": "background.png", "overlays": overlays('trader_npc'),
+                  "on": [click('trader_npc', 'dialogue', 0.8)]},
+        "dialogue": {"frame": "background.png", "overlays": overlays('trader_npc', 'dialogue_option'),
+                     "on": [click('dialogue_option', 'trade', 0.6)]},
+        "trade": {"frame": "background.png", "overlays": overlays(*trade_ui),
+                  "on": banner_clicks + [{"event": "key_down", "key": "alt", "to": "trade_alt", "delay": 0.15},
+                                         {"event": "press", "key": "esc", "to": "world", "delay": 0.4}]},
+        "picker": {"frame": "background.png", "overlays": overlays(*trade_ui, 'search_box'),
+                   "on": [{"event": "type", "to": "results", "delay": 0.3},
+                          {"event": "press", "key": "esc", "to": "trade", "delay": 0.2}]},
+        "results": {"frame": "background.png",
+                    "overlays": overlays(*trade_ui, 'search_box')
+                    + [{"typed_currency": True, "at": [results_x + 20, results_y + 10]}]
+                    + [{"other_currency": i, "at": [results_x + 20, results_y + 90 + 80 * i]} for i in range(2)],
+                    "on": [{"event": "click", "rect": [results_x, results_y, 900, 80], "to": "trade", "delay": 0.25},
+                           {"event": "press", "key": "esc", "to": "trade", "delay": 0.2}]},
+        "trade_alt": {"frame": "background.png", "overlays": overlays(*trade_ui, 'market_data_anchor'),
+                      "on": [{"event": "key_up", "key": "alt", "to": "trade", "delay": 0.0}]},
+    }
+    scenario = {
+        "screen_size": [width, height],
+        "initial": "world",
+        "currency_templates": currencies,
+        "states": states,
+    }
+    path = os.path.join(out_dir, SCENARIO_FILE)
+    with open(path, 'w') as f:
+        json.dump(scenario, f, indent=2)
+    return path
+
+
+class _DiscardPipeline:
+    """Stands in for OcrPipeline so simulated captures are not written anywhere."""
+
+    def submit(self, pil_image, metadata):
+        pass
+
+
+def run_session(scenario_path, base_currency, targets, log_path=None):
+    """Drives one trade session against the simulator and prints per-step timings."""
+    backend = SimulatorBackend(scenario_path, log_path)
+    set_backend(backend)
+    import game_gui_navigator as nav
+
+    timings = []
+    def timed(label, func, *args, **kwargs):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        timings.append((label, time.perf_counter() - start))
+
+    timed('open_trade_window', nav.open_trade_window)
+    banners = nav.locate_anchors(["currency_want_window", "currency_have_window"])
+    timed(f'select {base_currency}', nav.select_currency, base_currency, "currency_have_window", banners.get("currency_have_window"))
+    for index, target in enumerate(targets):
+        timed(f'select {target}', nav.select_currency, target, "currency_want_window", banners.get("currency_want_window"))
+        timed(f'capture {target}', nav.capture_market_data, 0, index, target, base_currency, pipeline=_DiscardPipeline())
+    timed('close_trade_window', nav.close_trade_window)
+
+    print(f"\n{'step':40s} {'seconds':>8s}")
+    for label, seconds in timings:
+        print(f"{label:40s} {seconds:8.2f}")
+    print(f"{'total':40s} {sum(s for _, s in timings):8.2f}   ({len(backend.actions)} input events)")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless simulator for the trade window navigation.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="Build a synthetic scenario from the templates in game_config.json.")
+    build.add_argument('--out', default=DEFAULT_SCENARIO_DIR)
+    run = sub.add_parser('run', help="Run the first trade session against a scenario and time each step.")
+    run.add_argument('--scenario', default=os.path.join(DEFAULT_SCENARIO_DIR, SCENARIO_FILE))
+    run.add_argument('--pairs', type=int, default=3, help="Number of target currencies to capture.")
+    run.add_argument('--log', default=None, help="Append every input event to this JSONL file.")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        with open('game_config.json', 'r') as f:
+            game_config = json.load(f)
+        print(f"Scenario written to '{build_synthetic_scenario(game_config, args.out)}'.")
+        return
+
+    with open('trade_config.json', 'r') as f:
+        session = json.load(f)['trade_sessions'][0]
+    if not os.path.exists(args.scenario):
+        print(f"[FATAL] Scenario '{args.scenario}' not found. Run 'python sim_backend.py build' first.")
+        sys.exit(1)
+    run_session(args.scenario, session['base_currency'], session['target_currencies'][:args.pairs], args.log)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import os
+import sys
+import json
+import time
+import functools
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import numpy as np
+
+# --- Configuration ---
+TRACE_DIR = 'traces'
+SUMMARY_FILE = 'cycle_summaries.jsonl'
+
+# Metric dicts of the spans currently open, innermost last. add() credits all
+# of them, so a sleep inside a retry inside select_currency shows up in each.
+_open = []
+_spans = []
+_cycle = {"scan_id": None, "start": None, "file": None}
+_pair = None
+
+
+def start_cycle(scan_id):
+    """Starts a new trace file for a scan cycle; spans until end_cycle are written to it."""
+    os.makedirs(TRACE_DIR, exist_ok=True)
+    if _cycle["file"]:
+        _cycle["file"].close()
+    _spans.clear()
+    _cycle.update(
+        scan_id=scan_id,
+        start=time.perf_counter(),
+        file=open(os.path.join(TRACE_DIR, f"cycle_{scan_id:06d}.jsonl"), 'a')
+    )
+
+def set_pair(want, have):
+    """Tags every following span with the pair being processed (None to clear)."""
+    global _pair
+    _pair = f"{want}/{have}" if want else None
+
+def add(metric, value):
+    """Adds value to a metric (e.g. sleep_s, locate_s) of every open span."""
+    for metrics in _open:
+        metrics[metric] = metrics.get(metric, 0) + value
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Times a block as one step. The yielded dict can be updated (for example
+    record['attempts']); an exception marks the step failed and is re-raised.
+    """
+    record = {"name": name, "pair": _pair, **attrs}
+    metrics = {}
+    _open.append(metrics)
+    start = time.perf_counter()
+    record["outcome"] = "ok"
+    try:
+        yield record
+    except BaseException as e:
+        record["outcome"] = "failed"
+        record["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _open.pop()
+        record["duration_s"] = round(time.perf_counter() - start, 4)
+        record.update({k: round(v, 4) if isinstance(v, float) else v for k, v in metrics.items()})
+        _finish(record, start)
+
+def traced(name):
+    """Decorator form of span()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _finish(record, start):
+    if _cycle["start"] is not None:
+        record["cycle"] = _cycle["scan_id"]
+        record["offset_s"] = round(start - _cycle["start"], 4)
+    record["t"] = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    _spans.append(record)
+    if _cycle["file"]:
+        _cycle["file"].write(json.dumps(record) + "\n")
+        _cycle["file"].flush()
+
+
+def summarize(spans, elapsed_s=None):
+    """Per-step p50/p95, failure and retry rates, plus pairs per minute for a list of spans."""
+    if elapsed_s is None and spans:
+        elapsed_s = max(s.get("offset_s", 0) + s["duration_s"] for s in spans) - min(s.get("offset_s", 0) for s in spans)
+    steps = {}
+    for s in spans:
+        steps.setdefault(s["name"], []).append(s)
+
+    summary = {"elapsed_s": round(elapsed_s or 0.0, 2), "steps": {}}
+    for name, group in sorted(steps.items()):
+        durations = np.array([s["duration_s"] for s in group])
+        summary["steps"][name] = {
+            "count": len(group),
+            "p50_s": round(float(np.percentile(durations, 50)), 3),
+            "p95_s": round(float(np.percentile(durations, 95)), 3),
+            "total_s": round(float(durations.sum()), 2),
+            "sleep_s": round(sum(s.get("sleep_s", 0.0) for s in group), 2),
+            "failed": sum(1 for s in group if s["outcome"] != "ok"),
+            "retried": sum(1 for s in group if s.get("attempts", 1) > 1),
+        }
+    captures = sum(1 for s in spans if s["name"] == "capture_market_data" and s["outcome"] == "ok")
+    summary["pairs"] = captures
+    summary["pairs_per_min"] = round(captures / (elapsed_s / 60), 2) if elapsed_s else 0.0
+    return summary
+
+def print_report(summary):
+    print(f"\n[INFO] Step timings ({summary['pairs']} pairs in {summary['elapsed_s']:.1f}s, "
+          f"{summary['pairs_per_min']} pairs/min):")
+    print(f"  {'step':38s} {'n':>5s} {'p50':>7s} {'p95':>7s} {'total':>8s} {'sleep':>7s} {'retry%':>7s} {'fail':>5s}")
+    for name, st in summary["steps"].items():
+        retry_pct = 100.0 * st["retried"] / st["count"]
+        print(f"  {name:38s} {st['count']:5d} {st['p50_s']:7.2f} {st['p95_s']:7.2f} {st['total_s']:8.1f} "
+              f"{st['sleep_s']:7.1f} {retry_pct:6.1f}% {st['failed']:5d}")
+
+def end_cycle():
+    """Prints the cycle report, appends it to the summary log and closes the trace file."""
+    if _cycle["start"] is None:
+        return None
+    summary = summarize(_spans, time.perf_counter() - _cycle["start"])
+    summary["cycle"] = _cycle["scan_id"]
+    print_report(summary)
+    with open(os.path.join(TRACE_DIR, SUMMARY_FILE), 'a') as f:
+        f.write(json.dumps(summary) + "\n")
+    if _cycle["file"]:
+        _cycle["file"].close()
+    _cycle.update(scan_id=None, start=None, file=None)
+    return summary
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python step_trace.py traces/cycle_000060.jsonl [...]")
+        sys.exit(1)
+    for path in sys.argv[1:]:
+        with open(path, 'r') as f:
+            spans = [json.loads(line) for line in f if line.strip()]
+        print(f"\n=== {path} ===")
+        print_report(summarize(spans))
@@ -0,0 +1,44 @@
+import cv2
+
+# --- Configuration ---
+# Extra scales to precompute for every template (1.0 is always present).
+DEFAULT_PYRAMID_SCALES = (1.0,)
+
+
+class TemplateRegistry:
+    """
+    Loads every navigation and currency template named in game_config.json
+    once, as grayscale numpy arrays, so locate calls never touch the disk.
+    """
+
+    def __init__(self, game_config: dict, pyramid_scales=DEFAULT_PYRAMID_SCALES):
+        self.pyramid_scales = tuple(sorted(set(pyramid_scales) | {1.0}, reverse=True))
+        self.navigation = {}
+        self.currencies = {}
+        for key, item in game_config.get('navigation', {}).items():
+            if isinstance(item, dict) and item.get('template'):
+                self.navigation[key] = self._load(item['template'])
+        for name, path in game_config.get('currency_name_templates', {}).items():
+            self.currencies[name] = self._load(path)
+        print(f"[INFO] Loaded {len(self.navigation)} navigation and {len(self.currencies)} currency templates into memory.")
+
+    def _load(self, path: str):
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            print(f"[WARN] Could not load template image: {path}")
+            return None
+        pyramid = {1.0: image}
+        for scale in self.pyramid_scales:
+            if scale != 1.0:
+                pyramid[scale] = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return pyramid
+
+    def nav(self, config_key: str, scale: float = 1.0):
+        """Returns the grayscale template for a navigation key, or None if it is unknown or failed to load."""
+        pyramid = self.navigation.get(config_key)
+        return pyramid.get(scale) if pyramid else None
+
+    def currency(self, currency_name: str, scale: float = 1.0):
+        """Returns the grayscale template for a currency name, or None if it is unknown or failed to load."""
+        pyramid = self.currencies.get(currency_name)
+        return pyramid.get(scale) if pyramid else None
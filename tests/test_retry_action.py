@@ -0,0 +1,51 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import step_trace
+from game_helper_functions import retry_action, ActionFailedException, ConfigurationError
+
+
+def always_fails(config_key=None):
+    return None
+
+
+class RetryActionTraceTest(unittest.TestCase):
+
+    def setUp(self):
+        step_trace._spans.clear()
+
+    def last_span(self):
+        return step_trace._spans[-1]
+
+    def test_exhausted_retries_are_traced_as_failed(self):
+        with self.assertRaises(ActionFailedException):
+            retry_action(always_fails, retries=2, delay=0.0, config_key='trader_npc')
+        span = self.last_span()
+        self.assertEqual(span["name"], "retry:always_fails")
+        self.assertEqual(span["outcome"], "failed")
+        self.assertEqual(span["attempts"], 2)
+        self.assertEqual(step_trace.summarize([span])["steps"]["retry:always_fails"]["failed"], 1)
+
+    def test_passed_deadline_is_traced_as_failed(self):
+        with self.assertRaises(ActionFailedException):
+            retry_action(always_fails, retries=None, deadline_s=0.05, delay=0.01)
+        self.assertEqual(self.last_span()["outcome"], "failed")
+
+    def test_configuration_error_is_not_retried(self):
+        def missing_template(config_key=None):
+            raise ConfigurationError("No template loaded for 'x'.")
+        with self.assertRaises(ConfigurationError):
+            retry_action(missing_template, retries=3, delay=0.0)
+        span = self.last_span()
+        self.assertEqual((span["outcome"], span["attempts"]), ("failed", 1))
+
+    def test_success_is_traced_as_ok(self):
+        self.assertEqual(retry_action(lambda: 5, delay=0.0), 5)
+        self.assertEqual(self.last_span()["outcome"], "ok")
+
+
+if __name__ == "__main__":
+    unittest.main()